@@ -0,0 +1,222 @@
+"""
+Database lookup latency as the tables grow.
+
+    python -m benchmarks.db_lookup --database-url postgresql://localhost/scratch
+    python -m benchmarks.db_lookup --database-url ... --sizes 10000,100000,1000000,3000000 --max-growth 1.5
+
+Needs a disposable Postgres. Applies the app's migrations, grows the
+conversations table to each of --sizes rows (plus one transcript per
+--transcript-every conversations), and at every step times the app's own
+queries from ``src.db``, one at a time. Finally, a fraction of the rows is
+made idle and one retention pass is timed. Seeded rows have a "bench-"
+prefix and are deleted afterwards unless --keep is given.
+
+Exits non-zero if any query's p95 at the largest size is more than
+--max-growth times its p95 at the smallest, i.e. if lookups don't stay flat.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+from benchmarks.run import percentile
+
+prefix = "bench-"
+
+
+async def seed(conn, start, stop, transcript_every, transcript_chars):
+    """Conversations ``start``..``stop - 1`` and every ``transcript_every``-th one's transcript."""
+    await conn.execute(
+        """
+        INSERT INTO conversations
+            (conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created, created_at, last_active_at)
+        SELECT $3 || n, 'U' || (n % 5000), 'C' || (n % 500), n || '.000000',
+               '{"1": {"type": "path-more"}, "2": {"type": "path-restart"}}'::jsonb, TRUE,
+               NOW() - make_interval(secs => n % 86400), NOW() - make_interval(secs => n % 86400)
+        FROM generate_series($1::bigint, $2::bigint - 1) AS n
+        ON CONFLICT DO NOTHING
+        """,
+        start, stop, prefix
+    )
+    await conn.execute(
+        """
+        INSERT INTO transcripts
+            (conversation_id, user_id, channel_id, thread_ts, title, transcript, transcript_chars, created_at)
+        SELECT $3 || n, 'U' || (n % 5000), 'C' || (n % 500), n || '.000000', 'Recording ' || n, body, length(body),
+               NOW() - make_interval(secs => n % 86400)
+        FROM generate_series($1::bigint, $2::bigint - 1) AS n,
+             LATERAL (SELECT 'WEBVTT' || repeat(E'\\n\\n00:00:00.000 --> 00:00:05.000\\nwords ' || md5(n::text), $5 / 64)) AS t(body)
+        WHERE n % $4 = 0
+        ON CONFLICT DO NOTHING
+        """,
+        start, stop, prefix, transcript_every, transcript_chars
+    )
+
+
+def operations(db, size, transcript_every, transcript_chars):
+    """name -> coroutine factory timing one call of the app's query."""
+    def conversation_id():
+        return f"{prefix}{random.randrange(size)}"
+
+    def transcript_id():
+        return f"{prefix}{random.randrange(size // transcript_every) * transcript_every}"
+
+    flip = [0]
+
+    def payloads():
+        flip[0] += 1
+        return {"1": {"type": f"path-{flip[0] % 2}"}}
+
+    return {
+        "get_conversation": lambda: db.get_conversation(conversation_id()),
+        "get_conversation_miss": lambda: db.get_conversation(f"{prefix}missing-{random.randrange(size)}"),
+        "get_conversations_100": lambda: db.get_conversations([conversation_id() for _ in range(100)]),
+        "update_button_payloads": lambda: db.update_button_payloads(conversation_id(), payloads()),
+        "find_transcripts": lambda: db.find_transcripts(limit=50),
+        "find_transcripts_channel": lambda: db.find_transcripts(channel_id=f"C{random.randrange(500)}", limit=50),
+        "get_transcript_info": lambda: db.get_transcript_info(transcript_id()),
+        "read_transcript_chunk": lambda: db.read_transcript_chunk(transcript_id(), 4096, 4096),
+        # Paging a long transcript must not get slower towards its end
+        "read_transcript_chunk_late": lambda: db.read_transcript_chunk(
+            transcript_id(), max(transcript_chars - 4096, 0), 4096
+        ),
+    }
+
+
+async def time_operations(db, size, options):
+    results = {}
+    for name, call in operations(db, size, options.transcript_every, options.transcript_chars).items():
+        for _ in range(options.warmup):
+            await call()
+        latencies = []
+        for _ in range(options.samples):
+            started = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - started)
+        results[name] = {
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        }
+    return results
+
+
+async def time_retention(db, conn, options):
+    """Make ``--idle-fraction`` of the seeded conversations idle and time one archive pass."""
+    from src import retention
+
+    aged = await conn.execute(
+        "UPDATE conversations SET last_active_at = NOW() - interval '400 days' "
+        "WHERE conversation_id LIKE $1 AND random() < $2",
+        f"{prefix}%", options.idle_fraction
+    )
+    # Retention is opt-in; archive anything idle for more than 90 days, which only the aged rows are
+    retention.conversation_idle_days = 90
+    job = retention.RetentionJob()
+    started = time.perf_counter()
+    await job._drain("archived", job._archive_batch)
+    elapsed = time.perf_counter() - started
+    archived = job.stats["archived"]
+    return {
+        "aged": int(aged.split()[-1]), "archived": archived, "seconds": round(elapsed, 2),
+        "rows_per_second": round(archived / elapsed) if elapsed else None,
+    }
+
+
+async def cleanup(conn):
+    for table in ("conversations", "conversations_archive", "transcripts", "transcript_hashes"):
+        await conn.execute(f"DELETE FROM {table} WHERE conversation_id LIKE $1", f"{prefix}%")
+
+
+async def run(options):
+    os.environ["DATABASE_URL"] = options.database_url
+    from src import db
+    db.database_url = options.database_url
+
+    await db.init_pool()
+    try:
+        await db.ensure_schema()
+        steps = []
+        async with db.acquire() as conn:
+            # Seeding would otherwise send a change notification per row
+            await conn.execute("ALTER TABLE conversations DISABLE TRIGGER conversations_notify_change")
+            try:
+                seeded = 0
+                for size in options.sizes:
+                    started = time.perf_counter()
+                    await seed(conn, seeded, size, options.transcript_every, options.transcript_chars)
+                    await conn.execute("ANALYZE conversations")
+                    await conn.execute("ANALYZE transcripts")
+                    print(f"seeded {size} conversations in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+                    seeded = size
+                    steps.append({"size": size, "operations": await time_operations(db, size, options)})
+
+                retention_result = await time_retention(db, conn, options) if options.idle_fraction > 0 else None
+            finally:
+                if not options.keep:
+                    await cleanup(conn)
+                await conn.execute("ALTER TABLE conversations ENABLE TRIGGER conversations_notify_change")
+    finally:
+        await db.close_pool()
+    return {"steps": steps, "retention": retention_result}
+
+
+def flatness(steps, max_growth):
+    """Operations whose p95 grew by more than ``max_growth`` times from the smallest to the largest size."""
+    first, last = steps[0]["operations"], steps[-1]["operations"]
+    return [
+        f"{name}: p95 {first[name]['p95_ms']}ms at {steps[0]['size']} rows -> "
+        f"{last[name]['p95_ms']}ms at {steps[-1]['size']} rows"
+        for name in first
+        if last[name]["p95_ms"] > first[name]["p95_ms"] * max_growth
+    ]
+
+
+def print_report(result):
+    steps = result["steps"]
+    print(f"{'operation':<26}" + "".join(f"{step['size']:>16,}" for step in steps))
+    print(f"{'':<26}" + "".join(f"{'p50/p95 ms':>16}" for _ in steps))
+    for name in steps[0]["operations"]:
+        cells = (step["operations"][name] for step in steps)
+        print(f"{name:<26}" + "".join(f"{cell['p50_ms']:>8.2f}/{cell['p95_ms']:<7.2f}" for cell in cells))
+    if result["retention"]:
+        retention = result["retention"]
+        print(f"\nretention: archived {retention['archived']} of {retention['aged']} idle conversations "
+              f"in {retention['seconds']}s ({retention['rows_per_second']} rows/s)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Database lookup latency as the tables grow")
+    parser.add_argument("--database-url", required=True, help="Disposable Postgres; rows are added and removed")
+    parser.add_argument("--sizes", type=lambda value: [int(size) for size in value.split(",")],
+                        default=[10_000, 100_000, 1_000_000], help="Comma-separated conversation counts")
+    parser.add_argument("--transcript-every", type=int, default=20, help="One transcript per this many conversations")
+    parser.add_argument("--transcript-chars", type=int, default=20_000, help="Approximate transcript length")
+    parser.add_argument("--samples", type=int, default=500, help="Timed calls per query and size")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--idle-fraction", type=float, default=0.1, help="Share of rows aged for the retention pass")
+    parser.add_argument("--max-growth", type=float, default=2.0, help="Allowed p95 growth, smallest to largest size")
+    parser.add_argument("--json-out", help="Write results as JSON to this file")
+    parser.add_argument("--keep", action="store_true", help="Leave the seeded rows in place")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    result = asyncio.run(run(options))
+    if options.json_out:
+        with open(options.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+    print_report(result)
+
+    problems = flatness(result["steps"], options.max_growth)
+    for problem in problems:
+        print(f"NOT FLAT {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from src import db
+
+
+class FakeDatabase:
+    """
+    In-memory stand-in for the query functions in ``src.db``.
+
+    ``install()`` replaces them on the module, so every caller (which goes
+    through ``db.<function>``) uses the fake. Each call yields to the event
+    loop and can add a fixed latency to approximate a database round trip.
+    Only the behaviour the app relies on is modelled; use a real disposable
+    Postgres (``--database-url``) to benchmark the SQL itself.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.conversations = {}
+        self.transcripts = {}
+        self.transcript_hashes = {}
+        self.webpage_cache = {}
+        self.jobs = {}
+        self.event_keys = set()
+        self.queries = 0
+        self._next_job_id = 0
+
+    async def _roundtrip(self):
+        self.queries += 1
+        await asyncio.sleep(self.latency)
+
+    def install(self):
+        for name in (
+            "init_pool", "close_pool", "ensure_schema", "listen", "pool_stats",
+            "get_conversation", "get_conversations", "iter_conversation_ids", "insert_conversation",
+            "update_button_payloads", "mark_transcripts_created",
+            "store_transcript", "find_transcript_by_hash", "get_transcript_id", "get_transcript_info", "read_transcript_chunk", "get_webpage_cache", "put_webpage_cache",
+            "enqueue_transcription_job", "claim_transcription_job", "touch_transcription_job",
+            "fail_expired_transcription_jobs", "complete_transcription_job", "retry_transcription_job", "fail_transcription_job", "transcription_job_counts",
+            "claim_event_key", "purge_event_keys",
+            "archive_idle_conversations", "purge_archived_conversations", "purge_transcripts",
+        ):
+            setattr(db, name, getattr(self, name))
+
+    # Lifecycle
+
+    async def init_pool(self):
+        return None
+
+    async def close_pool(self):
+        return None
+
+    async def ensure_schema(self):
+        return None
+
+    async def listen(self, channel, callback, on_disconnect=None):
+        return _FakeListener()
+
+    def pool_stats(self):
+        return {"fake": True, "queries": self.queries}
+
+    # Conversations
+
+    async def get_conversation(self, conversation_id):
+        await self._roundtrip()
+        row = self.conversations.get(conversation_id)
+        return dict(row) if row is not None else None
+
+    async def get_conversations(self, conversation_ids):
+        await self._roundtrip()
+        return [dict(self.conversations[i]) for i in conversation_ids if i in self.conversations]
+
+    async def iter_conversation_ids(self, batch_size=10000):
+        await self._roundtrip()
+        for conversation_id in list(self.conversations):
+            yield conversation_id
+
+    async def insert_conversation(self, conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created=True):
+        await self._roundtrip()
+        if conversation_id in self.conversations:
+            raise ValueError(f"duplicate key value violates unique constraint: {conversation_id}")
+        self.conversations[conversation_id] = {
+            "conversation_id": conversation_id, "user_id": user_id, "channel_id": channel_id,
+            "thread_ts": thread_ts, "button_payloads": button_payloads, "transcript_created": transcript_created,
+        }
+
+    async def update_button_payloads(self, conversation_id, button_payloads):
+        await self._roundtrip()
+        if conversation_id in self.conversations:
+            self.conversations[conversation_id]["button_payloads"] = button_payloads
+
+    async def mark_transcripts_created(self, conversation_ids):
+        await self._roundtrip()
+        for conversation_id in conversation_ids:
+            if conversation_id in self.conversations:
+                self.conversations[conversation_id]["transcript_created"] = True
+
+    # Transcripts
+
+    async def store_transcript(self, conversation_id, user_id, channel_id, thread_ts, title, transcript_text, content_hash=None):
+        await self._roundtrip()
+        for key in [key for key, owner in self.transcript_hashes.items() if owner == conversation_id]:
+            del self.transcript_hashes[key]
+        if content_hash is not None:
+            self.transcript_hashes[content_hash] = conversation_id
+        self.transcripts[conversation_id] = {
+            "conversation_id": conversation_id, "user_id": user_id, "channel_id": channel_id, "thread_ts": thread_ts,
+            "title": title, "transcript": transcript_text, "created_at": datetime.now(timezone.utc),
+        }
+
+    async def find_transcript_by_hash(self, content_hash):
+        await self._roundtrip()
+        row = self.transcripts.get(self.transcript_hashes.get(content_hash))
+        return row["transcript"] if row is not None else None
+
+    async def get_transcript_id(self, title):
+        await self._roundtrip()
+        rows = [row for row in self.transcripts.values() if row["title"] == title]
+        return max(rows, key=lambda row: row["created_at"])["conversation_id"] if rows else None
+
+    async def get_transcript_info(self, conversation_id):
+        await self._roundtrip()
+        row = self.transcripts.get(conversation_id)
+        if row is None:
+            return None
+        return dict({k: v for k, v in row.items() if k != "transcript"}, length=len(row["transcript"]))
+
+    async def read_transcript_chunk(self, conversation_id, offset, size):
+        await self._roundtrip()
+        row = self.transcripts.get(conversation_id)
+        return row["transcript"][offset:offset + size] if row is not None else None
+
+    # Webpage cache
+
+    async def get_webpage_cache(self, url_key):
+        await self._roundtrip()
+        return self.webpage_cache.get(url_key)
+
+    async def put_webpage_cache(self, url_key, text, etag, last_modified):
+        await self._roundtrip()
+        self.webpage_cache[url_key] = {
+            "text": text, "etag": etag, "last_modified": last_modified, "fetched_at": datetime.now(timezone.utc),
+        }
+
+    # Transcription jobs
+
+    async def enqueue_transcription_job(self, conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type, max_attempts):
+        await self._roundtrip()
+        self._next_job_id += 1
+        self.jobs[self._next_job_id] = {
+            "id": self._next_job_id, "conversation_id": conversation_id, "user_id": user_id,
+            "channel_id": channel_id, "thread_ts": thread_ts, "title": title, "file_url": file_url,
+            "file_type": file_type, "status": "queued", "attempts": 0, "max_attempts": max_attempts,
+            "run_after": 0.0, "last_error": None, "updated_at": time.monotonic(),
+        }
+        return self._next_job_id
+
+    async def claim_transcription_job(self, lease_seconds):
+        await self._roundtrip()
+        now = time.monotonic()
+        for job in self.jobs.values():
+            runnable = job["status"] == "queued" and job["run_after"] <= now
+            stale = (job["status"] == "running" and job["updated_at"] < now - lease_seconds
+                     and job["attempts"] < job["max_attempts"])
+            if runnable or stale:
+                job.update(status="running", attempts=job["attempts"] + 1, updated_at=now)
+                return dict(job)
+        return None
+
+    async def touch_transcription_job(self, job_id):
+        await self._roundtrip()
+        if self.jobs[job_id]["status"] == "running":
+            self.jobs[job_id]["updated_at"] = time.monotonic()
+
+    async def fail_expired_transcription_jobs(self, lease_seconds):
+        await self._roundtrip()
+        now = time.monotonic()
+        expired = []
+        for job in self.jobs.values():
+            if (job["status"] == "running" and job["updated_at"] < now - lease_seconds
+                    and job["attempts"] >= job["max_attempts"]):
+                job.update(status="failed", last_error="worker stopped responding on every attempt", updated_at=now)
+                expired.append(dict(job))
+        return expired
+
+    async def complete_transcription_job(self, job_id):
+        await self._roundtrip()
+        self.jobs[job_id].update(status="done", last_error=None, updated_at=time.monotonic())
+
+    async def retry_transcription_job(self, job_id, delay_seconds, error):
+        await self._roundtrip()
+        now = time.monotonic()
+        self.jobs[job_id].update(status="queued", run_after=now + delay_seconds, last_error=error, updated_at=now)
+
+    async def fail_transcription_job(self, job_id, error):
+        await self._roundtrip()
+        self.jobs[job_id].update(status="failed", last_error=error, updated_at=time.monotonic())
+
+    async def transcription_job_counts(self):
+        await self._roundtrip()
+        counts = {}
+        for job in self.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    # Event deduplication
+
+    async def claim_event_key(self, event_key):
+        await self._roundtrip()
+        if event_key in self.event_keys:
+            return False
+        self.event_keys.add(event_key)
+        return True
+
+    async def purge_event_keys(self, older_than_seconds):
+        await self._roundtrip()
+
+    # Retention (benchmark runs are far shorter than any retention period)
+
+    async def archive_idle_conversations(self, idle_seconds, batch_size):
+        await self._roundtrip()
+        return []
+
+    async def purge_archived_conversations(self, older_than_seconds, batch_size):
+        await self._roundtrip()
+        return 0
+
+    async def purge_transcripts(self, older_than_seconds, batch_size):
+        await self._roundtrip()
+        return 0
+
+
+class _FakeListener:
+    async def close(self):
+        return None
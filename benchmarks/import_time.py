@@ -0,0 +1,111 @@
+"""
+Cold-start cost of importing the app.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 600 --json-out imports.json --baseline previous.json
+
+Runs ``python -X importtime -c "import src.main"`` in fresh interpreters and
+keeps the fastest run, since the first one also pays for cold disk caches
+and .pyc compilation. Reports the total and the packages that cost the
+most (by their own import time). Exits non-zero if the total is over
+--budget-ms, if it regressed past --max-regression against a baseline, or
+if a module that should only load on first use was imported.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that only some requests need; importing the app must not load them
+lazy_modules = ("openai", "bs4", "pydub", "ffmpeg", "pdfminer", "docx", "pptx", "slack_bolt")
+
+
+def parse_importtime(output):
+    """{module: (self_us, cumulative_us)} from ``-X importtime`` stderr."""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def by_package(modules):
+    """Own import time per top-level package, in milliseconds, most expensive first."""
+    totals = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        totals[name.split(".")[0]] += self_us
+    return sorted(((package, us / 1000) for package, us in totals.items()), key=lambda item: -item[1])
+
+
+def measure(module="src.main", runs=5):
+    """Import ``module`` in ``runs`` fresh interpreters; returns the result of the fastest."""
+    best = None
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        modules = parse_importtime(process.stderr)
+        total_ms = modules[module][1] / 1000
+        if best is None or total_ms < best["total_ms"]:
+            best = {
+                "module": module, "total_ms": round(total_ms, 1),
+                "packages": [(package, round(ms, 1)) for package, ms in by_package(modules)],
+                "lazy_imported": sorted({name.split(".")[0] for name in modules} & set(lazy_modules)),
+            }
+    return best
+
+
+def check(result, budget_ms=None, baseline_path=None, max_regression=0.2):
+    """Descriptions of every way ``result`` is over budget."""
+    problems = [f"{name} is imported at startup" for name in result["lazy_imported"]]
+    if budget_ms is not None and result["total_ms"] > budget_ms:
+        problems.append(f"import takes {result['total_ms']}ms, budget is {budget_ms}ms")
+    if baseline_path:
+        with open(baseline_path) as f:
+            before = json.load(f)["total_ms"]
+        if result["total_ms"] > before * (1 + max_regression):
+            problems.append(f"import time {before}ms -> {result['total_ms']}ms")
+    return problems
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget for the app")
+    parser.add_argument("--module", default="src.main")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to try; the fastest counts")
+    parser.add_argument("--top", type=int, default=15, help="Packages to list")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "800")))
+    parser.add_argument("--json-out", help="Write the result as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier --json-out file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed growth vs baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    result = measure(options.module, options.runs)
+    if options.json_out:
+        with open(options.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    print(f"import {result['module']}: {result['total_ms']}ms (budget {options.budget_ms:g}ms)")
+    for package, ms in result["packages"][:options.top]:
+        print(f"  {package:<28}{ms:>9.1f}ms")
+
+    problems = check(result, options.budget_ms, options.baseline, options.max_regression)
+    for problem in problems:
+        print(f"OVER BUDGET {problem}")
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
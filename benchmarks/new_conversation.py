@@ -0,0 +1,32 @@
+"""
+First-message latency of new conversations, with and without launch snapshots.
+
+    python -m benchmarks.new_conversation --voiceflow-launch-latency 0.4 --events 100
+
+Takes the same options as ``benchmarks.run``. Every run goes through the
+pipelined path, where launch overlaps reading the message's URLs and
+documents. The comparison shows what copying a launched session's state
+saves on top of that.
+"""
+import sys
+
+from benchmarks.run import _strip_options, parse_args, print_report, run_isolated
+
+variants = (("launch", {"VOICEFLOW_LAUNCH_SNAPSHOTS": "false"}), ("snapshot", {"VOICEFLOW_LAUNCH_SNAPSHOTS": "true"}))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parse_args(argv)
+    child_argv = _strip_options(argv, {"--scenario", "--json-out", "--baseline"})
+    results = []
+    for scenario in ("new_conversation", "new_conversation_urls"):
+        for label, env in variants:
+            result = run_isolated(scenario, child_argv, env)
+            result["scenario"] = f"{scenario[len('new_conversation'):].lstrip('_') or 'plain'}/{label}"
+            results.append(result)
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+"""
+Offline load test of the Slack -> Voiceflow pipeline.
+
+Drives ``/slack/events`` (events and button actions) in-process with signed
+synthetic payloads, against local stub Voiceflow, Slack, OpenAI and web
+servers and an in-memory database. Latency is measured end to end: from
+posting the event until the bot's reply reaches the stub Slack.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --scenario follow_up --events 500 --concurrency 50 --voiceflow-latency 0.3
+    python -m benchmarks.run --json-out results.json --baseline previous.json
+
+Each scenario runs in a fresh process, so peak RSS is per scenario. The
+app's own settings apply as usual, e.g. SLACK_POST_RATE / SLACK_UPDATE_RATE
+cap how fast replies can leave the Slack dispatcher.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+from slack_sdk.signature import SignatureVerifier
+
+from benchmarks.fake_db import FakeDatabase
+from benchmarks.stubs import OpenAIStub, SlackStub, StubBehaviour, VoiceflowStub, WebStub, sine_wav
+
+signing_secret = "bench-signing-secret"
+bot_user_id = "UBENCHBOT"
+urls_per_message = 5
+
+
+def _is_reply(body):
+    """The bot's answer to a turn: rendered blocks, or an apology."""
+    return "blocks" in body or body.get("text", "").startswith(("An error occurred", "Sorry"))
+
+
+def _is_error(body):
+    return "blocks" not in body and "Thank you for uploading" not in body.get("text", "")
+
+
+def _is_transcription_result(body):
+    text = body.get("text", "")
+    return "Thank you for uploading" in text or "couldn't transcribe" in text
+
+
+class Scenario:
+    name = None
+    description = None
+
+    def available(self):
+        """None if the scenario can run here, otherwise the reason it can't."""
+        return None
+
+    async def setup(self, bench, count):
+        """Prepare state for ``count`` events before timing starts."""
+
+    def build(self, bench, n):
+        """(kind, payload, thread_ts, predicate) for event ``n``."""
+        raise NotImplementedError
+
+
+def message_event(n, channel_id, text, thread_ts=None, event_type="message", channel_type="channel", files=None):
+    ts = f"1700000000.{n:06d}"
+    event = {"type": event_type, "channel": channel_id, "user": f"U{n % 50:04d}", "text": text, "ts": ts,
+             "client_msg_id": str(uuid.uuid4())}
+    if event_type == "message":
+        event["channel_type"] = channel_type
+    if thread_ts:
+        event["thread_ts"] = thread_ts
+    if files:
+        event["files"] = files
+    payload = {
+        "token": "bench", "team_id": "TBENCH", "api_app_id": "ABENCH", "type": "event_callback",
+        "event_id": f"Ev{uuid.uuid4().hex[:12]}", "event_time": int(time.time()), "event": event,
+    }
+    return payload, thread_ts or ts
+
+
+class NewConversation(Scenario):
+    name = "new_conversation"
+    description = "@-mention that starts a thread: transcript, launch and first turn"
+
+    def build(self, bench, n):
+        payload, thread_ts = message_event(n, bench.channel(n), f"<@{bot_user_id}> What can you help me with?", event_type="app_mention")
+        return "event", payload, thread_ts, _is_reply
+
+
+class NewConversationWithUrls(Scenario):
+    name = "new_conversation_urls"
+    description = f"@-mention that starts a thread and carries {urls_per_message} uncached URLs"
+
+    def build(self, bench, n):
+        links = " ".join(f"<{bench.web.url}/page/new-{n}/{k}>" for k in range(urls_per_message))
+        payload, thread_ts = message_event(n, bench.channel(n), f"<@{bot_user_id}> Summarise these: {links}", event_type="app_mention")
+        return "event", payload, thread_ts, _is_reply
+
+
+class FollowUp(Scenario):
+    name = "follow_up"
+    description = "Reply in a thread the bot is already in"
+
+    async def setup(self, bench, count):
+        for n in range(count):
+            thread_ts = f"1600000000.{n:06d}"
+            channel_id = bench.channel(n)
+            await bench.app.conversations.create(f"{channel_id}-{thread_ts}", "U0001", channel_id, thread_ts, {})
+
+    def build(self, bench, n):
+        payload, thread_ts = message_event(n, bench.channel(n), "And what about next quarter?", thread_ts=f"1600000000.{n:06d}")
+        return "event", payload, thread_ts, _is_reply
+
+
+class UrlHeavy(Scenario):
+    name = "url_heavy"
+    description = f"Follow-up carrying {urls_per_message} uncached URLs"
+
+    async def setup(self, bench, count):
+        await FollowUp().setup(bench, count)
+
+    def build(self, bench, n):
+        links = " ".join(f"<{bench.web.url}/page/{n}/{k}>" for k in range(urls_per_message))
+        payload, thread_ts = message_event(n, bench.channel(n), f"Summarise these: {links}", thread_ts=f"1600000000.{n:06d}")
+        return "event", payload, thread_ts, _is_reply
+
+
+class AudioUpload(Scenario):
+    name = "audio_upload"
+    description = "DM with an m4a recording, measured until the transcript is stored"
+
+    def available(self):
+        if shutil.which("ffmpeg") is None:
+            return "ffmpeg not found"
+        return None
+
+    def build(self, bench, n):
+        files = [{"url_private_download": f"{bench.slack.url}/files/recording.m4a", "filetype": "m4a"}]
+        payload, thread_ts = message_event(n, bench.channel(n), f"Weekly sync {n}", channel_type="im", files=files)
+        return "event", payload, thread_ts, _is_transcription_result
+
+
+class ButtonClick(Scenario):
+    name = "button_click"
+    description = "Click a Voiceflow choice button in an existing thread"
+
+    async def setup(self, bench, count):
+        buttons = {"1": {"type": "path-more", "payload": {"label": "Tell me more"}}}
+        for n in range(count):
+            thread_ts = f"1500000000.{n:06d}"
+            channel_id = bench.channel(n)
+            await bench.app.conversations.create(f"{channel_id}-{thread_ts}", "U0001", channel_id, thread_ts, buttons)
+
+    def build(self, bench, n):
+        thread_ts = f"1500000000.{n:06d}"
+        channel_id = bench.channel(n)
+        payload = {
+            "type": "block_actions", "token": "bench", "api_app_id": "ABENCH", "trigger_id": f"trigger-{n}",
+            "team": {"id": "TBENCH"}, "user": {"id": "U0001"}, "channel": {"id": channel_id},
+            "container": {"type": "message", "message_ts": f"1500000001.{n:06d}", "channel_id": channel_id},
+            "message": {
+                "ts": f"1500000001.{n:06d}", "thread_ts": thread_ts,
+                "blocks": [{"type": "actions", "elements": []}],
+            },
+            "actions": [{
+                "type": "button", "action_id": "voiceflow_button_0", "block_id": "b", "value": "1",
+                "text": {"type": "plain_text", "text": "Tell me more"}, "action_ts": str(time.time()),
+            }],
+        }
+        return "action", payload, thread_ts, _is_reply
+
+
+scenarios = {
+    scenario.name: scenario
+    for scenario in (NewConversation(), NewConversationWithUrls(), FollowUp(), UrlHeavy(), AudioUpload(), ButtonClick())
+}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (None if empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Bench:
+    """Stub services plus the app under test, wired together."""
+
+    def __init__(self, options):
+        self.options = options
+        self.voiceflow = VoiceflowStub(
+            StubBehaviour(options.voiceflow_latency, options.jitter, options.voiceflow_error_rate),
+            launch_latency=options.voiceflow_launch_latency
+        )
+        self.slack = SlackStub(StubBehaviour(options.slack_latency, options.jitter, options.slack_error_rate),
+                               files={"recording.m4a": sine_wav(options.audio_seconds)})
+        self.openai = OpenAIStub(StubBehaviour(options.openai_latency, options.jitter, options.openai_error_rate))
+        self.web = WebStub(StubBehaviour(options.web_latency, options.jitter, options.web_error_rate))
+        self.database = None
+        self.app = None
+        self.client = None
+        self._lifespan = None
+
+    def channel(self, n):
+        return f"CBENCH{n % self.options.channels:04d}"
+
+    async def start(self):
+        for stub in (self.voiceflow, self.slack, self.openai, self.web):
+            await stub.start()
+
+        # src.main reads its configuration at import time
+        os.environ.update({
+            "SLACK_SIGNING_SECRET": signing_secret,
+            "SLACK_BOT_TOKEN": "xoxb-bench",
+            "SLACK_BOT_USER_ID": bot_user_id,
+            "VOICEFLOW_API_KEY": "VF.bench",
+            "VOICEFLOW_PROJECT_ID": "bench-project",
+            "VOICEFLOW_RUNTIME_ENDPOINT": self.voiceflow.url,
+            "VOICEFLOW_TRANSCRIPT_ENDPOINT": f"{self.voiceflow.url}/v2/transcripts",
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": f"{self.openai.url}/v1",
+            "TRACE_IDS": "false",
+        })
+        if self.options.database_url:
+            os.environ["DATABASE_URL"] = self.options.database_url
+        else:
+            self.database = FakeDatabase(latency=self.options.db_latency)
+            self.database.install()
+
+        from src import main
+        logging.getLogger().setLevel(self.options.log_level)
+        self.app = main
+
+        self._lifespan = main.lifespan(main.app)
+        await self._lifespan.__aenter__()
+        # The Bolt app is built by the lifespan; nothing has called Slack yet
+        main.bolt_app.client.base_url = f"{self.slack.url}/api/"
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+        if self._lifespan is not None:
+            await self._lifespan.__aexit__(None, None, None)
+        for stub in (self.voiceflow, self.slack, self.openai, self.web):
+            await stub.close()
+
+    def _signed(self, body, content_type):
+        timestamp = str(int(time.time()))
+        signature = SignatureVerifier(signing_secret).generate_signature(timestamp=timestamp, body=body)
+        return {"Content-Type": content_type, "X-Slack-Request-Timestamp": timestamp, "X-Slack-Signature": signature}
+
+    async def send(self, kind, payload):
+        if kind == "action":
+            body = str(httpx.QueryParams({"payload": json.dumps(payload)}))
+            headers = self._signed(body, "application/x-www-form-urlencoded")
+        else:
+            body = json.dumps(payload)
+            headers = self._signed(body, "application/json")
+        response = await self.client.post("/slack/events", content=body.encode(), headers=headers)
+        response.raise_for_status()
+
+    async def run_one(self, scenario, n):
+        kind, payload, thread_ts, predicate = scenario.build(self, n)
+        done = self.slack.wait_for(thread_ts, predicate)
+        started = time.perf_counter()
+        await self.send(kind, payload)
+        try:
+            reply = await asyncio.wait_for(done, timeout=self.options.timeout)
+        except asyncio.TimeoutError:
+            return None, "timeout"
+        return time.perf_counter() - started, "error" if _is_error(reply) else "ok"
+
+
+async def run_scenario(name, options):
+    scenario = scenarios[name]
+    reason = scenario.available()
+    if reason is not None:
+        return {"scenario": name, "skipped": reason}
+
+    bench = Bench(options)
+    await bench.start()
+    try:
+        total = options.warmup + options.events
+        await scenario.setup(bench, total)
+        limit = asyncio.Semaphore(options.concurrency)
+
+        async def bounded(n):
+            async with limit:
+                return await bench.run_one(scenario, n)
+
+        await asyncio.gather(*(bounded(n) for n in range(options.warmup)))
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(bounded(n) for n in range(options.warmup, total)))
+        wall = time.perf_counter() - started
+
+        latencies = [latency for latency, outcome in outcomes if outcome == "ok"]
+        from src import metrics
+        stages = {
+            labels[0]: {"count": count, "mean_ms": round(total_seconds / count * 1000, 2)}
+            for labels, (count, total_seconds) in metrics.stage_duration.totals().items() if count
+        }
+        return {
+            "scenario": name,
+            "events": options.events,
+            "concurrency": options.concurrency,
+            "ok": len(latencies),
+            "errors": sum(1 for _, outcome in outcomes if outcome == "error"),
+            "timeouts": sum(1 for _, outcome in outcomes if outcome == "timeout"),
+            "events_per_second": round(len(latencies) / wall, 2) if wall else None,
+            "p50_ms": _ms(percentile(latencies, 50)),
+            "p95_ms": _ms(percentile(latencies, 95)),
+            "p99_ms": _ms(percentile(latencies, 99)),
+            "max_ms": _ms(max(latencies) if latencies else None),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "stages": stages,
+            "stubs": {
+                "voiceflow": bench.voiceflow.as_dict(), "slack": bench.slack.as_dict(),
+                "openai": bench.openai.as_dict(), "web": bench.web.as_dict(),
+            },
+        }
+    finally:
+        await bench.close()
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def run_isolated(name, argv, env=None):
+    """Run one scenario in a child process (with ``env`` added) and return its result."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as out:
+        path = out.name
+    try:
+        command = [sys.executable, "-m", "benchmarks.run", *argv, "--scenario", name, "--in-process", "--json-out", path]
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, env=dict(os.environ, **(env or {})))
+        if completed.returncode != 0:
+            return {"scenario": name, "skipped": f"benchmark process exited with {completed.returncode}"}
+        with open(path) as f:
+            return json.load(f)[0]
+    finally:
+        os.unlink(path)
+
+
+def print_report(results):
+    header = f"{'scenario':<18}{'ok':>6}{'err':>6}{'t/o':>6}{'ev/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        if "skipped" in result:
+            print(f"{result['scenario']:<18}skipped: {result['skipped']}")
+            continue
+        print(
+            f"{result['scenario']:<18}{result['ok']:>6}{result['errors']:>6}{result['timeouts']:>6}"
+            f"{_fmt(result['events_per_second']):>9}{_fmt(result['p50_ms']):>10}{_fmt(result['p95_ms']):>10}"
+            f"{_fmt(result['p99_ms']):>10}{_fmt(result['peak_rss_mb']):>9}"
+        )
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:g}"
+
+
+def compare(results, baseline_path, max_regression):
+    """Names of scenarios whose p95 or throughput regressed past ``max_regression``."""
+    with open(baseline_path) as f:
+        baseline = {result["scenario"]: result for result in json.load(f)}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if "skipped" in result or before is None or "skipped" in before:
+            continue
+        if before["p95_ms"] and result["p95_ms"] and result["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{result['scenario']}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if before["events_per_second"] and result["events_per_second"] is not None \
+                and result["events_per_second"] < before["events_per_second"] * (1 - max_regression):
+            regressions.append(
+                f"{result['scenario']}: {before['events_per_second']} -> {result['events_per_second']} events/s"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the Slack -> Voiceflow pipeline")
+    parser.add_argument("--scenario", action="append", choices=sorted(scenarios), help="Repeatable; default: all")
+    parser.add_argument("--events", type=int, default=100, help="Measured events per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured events sent first")
+    parser.add_argument("--concurrency", type=int, default=10, help="Events in flight at once")
+    parser.add_argument("--channels", type=int, default=100, help="Spread events over this many Slack channels")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds to wait for each reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Std-dev of stub latency, seconds")
+    for service, latency in (("voiceflow", 0.05), ("slack", 0.02), ("openai", 0.2), ("web", 0.05)):
+        parser.add_argument(f"--{service}-latency", type=float, default=latency, help="Seconds")
+        parser.add_argument(f"--{service}-error-rate", type=float, default=0.0, help="0..1")
+    parser.add_argument("--voiceflow-launch-latency", type=float, help="Seconds per launch; default: --voiceflow-latency")
+    parser.add_argument("--db-latency", type=float, default=0.001, help="Seconds per fake database call")
+    parser.add_argument("--database-url", help="Disposable Postgres to use instead of the in-memory fake")
+    parser.add_argument("--audio-seconds", type=float, default=5.0, help="Length of the uploaded recording")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json-out", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier --json-out file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed p95/throughput change vs baseline")
+    parser.add_argument("--in-process", action="store_true", help="Run all scenarios in this process")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    options = parse_args(argv)
+    names = options.scenario or list(scenarios)
+
+    if options.in_process:
+        results = [asyncio.run(run_scenario(name, options)) for name in names]
+    else:
+        child_argv = [arg for arg in _strip_options(argv, {"--scenario", "--json-out", "--baseline"})]
+        results = [run_isolated(name, child_argv) for name in names]
+
+    if options.json_out:
+        with open(options.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    print_report(results)
+
+    if options.baseline:
+        regressions = compare(results, options.baseline, options.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+def _strip_options(argv, names):
+    """``argv`` without the given options (and their values)."""
+    stripped, skip = [], False
+    for arg in argv:
+        if skip:
+            skip = False
+            continue
+        option = arg.split("=", 1)[0]
+        if option in names:
+            skip = "=" not in arg
+            continue
+        stripped.append(arg)
+    return stripped
+
+
+if __name__ == "__main__":
+    main()
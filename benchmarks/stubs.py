@@ -0,0 +1,250 @@
+import asyncio
+import io
+import json
+import math
+import random
+import struct
+import time
+import wave
+from collections import defaultdict
+from dataclasses import dataclass
+
+from aiohttp import web
+
+
+@dataclass
+class StubBehaviour:
+    """Latency (seconds, mean and jitter) and failure rate of one stubbed service."""
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def fails(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class StubServer:
+    """A local aiohttp server; subclasses add their routes in ``routes``."""
+
+    def __init__(self, behaviour=None):
+        self.behaviour = behaviour or StubBehaviour()
+        self.requests = 0
+        self.errors = 0
+        self.url = None
+        self._runner = None
+
+    def routes(self, app):
+        raise NotImplementedError
+
+    async def start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        self.routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        return self
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def begin(self):
+        """Apply latency; returns False if this request should fail."""
+        self.requests += 1
+        await self.behaviour.delay()
+        if self.behaviour.fails():
+            self.errors += 1
+            return False
+        return True
+
+    def as_dict(self):
+        return {"requests": self.requests, "injected_errors": self.errors}
+
+
+def voiceflow_traces(turn):
+    return [
+        {"type": "text", "payload": {"message": f"Reply {turn}: here is what I found."}},
+        {"type": "choice", "payload": {"buttons": [
+            {"name": "Tell me more", "request": {"type": "path-more", "payload": {"label": "Tell me more"}}},
+            {"name": "Start over", "request": {"type": "path-restart", "payload": {"label": "Start over"}}},
+        ]}},
+    ]
+
+
+class VoiceflowStub(StubServer):
+    """
+    Runtime interact (plain and streaming), session state and the
+    transcripts API. Launch requests take ``launch_latency`` instead of the
+    usual latency, since launch flows often do more work than a turn.
+    """
+
+    def __init__(self, behaviour=None, launch_latency=None, state_latency=0.01):
+        super().__init__(behaviour)
+        self.launch_latency = launch_latency
+        self.state_latency = state_latency
+        self.launches = 0
+        self.states = {}
+
+    def routes(self, app):
+        app.router.add_post("/state/{version}/user/{user}/interact", self.interact)
+        app.router.add_get("/state/user/{user}", self.get_state)
+        app.router.add_put("/state/user/{user}", self.put_state)
+        app.router.add_post("/v2/project/{project}/user/{user}/interact/stream", self.interact_stream)
+        app.router.add_put("/v2/transcripts", self.create_transcript)
+
+    async def interact(self, request):
+        body = await request.json()
+        if body.get("request", {}).get("type") == "launch":
+            self.launches += 1
+            self.states[request.match_info["user"]] = {"stack": [{"programID": "bench", "nodeID": "start"}], "variables": {}}
+            if self.launch_latency is not None:
+                # Replaces the normal latency for this request
+                await asyncio.sleep(max(0.0, self.launch_latency - self.behaviour.latency))
+        if not await self.begin():
+            return web.json_response({"message": "injected failure"}, status=500)
+        return web.json_response(voiceflow_traces(self.requests))
+
+    async def interact_stream(self, request):
+        await request.read()
+        if not await self.begin():
+            return web.json_response({"message": "injected failure"}, status=500)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for trace in voiceflow_traces(self.requests):
+            await response.write(f"event: trace\ndata: {json.dumps(trace)}\n\n".encode())
+        await response.write(b"event: end\ndata: {}\n\n")
+        await response.write_eof()
+        return response
+
+    async def get_state(self, request):
+        await asyncio.sleep(self.state_latency)
+        state = self.states.get(request.match_info["user"])
+        if state is None:
+            return web.json_response({"message": "no state"}, status=404)
+        return web.json_response(state)
+
+    async def put_state(self, request):
+        state = await request.json()
+        await asyncio.sleep(self.state_latency)
+        self.states[request.match_info["user"]] = state
+        return web.json_response(state)
+
+    async def create_transcript(self, request):
+        body = await request.json()
+        if not await self.begin():
+            return web.json_response({"message": "injected failure"}, status=500)
+        return web.json_response({"_id": f"transcript-{body.get('sessionID')}"})
+
+    def as_dict(self):
+        return dict(super().as_dict(), launches=self.launches)
+
+
+class SlackStub(StubServer):
+    """
+    Web API methods used by the bot plus private file downloads.
+
+    Every chat.postMessage is offered to the waiters registered for its
+    thread, which is how the harness observes end-to-end completion.
+    """
+
+    def __init__(self, behaviour=None, files=None):
+        super().__init__(behaviour)
+        self.files = files or {}
+        self.calls = defaultdict(int)
+        self._waiters = defaultdict(list)
+        self._ts = 0
+
+    def routes(self, app):
+        app.router.add_post("/api/{method}", self.api)
+        app.router.add_get("/files/{name}", self.download)
+
+    def wait_for(self, thread_ts, predicate):
+        """A future resolved with the first post to ``thread_ts`` matching ``predicate``."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[thread_ts].append((predicate, future))
+        return future
+
+    def _next_ts(self):
+        self._ts += 1
+        return f"{time.time():.0f}.{self._ts:06d}"
+
+    async def api(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            body = await request.json()
+        else:
+            body = dict(await request.post())
+        self.calls[method] += 1
+        if method == "auth.test":
+            return web.json_response({"ok": True, "user_id": "UBENCHBOT", "bot_id": "BBENCH", "team_id": "TBENCH"})
+        if not await self.begin():
+            return web.json_response({"ok": False, "error": "internal_error"}, status=500)
+        ts = body.get("ts") or self._next_ts()
+        if method == "chat.postMessage":
+            waiters = self._waiters.get(body.get("thread_ts"), [])
+            for waiter in list(waiters):
+                predicate, future = waiter
+                if not future.done() and predicate(body):
+                    future.set_result(body)
+                    waiters.remove(waiter)
+        return web.json_response({"ok": True, "channel": body.get("channel"), "ts": ts, "message": {"ts": ts}})
+
+    async def download(self, request):
+        if not await self.begin():
+            return web.Response(status=500)
+        content = self.files.get(request.match_info["name"])
+        if content is None:
+            return web.Response(status=404)
+        return web.Response(body=content, content_type="application/octet-stream")
+
+    def as_dict(self):
+        return dict(super().as_dict(), calls=dict(self.calls))
+
+
+class OpenAIStub(StubServer):
+    def routes(self, app):
+        app.router.add_post("/v1/audio/transcriptions", self.transcribe)
+
+    async def transcribe(self, request):
+        await request.read()
+        if not await self.begin():
+            return web.json_response({"error": {"message": "injected failure"}}, status=500)
+        return web.Response(text="WEBVTT\n\n00:00:00.000 --> 00:00:02.000\nBenchmark audio.\n", content_type="text/plain")
+
+
+class WebStub(StubServer):
+    """Serves a generated article for any /page/... path."""
+
+    def __init__(self, behaviour=None, paragraphs=40):
+        super().__init__(behaviour)
+        body = "".join(
+            f"<h2>Section {n}</h2><p>{'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8}</p>"
+            for n in range(paragraphs)
+        )
+        self.page = f"<html><head><title>Bench</title></head><body><h1>Article</h1>{body}</body></html>"
+
+    def routes(self, app):
+        app.router.add_get("/page/{path:.*}", self.page_handler)
+
+    async def page_handler(self, request):
+        if not await self.begin():
+            return web.Response(status=500)
+        return web.Response(text=self.page, content_type="text/html")
+
+
+def sine_wav(seconds=3.0, rate=16000, frequency=440):
+    """A mono 16-bit WAV tone, used as the uploaded 'recording'."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        frames = (int(8000 * math.sin(2 * math.pi * frequency * n / rate)) for n in range(int(seconds * rate)))
+        out.writeframes(b"".join(struct.pack("<h", frame) for frame in frames))
+    return buffer.getvalue()
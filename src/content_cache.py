@@ -0,0 +1,128 @@
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from cachetools import LRUCache
+
+from src import db
+
+cache_max_bytes = int(os.getenv("WEBPAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+cache_ttl = float(os.getenv("WEBPAGE_CACHE_TTL", "900"))
+cache_shared = os.getenv("WEBPAGE_CACHE_SHARED", "false").lower() in ("1", "true", "yes")
+
+_default_ports = {"http": 80, "https": 443}
+
+
+def normalize_url(url):
+    """Canonical cache key: lowercase scheme/host, no default port or fragment, sorted query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _default_ports.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+@dataclass
+class CachedPage:
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = field(default_factory=time.time)
+
+    @property
+    def size(self):
+        return len(self.text.encode("utf-8")) + 256
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    @property
+    def validators(self):
+        """Conditional request headers for revalidating this page."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class _SizedLRUCache(LRUCache):
+    def __init__(self, maxsize, on_evict):
+        super().__init__(maxsize=maxsize, getsizeof=lambda page: page.size)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        item = super().popitem()
+        self._on_evict()
+        return item
+
+
+class ContentCache:
+    """
+    Byte-bounded LRU cache of extracted webpage text.
+
+    Entries older than ``ttl`` are kept around (until evicted) so they can be
+    revalidated with ETag/Last-Modified instead of downloaded again. With
+    ``shared=True`` entries are also written to Postgres so all workers see
+    them.
+    """
+
+    def __init__(self, max_bytes=cache_max_bytes, ttl=cache_ttl, shared=cache_shared):
+        self.ttl = ttl
+        self.shared = shared
+        self.stats = {"hits": 0, "shared_hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self._pages = _SizedLRUCache(max_bytes, self._count_eviction)
+
+    def _count_eviction(self):
+        self.stats["evictions"] += 1
+
+    async def lookup(self, key):
+        """Return the cached page for ``key`` (fresh or stale), or None."""
+        page = self._pages.get(key)
+        if page is None and self.shared:
+            try:
+                row = await db.get_webpage_cache(key)
+            except Exception as e:
+                logging.error(f"Error reading shared webpage cache: {e}")
+                row = None
+            if row:
+                page = CachedPage(row["text"], row["etag"], row["last_modified"], row["fetched_at"].timestamp())
+                self._remember(key, page)
+                if page.is_fresh(self.ttl):
+                    self.stats["shared_hits"] += 1
+        if page is None or not page.is_fresh(self.ttl):
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return page
+
+    def is_fresh(self, page):
+        return page is not None and page.is_fresh(self.ttl)
+
+    async def store(self, key, page):
+        self._remember(key, page)
+        if self.shared:
+            try:
+                await db.put_webpage_cache(key, page.text, page.etag, page.last_modified)
+            except Exception as e:
+                logging.error(f"Error writing shared webpage cache: {e}")
+
+    async def revalidated(self, key, page):
+        """Mark a stale page as confirmed unchanged by the origin (HTTP 304)."""
+        self.stats["revalidated"] += 1
+        page.fetched_at = time.time()
+        await self.store(key, page)
+
+    def _remember(self, key, page):
+        if page.size > self._pages.maxsize:
+            return
+        self._pages[key] = page
+
+    def as_dict(self):
+        return dict(self.stats, entries=len(self._pages), bytes=self._pages.currsize, max_bytes=self._pages.maxsize)
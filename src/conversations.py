@@ -0,0 +1,258 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from cachetools import TTLCache
+
+from src import db
+
+state_cache_size = int(os.getenv("CONVERSATION_CACHE_SIZE", "10000"))
+state_cache_ttl = float(os.getenv("CONVERSATION_CACHE_TTL", "600"))
+bloom_capacity = int(os.getenv("CONVERSATION_BLOOM_CAPACITY", "1000000"))
+bloom_error_rate = float(os.getenv("CONVERSATION_BLOOM_ERROR_RATE", "0.01"))
+reconnect_delay = float(os.getenv("CONVERSATION_LISTEN_RECONNECT_DELAY", "5"))
+# Rebuilt from the table so ids deleted or archived since stop counting; 0 disables
+filter_rebuild_interval = float(os.getenv("CONVERSATION_FILTER_REBUILD_INTERVAL", "86400"))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings; no false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+@dataclass(frozen=True)
+class ConversationState:
+    conversation_id: str
+    user_id: Optional[str]
+    channel_id: Optional[str]
+    thread_ts: Optional[str]
+    button_payloads: dict
+    transcript_created: bool
+
+
+class ConversationStore:
+    """
+    Read-through/write-through cache in front of the conversations table.
+
+    A Bloom filter of every known conversation_id answers "is the bot in this
+    thread?" without a query for the vast majority of channel messages. Other
+    workers' writes arrive via LISTEN/NOTIFY and evict the cached state; while
+    the listener is down the filter is not trusted and lookups hit the
+    database. The filter is loaded in the background after ``start`` (lookups
+    hit the database until then) and rebuilt every
+    CONVERSATION_FILTER_REBUILD_INTERVAL seconds or on ``schedule_rebuild``.
+    """
+
+    def __init__(self):
+        self.states = TTLCache(maxsize=state_cache_size, ttl=state_cache_ttl)
+        self.known = BloomFilter(bloom_capacity, bloom_error_rate)
+        self.known_ready = False
+        self.stats = {
+            "hits": 0, "misses": 0, "filter_negative": 0, "filter_positive": 0, "invalidations": 0,
+            "filter_loads": 0, "filter_load_errors": 0,
+        }
+        self._listener = None
+        self._reconnect_task = None
+        self._load_task = None
+        self._rebuild_task = None
+        # The filter being loaded; ids seen meanwhile are added to it too
+        self._building = None
+        self._closing = False
+
+    async def start(self):
+        self._closing = False
+        try:
+            # Listen before loading so no insert can slip between the two
+            self._listener = await db.listen(db.CONVERSATION_CHANNEL, self._on_notification, self._on_disconnect)
+        except Exception as e:
+            logging.error(f"Conversation filter unavailable, falling back to database lookups: {e}")
+            self.known_ready = False
+            self._schedule_reconnect()
+            return
+        # Anything cached while nothing was listening may be stale
+        self.states.clear()
+        # Loading scans the whole table, so it doesn't hold up startup
+        self.schedule_rebuild()
+        if self._rebuild_task is None and filter_rebuild_interval > 0:
+            self._rebuild_task = asyncio.create_task(self._rebuild_periodically())
+
+    def schedule_rebuild(self):
+        """Reload the filter from the table in the background, unless a load is already running."""
+        if self._closing or (self._load_task is not None and not self._load_task.done()):
+            return
+        self._load_task = asyncio.create_task(self._load())
+
+    async def _rebuild_periodically(self):
+        while True:
+            await asyncio.sleep(filter_rebuild_interval)
+            if self.known_ready:
+                self.schedule_rebuild()
+
+    async def _load(self):
+        known = self._building = BloomFilter(bloom_capacity, bloom_error_rate)
+        try:
+            async for conversation_id in db.iter_conversation_ids():
+                known.add(conversation_id)
+        except Exception as e:
+            self.stats["filter_load_errors"] += 1
+            if self.known_ready:
+                # Keep serving the current filter; the next rebuild tries again
+                logging.error(f"Could not rebuild the conversation filter: {e}")
+                return
+            logging.error(f"Conversation filter unavailable, falling back to database lookups: {e}")
+            # The reconnect opens a new listener, so don't leave this one behind
+            await self._close_listener()
+            self._schedule_reconnect()
+            return
+        finally:
+            self._building = None
+        self.known = known
+        self.known_ready = True
+        self.stats["filter_loads"] += 1
+        logging.info(f"Loaded {known.count} known conversations into the conversation filter")
+
+    async def close(self):
+        self._closing = True
+        for task in (self._reconnect_task, self._load_task, self._rebuild_task):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(task for task in (self._load_task, self._rebuild_task) if task is not None), return_exceptions=True
+        )
+        self._reconnect_task = self._load_task = self._rebuild_task = None
+        await self._close_listener()
+
+    async def _close_listener(self):
+        if self._listener is None:
+            return
+        listener, self._listener = self._listener, None
+        try:
+            await listener.close()
+        except Exception as e:
+            logging.warning(f"Error closing conversation change listener: {e}")
+
+    def _remember(self, conversation_id):
+        self.known.add(conversation_id)
+        if self._building is not None:
+            self._building.add(conversation_id)
+
+    def _on_notification(self, payload):
+        origin, _, conversation_id = payload.partition(" ")
+        self._remember(conversation_id)
+        if origin != db.worker_id and self.states.pop(conversation_id, None) is not None:
+            self.stats["invalidations"] += 1
+
+    def _on_disconnect(self):
+        if self._closing:
+            return
+        logging.warning("Lost conversation change listener; falling back to database lookups")
+        self.known_ready = False
+        self.states.clear()
+        self._listener = None
+        # A load in progress would miss the inserts made while nothing is listening
+        if self._load_task is not None:
+            self._load_task.cancel()
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        if self._closing or (self._reconnect_task is not None and not self._reconnect_task.done()):
+            return
+
+        async def reconnect():
+            await asyncio.sleep(reconnect_delay)
+            self._reconnect_task = None
+            await self.start()
+
+        self._reconnect_task = asyncio.create_task(reconnect())
+
+    async def exists(self, conversation_id):
+        if self.known_ready:
+            if conversation_id not in self.known:
+                self.stats["filter_negative"] += 1
+                return False
+            self.stats["filter_positive"] += 1
+        return await self.get(conversation_id) is not None
+
+    async def get(self, conversation_id):
+        state = self.states.get(conversation_id)
+        if state is not None:
+            self.stats["hits"] += 1
+            return state
+        self.stats["misses"] += 1
+        row = await db.get_conversation(conversation_id)
+        if row is None:
+            return None
+        state = ConversationState(**dict(row))
+        self.states[conversation_id] = state
+        return state
+
+    async def get_many(self, conversation_ids):
+        """{conversation_id: state} for those that exist; cache misses are loaded with one query."""
+        found, missing = {}, []
+        for conversation_id in dict.fromkeys(conversation_ids):
+            state = self.states.get(conversation_id)
+            if state is not None:
+                self.stats["hits"] += 1
+                found[conversation_id] = state
+            elif self.known_ready and conversation_id not in self.known:
+                self.stats["filter_negative"] += 1
+            else:
+                self.stats["misses"] += 1
+                missing.append(conversation_id)
+        if missing:
+            for row in await db.get_conversations(missing):
+                state = ConversationState(**dict(row))
+                self.states[state.conversation_id] = state
+                found[state.conversation_id] = state
+        return found
+
+    async def create(self, conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created=True):
+        await db.insert_conversation(conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created)
+        self._remember(conversation_id)
+        self.states[conversation_id] = ConversationState(
+            conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created
+        )
+
+    async def update_button_payloads(self, conversation_id, button_payloads):
+        await db.update_button_payloads(conversation_id, button_payloads)
+        state = self.states.get(conversation_id)
+        if state is not None:
+            self.states[conversation_id] = replace(state, button_payloads=button_payloads)
+
+    async def mark_transcripts_created(self, conversation_ids):
+        await db.mark_transcripts_created(conversation_ids)
+        for conversation_id in conversation_ids:
+            state = self.states.get(conversation_id)
+            if state is not None:
+                self.states[conversation_id] = replace(state, transcript_created=True)
+
+    def forget(self, conversation_ids):
+        """Drop cached state for conversations removed from the table (the filter keeps them until its next rebuild)."""
+        for conversation_id in conversation_ids:
+            self.states.pop(conversation_id, None)
+
+    def as_dict(self):
+        return dict(self.stats, cached=len(self.states), known=self.known.count, filter_ready=self.known_ready)
@@ -0,0 +1,672 @@
+import asyncpg
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from contextlib import asynccontextmanager
+
+from src import metrics
+
+database_url = os.getenv("DATABASE_URL")
+# last_active_at is only rewritten this often (seconds) when a turn leaves the buttons unchanged
+activity_resolution = float(os.getenv("CONVERSATION_ACTIVITY_RESOLUTION", "3600"))
+pool_min_size = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+pool_max_size = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+pool_acquire_timeout = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+pool_command_timeout = float(os.getenv("DB_COMMAND_TIMEOUT", "10"))
+
+# Identifies this worker's connections, e.g. to skip our own change notifications
+worker_id = f"{socket.gethostname()}-{os.getpid()}"[:63]
+
+CONVERSATION_CHANNEL = "conversation_changes"
+
+# Full-text search document for a transcript; queries must use the same expression to hit the GIN index
+TRANSCRIPT_SEARCH_VECTOR = "to_tsvector('english'::regconfig, coalesce(title, '') || ' ' || coalesce(transcript, ''))"
+
+# Applied in order, once each, and recorded in schema_migrations. Never edit
+# a migration that has shipped; append a new one. Migration 1 is the schema
+# that used to be re-run on every start, so existing databases take it as-is.
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            conversation_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            channel_id TEXT,
+            thread_ts TEXT,
+            button_payloads JSONB,
+            transcript_created BOOLEAN NOT NULL DEFAULT FALSE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transcripts (
+            conversation_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            channel_id TEXT,
+            thread_ts TEXT,
+            title TEXT,
+            transcript TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        f"""
+        CREATE OR REPLACE FUNCTION notify_conversation_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify(
+                '{CONVERSATION_CHANNEL}',
+                current_setting('application_name') || ' ' ||
+                CASE WHEN TG_OP = 'DELETE' THEN OLD.conversation_id ELSE NEW.conversation_id END
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        DROP TRIGGER IF EXISTS conversations_notify_change ON conversations
+        """,
+        """
+        CREATE TRIGGER conversations_notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON conversations
+            FOR EACH ROW EXECUTE FUNCTION notify_conversation_change()
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS webpage_cache (
+            url_key TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transcription_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            user_id TEXT,
+            channel_id TEXT NOT NULL,
+            thread_ts TEXT NOT NULL,
+            title TEXT,
+            file_url TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            last_error TEXT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS transcription_jobs_claim_idx
+            ON transcription_jobs (run_after, id) WHERE status IN ('queued', 'running')
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS processed_events (
+            event_key TEXT PRIMARY KEY,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS processed_events_created_at_idx ON processed_events (created_at)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS transcripts_title_idx ON transcripts (title, created_at DESC)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS transcripts_created_idx ON transcripts (created_at DESC, conversation_id DESC)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS transcripts_channel_created_idx
+            ON transcripts (channel_id, created_at DESC, conversation_id DESC)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS transcript_hashes (
+            content_hash TEXT PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS transcript_hashes_conversation_idx ON transcript_hashes (conversation_id)
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS transcripts_search_idx ON transcripts USING GIN (({TRANSCRIPT_SEARCH_VECTOR}))
+        """,
+    ]),
+    (2, "conversation activity, archive and transcript storage", [
+        # Instant on PostgreSQL 11+: NOW() is evaluated once for existing rows
+        """
+        ALTER TABLE conversations
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            ADD COLUMN IF NOT EXISTS last_active_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS conversations_last_active_idx ON conversations (last_active_at)
+        """,
+        # Room in each page for the per-turn button_payloads rewrite
+        """
+        ALTER TABLE conversations SET (fillfactor = 80)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS conversations_archive (
+            conversation_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            channel_id TEXT,
+            thread_ts TEXT,
+            button_payloads JSONB,
+            transcript_created BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at TIMESTAMPTZ,
+            last_active_at TIMESTAMPTZ,
+            archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS conversations_archive_archived_idx ON conversations_archive (archived_at)
+        """,
+        # Lets metadata queries report a transcript's length without de-TOASTing it
+        """
+        ALTER TABLE transcripts ADD COLUMN IF NOT EXISTS transcript_chars INTEGER
+        """,
+        # Out of line but uncompressed, so read_transcript_chunk's substr fetches only the TOAST
+        # chunks it needs instead of decompressing from the start on every page; new rows only
+        """
+        ALTER TABLE transcripts ALTER COLUMN transcript SET STORAGE EXTERNAL
+        """,
+    ]),
+]
+
+_pool = None
+_stats = {
+    "acquired": 0,
+    "acquire_timeouts": 0,
+    "acquire_wait_seconds": 0.0,
+    "max_acquire_wait_seconds": 0.0,
+}
+
+
+async def _init_connection(conn):
+    # Decode json/jsonb columns into Python objects, like psycopg2 did
+    for type_name in ("json", "jsonb"):
+        await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+async def init_pool():
+    """Create the shared connection pool. Called once at application startup."""
+    global _pool
+    if _pool is not None:
+        return _pool
+    _pool = await asyncpg.create_pool(
+        database_url,
+        min_size=pool_min_size,
+        max_size=pool_max_size,
+        command_timeout=pool_command_timeout,
+        init=_init_connection,
+        server_settings={"application_name": worker_id},
+    )
+    logging.info(f"Database pool created (min_size={pool_min_size}, max_size={pool_max_size})")
+    return _pool
+
+
+async def close_pool():
+    """Close the shared connection pool. Called once at application shutdown."""
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    await pool.close()
+    logging.info("Database pool closed")
+
+
+@asynccontextmanager
+async def acquire():
+    """Borrow a connection from the pool for the duration of the block."""
+    if _pool is None:
+        raise RuntimeError("Database pool is not initialised; call init_pool() first")
+    start = time.monotonic()
+    try:
+        conn = await _pool.acquire(timeout=pool_acquire_timeout)
+    except asyncio.TimeoutError:
+        _stats["acquire_timeouts"] += 1
+        logging.error(f"Timed out after {pool_acquire_timeout}s waiting for a database connection")
+        raise
+    waited = time.monotonic() - start
+    metrics.stage_duration.observe("db.acquire", value=waited)
+    _stats["acquired"] += 1
+    _stats["acquire_wait_seconds"] += waited
+    _stats["max_acquire_wait_seconds"] = max(_stats["max_acquire_wait_seconds"], waited)
+    try:
+        yield conn
+    finally:
+        await _pool.release(conn)
+
+
+async def ensure_schema():
+    """Apply pending MIGRATIONS, each in its own transaction; returns the versions applied."""
+    async with acquire() as conn:
+        # Serialise concurrent worker startups for the whole run
+        await conn.execute("SELECT pg_advisory_lock(hashtext('ai-assistant-schema'))")
+        try:
+            await conn.execute(
+                "CREATE TABLE IF NOT EXISTS schema_migrations ("
+                "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW())"
+            )
+            applied = {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+            pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+            for version, name, statements in pending:
+                logging.info(f"Applying schema migration {version}: {name}")
+                async with conn.transaction():
+                    for statement in statements:
+                        await conn.execute(statement)
+                    await conn.execute("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name)
+            return [version for version, _, _ in pending]
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock(hashtext('ai-assistant-schema'))")
+
+
+async def listen(channel, callback, on_disconnect=None):
+    """
+    Open a dedicated connection that LISTENs on ``channel``.
+
+    ``callback(payload)`` is called for every notification; returns the
+    connection, which the caller closes when done.
+    """
+    conn = await asyncpg.connect(database_url, server_settings={"application_name": f"{worker_id}-listen"[:63]})
+    await conn.add_listener(channel, lambda _conn, _pid, _channel, payload: callback(payload))
+    if on_disconnect is not None:
+        conn.add_termination_listener(lambda _conn: on_disconnect())
+    return conn
+
+
+def pool_stats():
+    """Return a snapshot of pool usage counters."""
+    stats = dict(_stats)
+    stats["min_size"] = pool_min_size
+    stats["max_size"] = pool_max_size
+    if _pool is not None:
+        stats["size"] = _pool.get_size()
+        stats["idle"] = _pool.get_idle_size()
+        stats["in_use"] = stats["size"] - stats["idle"]
+    else:
+        stats["size"] = stats["idle"] = stats["in_use"] = 0
+    return stats
+
+
+async def fetchrow(query, *args):
+    async with acquire() as conn:
+        with metrics.span("db.query"):
+            return await conn.fetchrow(query, *args)
+
+
+async def fetchval(query, *args):
+    async with acquire() as conn:
+        with metrics.span("db.query"):
+            return await conn.fetchval(query, *args)
+
+
+async def fetch(query, *args):
+    async with acquire() as conn:
+        with metrics.span("db.query"):
+            return await conn.fetch(query, *args)
+
+
+async def execute(query, *args):
+    async with acquire() as conn:
+        with metrics.span("db.query"):
+            return await conn.execute(query, *args)
+
+
+# Conversations
+
+async def get_conversation(conversation_id):
+    return await fetchrow(
+        "SELECT conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created "
+        "FROM conversations WHERE conversation_id = $1",
+        conversation_id
+    )
+
+
+async def get_conversations(conversation_ids):
+    """Rows for every existing conversation among ``conversation_ids``, in one query."""
+    return await fetch(
+        "SELECT conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created "
+        "FROM conversations WHERE conversation_id = ANY($1::text[])",
+        list(conversation_ids)
+    )
+
+
+async def iter_conversation_ids(batch_size=10000):
+    """Yield every known conversation_id, streamed with a server-side cursor."""
+    async with acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor("SELECT conversation_id FROM conversations", prefetch=batch_size):
+                yield row["conversation_id"]
+
+
+async def insert_conversation(conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created=True):
+    await execute(
+        "INSERT INTO conversations (conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created) "
+        "VALUES ($1, $2, $3, $4, $5, $6)",
+        conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created
+    )
+
+
+async def update_button_payloads(conversation_id, button_payloads):
+    """Save a turn's buttons and mark the conversation active; skips the write if neither changed."""
+    await execute(
+        """
+        UPDATE conversations SET button_payloads = $1, last_active_at = NOW()
+        WHERE conversation_id = $2
+          AND (button_payloads IS DISTINCT FROM $1 OR last_active_at < NOW() - make_interval(secs => $3))
+        """,
+        button_payloads, conversation_id, activity_resolution
+    )
+
+
+async def mark_transcripts_created(conversation_ids):
+    await execute(
+        "UPDATE conversations SET transcript_created = TRUE WHERE conversation_id = ANY($1::text[])",
+        list(conversation_ids)
+    )
+
+
+# Transcripts
+
+async def store_transcript(conversation_id, user_id, channel_id, thread_ts, title, transcript_text, content_hash=None):
+    """
+    Save a conversation's transcript. ``content_hash`` (of the recording) is
+    indexed so identical uploads can reuse it; hashes of a transcript this
+    replaces are dropped in the same statement.
+    """
+    await execute(
+        """
+        WITH saved AS (
+            INSERT INTO transcripts (conversation_id, user_id, channel_id, thread_ts, title, transcript, transcript_chars)
+            VALUES ($1, $2, $3, $4, $5, $6, length($6))
+            ON CONFLICT (conversation_id)
+            DO UPDATE SET title = EXCLUDED.title, transcript = EXCLUDED.transcript,
+                          transcript_chars = EXCLUDED.transcript_chars, created_at = NOW()
+        ), replaced AS (
+            DELETE FROM transcript_hashes
+            WHERE conversation_id = $1 AND content_hash IS DISTINCT FROM $7::text
+        )
+        INSERT INTO transcript_hashes (content_hash, conversation_id)
+        SELECT $7::text, $1 WHERE $7::text IS NOT NULL
+        ON CONFLICT (content_hash) DO UPDATE SET conversation_id = EXCLUDED.conversation_id, created_at = NOW()
+        """,
+        conversation_id, user_id, channel_id, thread_ts, title, transcript_text, content_hash
+    )
+
+
+async def find_transcript_by_hash(content_hash):
+    """The transcript of an earlier recording with this content hash, or None."""
+    return await fetchval(
+        "SELECT t.transcript FROM transcript_hashes h JOIN transcripts t USING (conversation_id) "
+        "WHERE h.content_hash = $1",
+        content_hash
+    )
+
+
+async def get_transcript_id(title):
+    """The conversation id of the newest transcript with this title."""
+    return await fetchval(
+        "SELECT conversation_id FROM transcripts WHERE title = $1 ORDER BY created_at DESC LIMIT 1",
+        title
+    )
+
+
+async def get_transcript_info(conversation_id):
+    """A transcript's metadata and length, without its text."""
+    return await fetchrow(
+        "SELECT conversation_id, user_id, channel_id, thread_ts, title, created_at, "
+        "coalesce(transcript_chars, length(transcript)) AS length "
+        "FROM transcripts WHERE conversation_id = $1",
+        conversation_id
+    )
+
+
+async def find_transcripts(channel_id=None, title=None, query=None, after=None, limit=50):
+    """
+    Transcript metadata, newest first. ``query`` is a web-search style
+    full-text query; ``after`` is the (created_at, conversation_id) of the
+    last row of the previous page.
+    """
+    conditions, args = [], []
+
+    def param(value):
+        args.append(value)
+        return f"${len(args)}"
+
+    if channel_id is not None:
+        conditions.append(f"channel_id = {param(channel_id)}")
+    if title is not None:
+        conditions.append(f"title = {param(title)}")
+    if query:
+        conditions.append(f"{TRANSCRIPT_SEARCH_VECTOR} @@ websearch_to_tsquery('english', {param(query)})")
+    if after is not None:
+        created_at, conversation_id = after
+        conditions.append(f"(created_at, conversation_id) < ({param(created_at)}, {param(conversation_id)})")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return await fetch(
+        f"SELECT conversation_id, user_id, channel_id, thread_ts, title, created_at FROM transcripts {where} "
+        f"ORDER BY created_at DESC, conversation_id DESC LIMIT {param(limit)}",
+        *args
+    )
+
+
+async def read_transcript_chunk(conversation_id, offset, size):
+    """``size`` characters of a transcript starting at ``offset`` (0-based); None if there is no transcript."""
+    return await fetchval(
+        "SELECT substr(transcript, $2, $3) FROM transcripts WHERE conversation_id = $1",
+        conversation_id, offset + 1, size
+    )
+
+
+# Webpage cache
+
+async def get_webpage_cache(url_key):
+    return await fetchrow(
+        "SELECT text, etag, last_modified, fetched_at FROM webpage_cache WHERE url_key = $1",
+        url_key
+    )
+
+
+async def put_webpage_cache(url_key, text, etag, last_modified):
+    await execute(
+        """
+        INSERT INTO webpage_cache (url_key, text, etag, last_modified, fetched_at)
+        VALUES ($1, $2, $3, $4, NOW())
+        ON CONFLICT (url_key)
+        DO UPDATE SET text = EXCLUDED.text, etag = EXCLUDED.etag,
+                      last_modified = EXCLUDED.last_modified, fetched_at = NOW();
+        """,
+        url_key, text, etag, last_modified
+    )
+
+
+# Transcription jobs
+
+async def enqueue_transcription_job(conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type, max_attempts):
+    return await fetchval(
+        """
+        INSERT INTO transcription_jobs (conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type, max_attempts)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        RETURNING id
+        """,
+        conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type, max_attempts
+    )
+
+
+async def claim_transcription_job(lease_seconds):
+    """
+    Atomically claim the next runnable job, or return None.
+
+    Jobs left 'running' longer than the lease (e.g. by a crashed worker) are
+    claimed again while they have attempts left; running workers renew the
+    lease with ``touch_transcription_job``.
+    """
+    return await fetchrow(
+        """
+        UPDATE transcription_jobs
+        SET status = 'running', attempts = attempts + 1, updated_at = NOW()
+        WHERE id = (
+            SELECT id FROM transcription_jobs
+            WHERE (status = 'queued' AND run_after <= NOW())
+               OR (status = 'running' AND updated_at < NOW() - make_interval(secs => $1) AND attempts < max_attempts)
+            ORDER BY run_after, id
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING *
+        """,
+        float(lease_seconds)
+    )
+
+
+async def touch_transcription_job(job_id):
+    """Renew the lease on a running job."""
+    await execute(
+        "UPDATE transcription_jobs SET updated_at = NOW() WHERE id = $1 AND status = 'running'",
+        job_id
+    )
+
+
+async def fail_expired_transcription_jobs(lease_seconds):
+    """Fail jobs whose lease expired on their last attempt (their worker died every time); returns them."""
+    return await fetch(
+        """
+        UPDATE transcription_jobs
+        SET status = 'failed', last_error = 'worker stopped responding on every attempt', updated_at = NOW()
+        WHERE status = 'running' AND updated_at < NOW() - make_interval(secs => $1) AND attempts >= max_attempts
+        RETURNING *
+        """,
+        float(lease_seconds)
+    )
+
+
+async def complete_transcription_job(job_id):
+    await execute(
+        "UPDATE transcription_jobs SET status = 'done', last_error = NULL, updated_at = NOW() WHERE id = $1",
+        job_id
+    )
+
+
+async def retry_transcription_job(job_id, delay_seconds, error):
+    await execute(
+        """
+        UPDATE transcription_jobs
+        SET status = 'queued', run_after = NOW() + make_interval(secs => $2), last_error = $3, updated_at = NOW()
+        WHERE id = $1
+        """,
+        job_id, float(delay_seconds), error
+    )
+
+
+async def fail_transcription_job(job_id, error):
+    await execute(
+        "UPDATE transcription_jobs SET status = 'failed', last_error = $2, updated_at = NOW() WHERE id = $1",
+        job_id, error
+    )
+
+
+async def transcription_job_counts():
+    rows = await fetch("SELECT status, COUNT(*) AS count FROM transcription_jobs GROUP BY status")
+    return {row["status"]: row["count"] for row in rows}
+
+
+# Event deduplication
+
+async def claim_event_key(event_key):
+    """Record an event key; returns False if another worker already recorded it."""
+    return await fetchval(
+        "INSERT INTO processed_events (event_key) VALUES ($1) ON CONFLICT DO NOTHING RETURNING TRUE",
+        event_key
+    ) is not None
+
+
+async def purge_event_keys(older_than_seconds):
+    await execute(
+        "DELETE FROM processed_events WHERE created_at < NOW() - make_interval(secs => $1)",
+        float(older_than_seconds)
+    )
+
+
+# Retention
+
+async def archive_idle_conversations(idle_seconds, batch_size):
+    """
+    Move up to ``batch_size`` conversations idle for ``idle_seconds`` into
+    conversations_archive, oldest first; returns their ids.
+    """
+    rows = await fetch(
+        """
+        WITH expired AS (
+            DELETE FROM conversations
+            WHERE conversation_id IN (
+                SELECT conversation_id FROM conversations
+                WHERE last_active_at < NOW() - make_interval(secs => $1)
+                ORDER BY last_active_at
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+        )
+        INSERT INTO conversations_archive
+            (conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created, created_at, last_active_at)
+        SELECT conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created, created_at, last_active_at
+        FROM expired
+        ON CONFLICT (conversation_id) DO UPDATE SET
+            user_id = EXCLUDED.user_id, channel_id = EXCLUDED.channel_id, thread_ts = EXCLUDED.thread_ts,
+            button_payloads = EXCLUDED.button_payloads, transcript_created = EXCLUDED.transcript_created,
+            created_at = EXCLUDED.created_at, last_active_at = EXCLUDED.last_active_at, archived_at = NOW()
+        RETURNING conversation_id
+        """,
+        float(idle_seconds), batch_size
+    )
+    return [row["conversation_id"] for row in rows]
+
+
+async def purge_archived_conversations(older_than_seconds, batch_size):
+    """Delete up to ``batch_size`` archived conversations archived over ``older_than_seconds`` ago; returns the count."""
+    return await fetchval(
+        """
+        WITH purged AS (
+            DELETE FROM conversations_archive
+            WHERE conversation_id IN (
+                SELECT conversation_id FROM conversations_archive
+                WHERE archived_at < NOW() - make_interval(secs => $1)
+                ORDER BY archived_at
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING 1
+        )
+        SELECT count(*) FROM purged
+        """,
+        float(older_than_seconds), batch_size
+    )
+
+
+async def purge_transcripts(older_than_seconds, batch_size):
+    """Delete up to ``batch_size`` transcripts (and their content hashes) older than ``older_than_seconds``; returns the count."""
+    return await fetchval(
+        """
+        WITH purged AS (
+            DELETE FROM transcripts
+            WHERE conversation_id IN (
+                SELECT conversation_id FROM transcripts
+                WHERE created_at < NOW() - make_interval(secs => $1)
+                ORDER BY created_at
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING conversation_id
+        ), hashes AS (
+            DELETE FROM transcript_hashes WHERE conversation_id IN (SELECT conversation_id FROM purged)
+        )
+        SELECT count(*) FROM purged
+        """,
+        float(older_than_seconds), batch_size
+    )
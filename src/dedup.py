@@ -0,0 +1,107 @@
+import logging
+import os
+
+from cachetools import TTLCache
+
+from src import db
+
+dedup_ttl = float(os.getenv("DEDUP_TTL", "600"))
+dedup_cache_size = int(os.getenv("DEDUP_CACHE_SIZE", "10000"))
+dedup_store = os.getenv("DEDUP_STORE", "postgres").lower()
+purge_every = int(os.getenv("DEDUP_PURGE_EVERY", "500"))
+
+# In-process fast path; catches retries and listener overlap within one worker
+processed_events = TTLCache(maxsize=dedup_cache_size, ttl=dedup_ttl)
+
+stats = {"checked": 0, "unique": 0, "duplicates_local": 0, "duplicates_shared": 0, "slack_retries": 0}
+
+
+class MemoryDedupStore:
+    """Shared-store stand-in for single-worker deployments and tests."""
+
+    def __init__(self):
+        self._keys = TTLCache(maxsize=dedup_cache_size * 10, ttl=dedup_ttl)
+
+    async def claim(self, key):
+        if key in self._keys:
+            return False
+        self._keys[key] = True
+        return True
+
+
+class PostgresDedupStore:
+    """Records processed event keys in Postgres so every worker sees them."""
+
+    def __init__(self):
+        self._claims = 0
+
+    async def claim(self, key):
+        claimed = await db.claim_event_key(key)
+        self._claims += 1
+        if self._claims % purge_every == 0:
+            try:
+                await db.purge_event_keys(dedup_ttl)
+            except Exception as e:
+                logging.error(f"Error purging processed events: {e}")
+        return claimed
+
+
+store = PostgresDedupStore() if dedup_store == "postgres" else MemoryDedupStore()
+
+
+def event_key(body, event):
+    """
+    Identify the user message behind an event.
+
+    The same message can arrive as both a ``message`` and an ``app_mention``
+    event (with different event_ids), and Slack retries reuse the event_id,
+    so the message identity is preferred over the event_id.
+    """
+    if event.get('client_msg_id'):
+        return f"msg:{event['client_msg_id']}"
+    if event.get('channel') and event.get('ts'):
+        return f"ts:{event['channel']}:{event['ts']}"
+    if body and body.get('event_id'):
+        return f"event:{body['event_id']}"
+    return None
+
+
+def seen(body, event):
+    """Cheap in-process check, safe to call before any other work."""
+    key = event_key(body, event)
+    if key is not None and key in processed_events:
+        stats["checked"] += 1
+        stats["duplicates_local"] += 1
+        return True
+    return False
+
+
+async def claim(body, event):
+    """
+    Claim an event for processing. Returns False if it was already handled
+    here or by another worker.
+    """
+    key = event_key(body, event)
+    if key is None:
+        return True
+    stats["checked"] += 1
+    if key in processed_events:
+        stats["duplicates_local"] += 1
+        return False
+    processed_events[key] = True
+    try:
+        claimed = await store.claim(key)
+    except Exception as e:
+        # Prefer answering twice over not answering at all
+        logging.error(f"Error checking shared dedup store for {key}: {e}")
+        claimed = True
+    if not claimed:
+        stats["duplicates_shared"] += 1
+        logging.info(f"Skipping duplicate event {key}")
+        return False
+    stats["unique"] += 1
+    return True
+
+
+def as_dict():
+    return dict(stats, store=store.__class__.__name__, cached=len(processed_events))
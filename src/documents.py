@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+supported_types = ('pdf', 'docx', 'pptx')
+extract_workers = int(os.getenv("DOCUMENT_WORKERS", "2"))
+max_pages = int(os.getenv("DOCUMENT_MAX_PAGES", "100"))
+time_budget = float(os.getenv("DOCUMENT_TIME_BUDGET", "20"))
+max_chars = int(os.getenv("DOCUMENT_MAX_CHARS", "50000"))
+# The time budget is only checked between pages; this bounds a single pathological page
+hard_timeout = float(os.getenv("DOCUMENT_HARD_TIMEOUT", "60"))
+
+_executor = None
+
+
+def iter_pdf_pages(file_path):
+    from pdfminer.high_level import extract_pages
+    from pdfminer.layout import LTTextContainer
+
+    for page_layout in extract_pages(file_path):
+        yield "".join(element.get_text() for element in page_layout if isinstance(element, LTTextContainer))
+
+
+def iter_docx_pages(file_path):
+    from docx import Document
+
+    # DOCX has no page model; treat every 50 paragraphs as a page for budgeting
+    paragraphs = [paragraph.text for paragraph in Document(file_path).paragraphs]
+    for start in range(0, len(paragraphs), 50):
+        yield "\n".join(paragraphs[start:start + 50])
+
+
+def iter_pptx_pages(file_path):
+    from pptx import Presentation
+
+    for slide in Presentation(file_path).slides:
+        yield "\n".join(shape.text for shape in slide.shapes if hasattr(shape, "text"))
+
+
+_page_iterators = {'pdf': iter_pdf_pages, 'docx': iter_docx_pages, 'pptx': iter_pptx_pages}
+
+
+def extract_document(file_path, file_type, page_limit, seconds_limit, char_limit):
+    """
+    Extract text page by page, stopping at the page, time or size budget.
+
+    Runs inside a worker process. Returns ``(text, pages_read, truncated)``.
+    """
+    started = time.monotonic()
+    pages = []
+    chars = 0
+    truncated = False
+    for page_text in _page_iterators[file_type](file_path):
+        if len(pages) >= page_limit or chars >= char_limit or time.monotonic() - started >= seconds_limit:
+            # Only truncated if there is a page past the budget
+            truncated = True
+            break
+        pages.append(page_text.strip())
+        chars += len(page_text)
+    text = "\n\n".join(page for page in pages if page)
+    return text[:char_limit], len(pages), truncated or len(text) > char_limit
+
+
+def start():
+    """Start the worker processes used for document extraction."""
+    global _executor
+    if _executor is None:
+        # spawn keeps the children free of the parent's event loop and threads
+        _executor = ProcessPoolExecutor(max_workers=extract_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+def close():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+
+
+def _recycle():
+    """Kill the worker processes (one is stuck) and let the next extraction start a fresh pool."""
+    global _executor
+    executor, _executor = _executor, None
+    if executor is None:
+        return
+    processes = list((executor._processes or {}).values())
+    # Other extractions in flight fail with BrokenProcessPool and are reported as unreadable
+    executor.shutdown(wait=False)
+    for process in processes:
+        process.terminate()
+
+
+async def extract_document_text(file_path, file_type):
+    """Extract text from a PDF, DOCX or PPTX file without blocking the event loop."""
+    if file_type not in supported_types:
+        logging.error(f"Unsupported document type: {file_type}")
+        return None
+    executor = _executor or start()
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    try:
+        text, pages_read, truncated = await asyncio.wait_for(
+            loop.run_in_executor(executor, extract_document, file_path, file_type, max_pages, time_budget, max_chars),
+            hard_timeout
+        )
+    except asyncio.TimeoutError:
+        logging.error(f"Gave up extracting text from {file_type.upper()} after {hard_timeout:.0f}s")
+        if executor is _executor:
+            _recycle()
+        return None
+    except Exception as e:
+        logging.error(f"Error extracting text from {file_type.upper()}: {e}")
+        return None
+    logging.info(
+        f"Extracted {len(text)} chars from {pages_read} page(s) of {file_type.upper()} "
+        f"in {time.monotonic() - started:.1f}s{' (truncated)' if truncated else ''}"
+    )
+    return text
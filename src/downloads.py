@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import aiofiles
+import aiohttp
+
+from src.http_client import ConnectionStats, create_session
+
+slack_bot_token = os.getenv("SLACK_BOT_TOKEN")
+max_download_bytes = int(os.getenv("DOWNLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+chunk_size = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+progress_interval = float(os.getenv("DOWNLOAD_PROGRESS_INTERVAL", "5"))
+
+connection_stats = ConnectionStats()
+_session = None
+
+
+class DownloadTooLarge(Exception):
+    pass
+
+
+async def start():
+    """Open the shared HTTP session used for Slack file downloads."""
+    global _session
+    if _session is None or _session.closed:
+        # Large recordings can take minutes; only bound connect and per-read stalls
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=float(os.getenv("DOWNLOAD_HTTP_CONNECT_TIMEOUT", "10")),
+            sock_read=float(os.getenv("DOWNLOAD_HTTP_READ_TIMEOUT", "60")),
+        )
+        _session = create_session('DOWNLOAD', stats=connection_stats, timeout=timeout)
+    return _session
+
+
+async def close():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _file_suffix(file_url):
+    extension = os.path.splitext(file_url.split("?", 1)[0])[1].lower()
+    return extension if extension in (".mp4", ".m4a", ".pdf", ".docx", ".pptx") else ""
+
+
+async def download_file(file_url, suffix=None, digest=None):
+    """
+    Stream a Slack file to a temporary file on disk and return its path.
+
+    Memory use stays at one chunk regardless of file size. The partial file
+    is removed on errors, on exceeding DOWNLOAD_MAX_BYTES and on cancellation.
+    If ``digest`` (a hashlib object) is given it is fed every chunk, so the
+    content hash is ready without reading the file again.
+    """
+    session = _session if _session is not None and not _session.closed else await start()
+    headers = {'Authorization': f'Bearer {slack_bot_token}'}
+    suffix = _file_suffix(file_url) if suffix is None else suffix
+    fd, file_path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    received = 0
+    started = last_report = time.monotonic()
+    try:
+        async with session.get(file_url, headers=headers, allow_redirects=True) as response:
+            if response.status != 200:
+                logging.error(f"Error downloading file: {response.status}, {await response.text()}")
+                os.unlink(file_path)
+                return None
+            if response.content_length and response.content_length > max_download_bytes:
+                raise DownloadTooLarge(f"{response.content_length} bytes exceeds limit of {max_download_bytes}")
+
+            async with aiofiles.open(file_path, "wb") as out:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    received += len(chunk)
+                    if received > max_download_bytes:
+                        raise DownloadTooLarge(f"more than {max_download_bytes} bytes received")
+                    if digest is not None:
+                        digest.update(chunk)
+                    await out.write(chunk)
+                    now = time.monotonic()
+                    if now - last_report >= progress_interval:
+                        last_report = now
+                        rate = received / (now - started) / (1024 * 1024)
+                        logging.info(f"Downloading {file_url}: {received / (1024 * 1024):.1f} MB at {rate:.1f} MB/s")
+
+        elapsed = max(time.monotonic() - started, 1e-6)
+        logging.info(f"Downloaded {received} bytes in {elapsed:.1f}s ({received / elapsed / (1024 * 1024):.1f} MB/s)")
+        return file_path
+    except DownloadTooLarge as e:
+        logging.error(f"Error downloading file {file_url}: {e}")
+        os.unlink(file_path)
+        return None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error(f"Error downloading file {file_url}: {e}")
+        os.unlink(file_path)
+        return None
+    except BaseException:
+        # Includes asyncio.CancelledError; never leave partial files behind
+        if os.path.exists(file_path):
+            os.unlink(file_path)
+        raise
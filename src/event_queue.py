@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+
+from src import metrics
+
+max_queue_size = int(os.getenv("EVENT_QUEUE_SIZE", "1000"))
+# 0 processes events inline in the Bolt listener, as before the queue existed
+worker_count = int(os.getenv("EVENT_QUEUE_WORKERS", "50"))
+shutdown_timeout = float(os.getenv("EVENT_QUEUE_SHUTDOWN_TIMEOUT", "10"))
+
+
+class EventQueue:
+    """
+    Bounded queue between acknowledging a Slack event and processing it.
+
+    Listeners ``offer`` work and return straight away; ``workers`` tasks run
+    it in arrival order, each in the context (trace ID) it was offered from.
+    Once ``max_size`` events are waiting, ``offer`` refuses new ones so a
+    burst sheds load instead of growing latency without bound.
+    """
+
+    def __init__(self, max_size=max_queue_size, workers=worker_count):
+        self.max_size = max_size
+        self.workers = workers
+        # (enqueued at, context, handler, args)
+        self._items = deque()
+        self._ready = None
+        self._tasks = []
+        self._busy = 0
+        self._closing = False
+        self.stats = {
+            "enqueued": 0, "processed": 0, "failed": 0, "shed": 0, "dropped_at_shutdown": 0,
+            "max_depth": 0, "wait_seconds_total": 0.0, "max_wait_seconds": 0.0,
+        }
+
+    def start(self):
+        if self._tasks or not self.workers:
+            return
+        self._closing = False
+        self._ready = asyncio.Semaphore(0)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Stop taking events and give queued ones ``shutdown_timeout`` seconds to finish."""
+        self._closing = True
+        give_up_at = time.monotonic() + shutdown_timeout
+        while (self._items or self._busy) and time.monotonic() < give_up_at:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._items:
+            self.stats["dropped_at_shutdown"] += len(self._items)
+            logging.warning(f"Dropped {len(self._items)} queued Slack events at shutdown")
+            self._items.clear()
+
+    def offer(self, handle, *args):
+        """Queue ``handle(*args)``; returns False if the queue is full or shutting down."""
+        if self._closing or not self._tasks or len(self._items) >= self.max_size:
+            self.stats["shed"] += 1
+            return False
+        self._items.append((time.monotonic(), contextvars.copy_context(), handle, args))
+        self.stats["enqueued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self._items))
+        self._ready.release()
+        return True
+
+    async def _work(self):
+        while True:
+            await self._ready.acquire()
+            enqueued_at, context, handle, args = self._items.popleft()
+            waited = time.monotonic() - enqueued_at
+            self.stats["wait_seconds_total"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            metrics.stage_duration.observe("event_queue.wait", value=waited)
+            self._busy += 1
+            try:
+                await context.run(asyncio.create_task, handle(*args))
+                self.stats["processed"] += 1
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.error(f"Error processing queued Slack event: {e}")
+            finally:
+                self._busy -= 1
+
+    def depth(self):
+        return len(self._items)
+
+    def oldest_age(self):
+        """Seconds the longest-waiting event has been queued (0 if none are)."""
+        return time.monotonic() - self._items[0][0] if self._items else 0.0
+
+    def as_dict(self):
+        return dict(
+            self.stats, depth=self.depth(), oldest_age_seconds=round(self.oldest_age(), 3),
+            busy_workers=self._busy, workers=self.workers, max_size=self.max_size,
+        )
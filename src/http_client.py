@@ -0,0 +1,51 @@
+import aiohttp
+import os
+
+
+class ConnectionStats:
+    """Counts TCP connections opened vs. reused by an aiohttp session."""
+
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+
+    def trace_config(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_create)
+        trace_config.on_connection_reuseconn.append(self._on_reuse)
+        return trace_config
+
+    async def _on_create(self, session, context, params):
+        self.created += 1
+
+    async def _on_reuse(self, session, context, params):
+        self.reused += 1
+
+    def as_dict(self):
+        return {"connections_created": self.created, "connections_reused": self.reused}
+
+
+def create_session(prefix, stats=None, **session_kwargs):
+    """
+    Build a long-lived ClientSession with a tuned TCPConnector.
+
+    Settings are read from ``<PREFIX>_HTTP_*`` environment variables so each
+    upstream can be tuned independently.
+    """
+    def setting(name, default):
+        return os.getenv(f"{prefix}_HTTP_{name}", default)
+
+    connector = aiohttp.TCPConnector(
+        limit=int(setting("LIMIT", "100")),
+        limit_per_host=int(setting("LIMIT_PER_HOST", "20")),
+        keepalive_timeout=float(setting("KEEPALIVE_TIMEOUT", "60")),
+        ttl_dns_cache=int(setting("DNS_CACHE_TTL", "300")),
+        use_dns_cache=True,
+    )
+    session_kwargs.setdefault("timeout", aiohttp.ClientTimeout(
+        total=float(setting("TIMEOUT", "30")),
+        connect=float(setting("CONNECT_TIMEOUT", "5")),
+        sock_read=float(setting("READ_TIMEOUT", "25")),
+    ))
+    trace_configs = [stats.trace_config()] if stats is not None else None
+    return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs, **session_kwargs)
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import random
+
+from src import db, metrics
+
+worker_count = int(os.getenv("TRANSCRIPTION_WORKERS", "2"))
+max_attempts = int(os.getenv("TRANSCRIPTION_MAX_ATTEMPTS", "3"))
+retry_base_delay = float(os.getenv("TRANSCRIPTION_RETRY_BASE_DELAY", "30"))
+retry_max_delay = float(os.getenv("TRANSCRIPTION_RETRY_MAX_DELAY", "900"))
+poll_interval = float(os.getenv("TRANSCRIPTION_POLL_INTERVAL", "5"))
+lease_seconds = float(os.getenv("TRANSCRIPTION_LEASE_SECONDS", "3600"))
+
+_workers = []
+_wakeup = None
+_stats = {"enqueued": 0, "completed": 0, "retried": 0, "failed": 0}
+
+
+class JobError(Exception):
+    """Raised by a job handler to signal a retryable failure."""
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter for the given (1-based) attempt count."""
+    delay = min(retry_base_delay * 2 ** (attempts - 1), retry_max_delay)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def enqueue(conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type):
+    job_id = await db.enqueue_transcription_job(
+        conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type, max_attempts
+    )
+    _stats["enqueued"] += 1
+    logging.info(f"Queued transcription job {job_id} for conversation {conversation_id}")
+    if _wakeup is not None:
+        _wakeup.set()
+    return job_id
+
+
+async def _renew_lease(job_id):
+    """Keep a long-running job's lease fresh so no other worker reclaims it."""
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            await db.touch_transcription_job(job_id)
+        except Exception as e:
+            logging.error(f"Could not renew the lease on transcription job {job_id}: {e}")
+
+
+async def run_job(job, handler, on_failure):
+    """Run one claimed job and record its outcome."""
+    metrics.new_trace_id(f"job-{job['id']}")
+    heartbeat = asyncio.create_task(_renew_lease(job["id"]))
+    try:
+        with metrics.span("job.transcription"):
+            await handler(job)
+    except asyncio.CancelledError:
+        # Worker shutting down: hand the job straight back to the queue
+        await asyncio.shield(db.retry_transcription_job(job["id"], 0, "worker stopped"))
+        raise
+    except Exception as e:
+        error = str(e) or e.__class__.__name__
+        if job["attempts"] < job["max_attempts"]:
+            delay = retry_delay(job["attempts"])
+            logging.warning(f"Transcription job {job['id']} failed (attempt {job['attempts']}), retrying in {delay:.0f}s: {error}")
+            _stats["retried"] += 1
+            await db.retry_transcription_job(job["id"], delay, error)
+        else:
+            logging.error(f"Transcription job {job['id']} failed permanently: {error}")
+            _stats["failed"] += 1
+            await db.fail_transcription_job(job["id"], error)
+            await on_failure(job, error)
+        return
+    finally:
+        heartbeat.cancel()
+    _stats["completed"] += 1
+    await db.complete_transcription_job(job["id"])
+
+
+async def fail_expired_jobs(name, on_failure):
+    """Give up on jobs whose worker died on their last attempt, which claiming no longer picks up."""
+    try:
+        expired = await db.fail_expired_transcription_jobs(lease_seconds)
+        for job in expired:
+            logging.error(f"Transcription job {job['id']} failed permanently: {job['last_error']}")
+            _stats["failed"] += 1
+            await on_failure(job, job["last_error"])
+    except Exception as e:
+        logging.error(f"{name} could not fail expired jobs: {e}")
+
+
+async def _worker(name, handler, on_failure):
+    while True:
+        try:
+            job = await db.claim_transcription_job(lease_seconds)
+        except Exception as e:
+            logging.error(f"{name} could not claim a job: {e}")
+            job = None
+        if job is None:
+            await fail_expired_jobs(name, on_failure)
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        logging.info(f"{name} picked up transcription job {job['id']} (attempt {job['attempts']})")
+        try:
+            await run_job(job, handler, on_failure)
+        except Exception as e:
+            logging.error(f"{name} could not record the outcome of job {job['id']}: {e}")
+
+
+def start_workers(handler, on_failure):
+    """
+    Start the transcription worker pool.
+
+    ``handler(job)`` does the work and raises on failure; ``on_failure(job,
+    error)`` is awaited once a job has used up its attempts.
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    for idx in range(worker_count):
+        _workers.append(asyncio.create_task(_worker(f"transcription-worker-{idx}", handler, on_failure)))
+    logging.info(f"Started {worker_count} transcription workers")
+
+
+async def stop_workers():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+def stats():
+    return dict(_stats, workers=len(_workers))
@@ -1,62 +1,170 @@
-from fastapi import FastAPI, Request, Response, status
-from slack_bolt.async_app import AsyncApp
-from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
+# Load environment variables before any module reads its settings
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
+from src import db, dedup, documents, downloads, jobs, metrics, resilience, streaming, transcripts, utils, webpage
+from src.conversations import ConversationStore
+from src.event_queue import EventQueue
+from src.retention import RetentionJob
+from src.scheduler import KeyedScheduler, SchedulerBusy
+from src.slack_dispatcher import NOTIFICATION, SlackDispatcher
+from src.transcript_registrar import TranscriptRegistrar
 from src.voiceflow_api import VoiceflowAPI
-from src.utils import store_transcript, process_file, create_message_blocks, extract_webpage_content
+from src.utils import process_file, create_message_blocks
 
 import re
 import os
+import hmac
 import asyncio
 import logging
+from contextlib import AsyncExitStack, asynccontextmanager
 
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
-
-import psycopg2
-from psycopg2.extras import Json
-
-from cachetools import TTLCache
-import hashlib
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+if metrics.trace_ids_enabled:
+    metrics.install_log_trace_ids()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s')
+else:
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logging.getLogger('slack_bolt.AsyncApp').setLevel(logging.ERROR)
 
 slack_signing_secret = os.getenv("SLACK_SIGNING_SECRET")
 slack_bot_token = os.getenv("SLACK_BOT_TOKEN")
 bot_user_id = os.getenv("SLACK_BOT_USER_ID")
-database_url = os.getenv("DATABASE_URL")
-
-# Database connection function
-def get_db_connection(autocommit=True):
-    conn = psycopg2.connect(database_url)
-    if autocommit:
-        conn.autocommit = True
-    return conn
+# Streaming replies need VOICEFLOW_PROJECT_ID for the streaming interact endpoint
+streaming_replies = os.getenv("STREAMING_REPLIES", "false").lower() in ("1", "true", "yes")
+coalesce_messages = os.getenv("COALESCE_QUEUED_MESSAGES", "true").lower() in ("1", "true", "yes")
+busy_message = "I'm still working on your earlier messages in this thread. Please try again in a moment."
+unavailable_message = "Sorry, the assistant is temporarily unavailable. Please try again in a few minutes."
+slow_upstream_message = "Sorry, the assistant is taking too long to respond right now. Please try again in a moment."
+# The start notification, posted when a document task begins
+start_message = "Thankyou, I will start working on it. I will notify you when I'm done. It will take around 5 minutes."
+task_batch_max_items = int(os.getenv("TASK_BATCH_MAX_ITEMS", "500"))
+task_notify_concurrency = int(os.getenv("TASK_NOTIFY_CONCURRENCY", "10"))
+# Bearer token for the /transcripts API, which is disabled while unset
+transcript_api_token = os.getenv("TRANSCRIPT_API_TOKEN")
+overloaded_message = "Sorry, I'm getting a lot of requests right now and couldn't pick up your message. Please try again in a minute."
 
 
 logging.info(f"Bot User ID from environment: {bot_user_id}")
 
-# Install the Slack app and get xoxb- token in advance
-bolt_app = AsyncApp(token=slack_bot_token, signing_secret=slack_signing_secret)
+# Clients are built in the lifespan (see create_clients), so importing this module stays cheap
+bolt_app = None
+slack_handler = None
+# All outbound Slack calls go through the rate-limit-aware dispatcher
+slack = None
+voiceflow = None
+# Creates Voiceflow transcripts in the background, off the reply path
+transcript_registrar = None
+
+def create_bolt_app():
+    """Build the Bolt app and register its listeners."""
+    from slack_bolt.async_app import AsyncApp
+
+    bolt = AsyncApp(token=slack_bot_token, signing_secret=slack_signing_secret)
+    bolt.event("app_home_opened")(handle_app_home_opened)
+    bolt.event("message")(handle_message_events)
+    bolt.event("app_mention")(handle_app_mention_events)
+    bolt.action(re.compile("voiceflow_button_"))(handle_voiceflow_button)
+    return bolt
+
+def create_clients():
+    global bolt_app, slack_handler, slack, voiceflow, transcript_registrar
+    from slack_bolt.adapter.fastapi.async_handler import AsyncSlackRequestHandler
+
+    bolt_app = create_bolt_app()
+    slack_handler = AsyncSlackRequestHandler(bolt_app)
+    slack = SlackDispatcher(bolt_app.client)
+    voiceflow = VoiceflowAPI()
+    transcript_registrar = TranscriptRegistrar(voiceflow.create_transcript, conversations.mark_transcripts_created)
+
+@asynccontextmanager
+async def lifespan(app):
+    create_clients()
+    # Each component is closed (in reverse order) only if it started, even when a later step fails
+    async with AsyncExitStack() as stack:
+        await db.init_pool()
+        stack.push_async_callback(db.close_pool)
+        await db.ensure_schema()
+        await conversations.start()
+        stack.push_async_callback(conversations.close)
+        await voiceflow.start()
+        stack.push_async_callback(voiceflow.close)
+        await webpage.start()
+        stack.push_async_callback(webpage.close)
+        await downloads.start()
+        stack.push_async_callback(downloads.close)
+        documents.start()
+        stack.callback(documents.close)
+        slack.start()
+        stack.push_async_callback(slack.close)
+        transcript_registrar.start()
+        stack.push_async_callback(transcript_registrar.close)
+        stack.push_async_callback(conversation_scheduler.close)
+        jobs.start_workers(run_transcription_job, notify_transcription_failed)
+        stack.push_async_callback(jobs.stop_workers)
+        retention.start()
+        stack.push_async_callback(retention.close)
+        event_queue.start()
+        stack.push_async_callback(event_queue.close)
+        yield
 
 # FastAPI app to handle webhook routes
-app = FastAPI()
-slack_handler = AsyncSlackRequestHandler(bolt_app)
+app = FastAPI(lifespan=lifespan)
+
+# Cached view of the conversations table
+conversations = ConversationStore()
+
+# Serialises turns within a conversation; different conversations run in parallel
+conversation_scheduler = KeyedScheduler()
 
-# Initialize the Voiceflow API client
-voiceflow = VoiceflowAPI()
+# Acknowledged Slack events waiting for a worker
+event_queue = EventQueue()
+
+# Archives idle conversations and expires old rows
+# Archived ids leave the cache at once and the conversation filter after the pass
+retention = RetentionJob(on_archived=conversations.forget, after_archive=conversations.schedule_rebuild)
 
 @app.post("/slack/events")
 async def slack_events(request: Request):
+    if metrics.trace_ids_enabled:
+        # Listener tasks inherit this, so the ID follows the event through the logs
+        metrics.new_trace_id(request.headers.get("x-request-id"))
+    if request.headers.get("x-slack-retry-num"):
+        dedup.stats["slack_retries"] += 1
     return await slack_handler.handle(request)
 
-@bolt_app.event("app_home_opened")
 async def handle_app_home_opened(body, logger):
     logger.info("App home opened event received")
     # Add additional logic here if needed
 
+async def with_placeholder(work, say, thread_ts):
+    """Await ``work``, posting "Just a moment..." if it takes longer than 5s."""
+    task = asyncio.ensure_future(work)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout=5.0)
+    except asyncio.TimeoutError:
+        await say(text="Just a moment...", thread_ts=thread_ts)
+    return await task
+
+async def run_turn(conversation_id, user_input, say, thread_ts, reply=None):
+    """Run one Voiceflow turn, streaming into ``reply`` or posting "Just a moment..." after 5s."""
+    if reply is not None:
+        return await voiceflow.handle_user_input_stream(conversation_id, user_input, reply.update)
+    return await with_placeholder(voiceflow.handle_user_input(conversation_id, user_input), say, thread_ts)
+
+async def start_conversation(conversation_id, launch, user_input, reply=None):
+    """Finish the ``launch`` task, then send the user's first input if the session is still running."""
+    result = await launch
+    if result.is_running:
+        if reply is not None:
+            # The launch greeting is replaced by the reply to the user's text, so only the text turn streams
+            result = await voiceflow.handle_user_input_stream(conversation_id, user_input, reply.update)
+        else:
+            result = await voiceflow.handle_user_input(conversation_id, user_input)
+    return result
+
 async def process_message(event, say):
     user_id = event.get('user')
     channel_id = event.get('channel')
@@ -64,8 +172,10 @@ async def process_message(event, say):
     user_input = event.get('text', '').strip()
 
     logging.info(f"Processing message from user {user_id} in channel {channel_id}, thread {thread_ts}")
-    
+    reply = None
+
     async def send_response(user_input):
+        nonlocal reply
         if 'app_mention' in event['type']:
             user_input = re.sub(r"<@U[A-Z0-9]+>", "", user_input, count=1).strip()
 
@@ -74,107 +184,177 @@ async def process_message(event, say):
 
         combined_input = user_input
         files = event.get('files', [])
-        transcript_stored = False
 
-        if files:
+        # Recordings are transcribed in the background and don't start a turn
+        for file_info in files:
+            file_url = file_info.get('url_private_download')
+            file_type = file_info.get('filetype')
+            if file_url and (file_type == 'mp4' or file_type == 'm4a'):
+                title = user_input  # Using the message text as the title
+                await jobs.enqueue(conversation_id, user_id, channel_id, thread_ts, title, file_url, file_type)
+                await say(text=f"Thanks! I'm transcribing '{title}' and will let you know here when it's ready.", thread_ts=thread_ts)
+                return
+
+        with metrics.span("conversation.lookup"):
+            existing_conversation = await conversations.get(conversation_id)
+
+        launch = None
+        if not existing_conversation:
+            # Launch only needs the conversation id, so it runs while documents and URLs are read
+            launch = asyncio.create_task(voiceflow.launch(conversation_id))
+
+        try:
             for file_info in files:
                 file_url = file_info.get('url_private_download')
                 file_type = file_info.get('filetype')
-                if file_url and (file_type == 'mp4' or file_type == 'm4a'):
-                    transcription_text = await process_file(file_url, file_type)
-                    if transcription_text:
-                        title = user_input  # Using the message text as the title
-                        store_transcript(conversation_id, user_id, channel_id, thread_ts, title, transcription_text)
-                        transcript_stored = True
-                        await say(text=f"Thank you for uploading your '{title}' transcript", thread_ts=thread_ts)
-                    return
-
-        if not transcript_stored:
-            urls = re.findall(r'<http[s]?://[^>]+>', user_input)
-            for url in urls:
-                url = url[1:-1]
-                try:
-                    webpage_text = extract_webpage_content(url)
-                    if webpage_text:
-                        combined_input +="\n" + webpage_text
-                except Exception as e:
-                    logging.error(f"Error reading URL {url}: {str(e)}")
+                if file_url and file_type in documents.supported_types:
+                    document_text = await process_file(file_url, file_type)
+                    if document_text:
+                        combined_input += "\n" + document_text
+                    else:
+                        combined_input += "\n[A document was not read properly and has been skipped.]"
+
+            urls = [url[1:-1] for url in re.findall(r'<http[s]?://[^>]+>', user_input)]
+            with metrics.span("webpage.extract"):
+                webpage_texts = await webpage.extract_webpages(urls) if urls else []
+            for webpage_text in webpage_texts:
+                if webpage_text is None:
                     combined_input += "\n[A URL was not loaded properly and has been skipped.]"
+                elif webpage_text:
+                    combined_input += "\n" + webpage_text
 
-            with get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "SELECT button_payloads, transcript_created FROM conversations WHERE conversation_id = %s",
-                        (conversation_id,)
+            if streaming_replies:
+                reply = streaming.StreamingReply(slack, channel_id, thread_ts)
+                await reply.start()
+
+            if existing_conversation:
+                if not existing_conversation.transcript_created:
+                    transcript_registrar.register(conversation_id)
+
+                result = await run_turn(conversation_id, combined_input, say, thread_ts, reply)
+                with metrics.span("conversation.save"):
+                    await conversations.update_button_payloads(conversation_id, result.button_payloads)
+            else:
+                # Launch and the first turn share one "Just a moment..." timer
+                first_turn = start_conversation(conversation_id, launch, combined_input, reply)
+                if reply is not None:
+                    result = await first_turn
+                else:
+                    result = await with_placeholder(first_turn, say, thread_ts)
+
+                with metrics.span("conversation.save"):
+                    await conversations.create(
+                        conversation_id, user_id, channel_id, thread_ts, result.button_payloads, transcript_created=False
                     )
-                    existing_conversation = cur.fetchone()
-
-                    if existing_conversation:
-                        button_payloads, transcript_created = existing_conversation
-                        if not transcript_created:
-                            transcript_response = await voiceflow.create_transcript(conversation_id)
-                            logging.info(f"Transcript created: {transcript_response}")
-                            cur.execute(
-                                "UPDATE conversations SET transcript_created = TRUE WHERE conversation_id = %s",
-                                (conversation_id,)
-                            )
-
-                        voiceflow_task = asyncio.create_task(voiceflow.handle_user_input(conversation_id, combined_input))
-                        try:
-                            is_running, button_payloads = await asyncio.wait_for(asyncio.shield(voiceflow_task), timeout=5.0)
-                        except asyncio.TimeoutError:
-                            await say(text="Just a moment...", thread_ts=thread_ts)
-                        finally:
-                            is_running, button_payloads = await voiceflow_task
-
-                        cur.execute(
-                            "UPDATE conversations SET button_payloads = %s WHERE conversation_id = %s",
-                            (Json(button_payloads), conversation_id)
-                        )
-                    else:
-                        # Create a new transcript for new conversations
-                        transcript_response = await voiceflow.create_transcript(conversation_id)
-                        logging.info(f"Transcript created for new conversation: {transcript_response}")
-                        voiceflow_task_launch = asyncio.create_task(voiceflow.handle_user_input(conversation_id, {'type': 'launch'}))
-                        try:
-                            is_running, button_payloads = await asyncio.wait_for(asyncio.shield(voiceflow_task_launch), timeout=5.0)
-                        except asyncio.TimeoutError:
-                            await say(text="Just a moment...", thread_ts=thread_ts)
-                        finally:
-                            is_running, button_payloads = await voiceflow_task_launch
-
-                        if is_running:
-                            voiceflow_task_input = asyncio.create_task(voiceflow.handle_user_input(conversation_id, combined_input))
-                            try:
-                                is_running, button_payloads = await asyncio.wait_for(asyncio.shield(voiceflow_task_input), timeout=5.0)
-                            except asyncio.TimeoutError:
-                                await say(text="Just a moment...", thread_ts=thread_ts)
-                            finally:
-                                is_running, button_payloads = await voiceflow_task_input
-
-                        cur.execute(
-                            "INSERT INTO conversations (conversation_id, user_id, channel_id, thread_ts, button_payloads, transcript_created) VALUES (%s, %s, %s, %s, %s, TRUE)",
-                            (conversation_id, user_id, channel_id, thread_ts, Json(button_payloads))
-                        )
-
-            blocks, summary_text = create_message_blocks(voiceflow.get_responses(), button_payloads)
+                # Registered once the row exists, so the registrar's bulk update can flip its flag
+                transcript_registrar.register(conversation_id)
+        finally:
+            if launch is not None and not launch.done():
+                launch.cancel()
+
+        if reply is not None:
+            await reply.finish(result)
+        else:
+            with metrics.span("blocks.build"):
+                blocks, summary_text = create_message_blocks(result.messages, result.button_payloads)
             logging.info(f"Sending blocks: {blocks}, summary_text: {summary_text}, thread_ts: {thread_ts}")
-            await say(blocks=blocks, text=summary_text, thread_ts=thread_ts)
+            with metrics.span("slack.reply"):
+                await say(blocks=blocks, text=summary_text, thread_ts=thread_ts)
+
+    async def send_error(text):
+        # A streamed reply would otherwise be left showing "Just a moment..." or a partial turn
+        if reply is not None and reply.ts is not None:
+            await reply.fail(text)
+        else:
+            await say(text=text, thread_ts=thread_ts)
 
     try:
-        await send_response(user_input)
+        with metrics.span("turn.message"):
+            await send_response(user_input)
+    except resilience.UpstreamUnavailable as e:
+        logging.error(f"Not processing message: {e}")
+        await send_error(upstream_error_message(e))
     except Exception as e:
         logging.error(f"Error processing message: {e}")
-        await say(text="An error occurred while processing your request.", thread_ts=thread_ts)
+        await send_error("An error occurred while processing your request.")
         
-@bolt_app.event("message")
-async def handle_message_events(event, say):
+def upstream_error_message(error):
+    return slow_upstream_message if isinstance(error, resilience.DeadlineExceeded) else unavailable_message
+
+def merge_message_events(events):
+    """Fold text messages that queued up behind a running turn into a single turn."""
+    merged = dict(events[0])
+    merged['text'] = "\n".join(event.get('text', '').strip() for event in events)
+    return merged
+
+async def schedule_message(event, say):
+    thread_ts = event.get('thread_ts', event['ts'])
+    conversation_id = f"{event.get('channel')}-{thread_ts}"
+    coalescible = coalesce_messages and event.get('type') == 'message' and not event.get('files')
+    try:
+        turn = conversation_scheduler.submit(
+            conversation_id,
+            lambda queued_event: process_message(queued_event, say),
+            event,
+            coalesce=merge_message_events if coalescible else None
+        )
+    except SchedulerBusy:
+        await say(text=busy_message, thread_ts=thread_ts)
+        return
+    # Not awaited: the event-queue worker moves on while the turn waits behind earlier ones in
+    # its thread; the scheduler's SCHEDULER_MAX_RUNNING bounds turns in flight
+    turn.add_done_callback(log_turn_failure)
+
+def log_turn_failure(turn):
+    if not turn.cancelled() and turn.exception() is not None:
+        logging.error(f"Unhandled error in conversation turn: {turn.exception()}")
+
+async def ingest(handle, body, event, replies):
+    """
+    Hand an event to the worker pool, so the listener returns as soon as
+    Slack has been acknowledged. If the queue is full the event is dropped,
+    with a busy reply when ``replies(event)`` says the bot would have answered.
+    """
+    if not event_queue.workers:
+        await handle(body, event)
+        return
+    if event_queue.offer(handle, body, event):
+        return
+    logging.warning(f"Event queue full ({event_queue.depth()} waiting), shedding event {event.get('ts')}")
+    try:
+        if await replies(event):
+            # Behind real replies in the dispatcher, so shedding doesn't slow the events being processed
+            await slack.chat_postMessage(
+                priority=NOTIFICATION,
+                channel=event.get('channel'), text=overloaded_message, thread_ts=event.get('thread_ts', event.get('ts'))
+            )
+    except Exception as e:
+        logging.error(f"Error sending busy reply: {e}")
+
+async def is_conversation_message(event):
+    if event.get('channel_type') == 'im':
+        return True
+    thread_ts = event.get('thread_ts')
+    return bool(thread_ts) and await conversations.exists(f"{event.get('channel')}-{thread_ts}")
+
+async def is_new_mention(event):
+    return event.get('channel_type') != 'im' and not event.get('thread_ts')
+
+async def handle_message_events(body, event):
     # Ignore messages from the bot itself to avoid loops
     if event.get('user') == bot_user_id:
         return
-    
+
+    # Drop Slack retries and listener overlap before touching the database
+    if dedup.seen(body, event):
+        return
+
+    await ingest(process_message_event, body, event, is_conversation_message)
+
+async def process_message_event(body, event):
     if event.get('channel_type') == 'im':
-        await process_message(event, say)
+        if await dedup.claim(body, event):
+            await schedule_message(event, slack.sayer(event.get('channel')))
     else:
         # Extract the necessary identifiers from the event
         thread_ts = event.get('thread_ts', event.get('ts'))
@@ -182,29 +362,25 @@ async def handle_message_events(event, say):
         channel_id = event.get('channel')
 
         # Check if the message is part of a thread that the bot is involved in
-        with get_db_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "SELECT 1 FROM conversations WHERE conversation_id = %s",
-                    (f"{channel_id}-{thread_ts}",)
-                )
-                conversation_exists = cur.fetchone()
+        conversation_exists = is_threaded and await conversations.exists(f"{channel_id}-{thread_ts}")
 
-        if is_threaded and conversation_exists:
+        if conversation_exists and await dedup.claim(body, event):
             # Process the message as part of the ongoing conversation
-            await process_message(event, say)
+            await schedule_message(event, slack.sayer(event.get('channel')))
             
-@bolt_app.event("app_mention")
-async def handle_app_mention_events(event, say):
+async def handle_app_mention_events(body, event):
     if event.get('user') == bot_user_id:
         return
 
     # Check if the event has already been processed by handle_message_events
-    if event.get('channel_type') != 'im' and not bool(event.get('thread_ts')):
-        await process_message(event, say)
+    if await is_new_mention(event):
+        await ingest(process_app_mention_event, body, event, is_new_mention)
+
+async def process_app_mention_event(body, event):
+    if await dedup.claim(body, event):
+        await schedule_message(event, slack.sayer(event.get('channel')))
 
-@bolt_app.action(re.compile("voiceflow_button_"))
-async def handle_voiceflow_button(ack, body, client, say, logger):
+async def handle_voiceflow_button(ack, body, logger):
     await ack()  # Acknowledge the action
 
     # Immediate update to remove the buttons
@@ -213,7 +389,7 @@ async def handle_voiceflow_button(ack, body, client, say, logger):
     try:
         original_blocks = body['message'].get('blocks', [])
         updated_blocks = [block for block in original_blocks if block['type'] != 'actions']
-        await client.chat_update(
+        await slack.chat_update(
             channel=channel_id,
             ts=message_ts,
             blocks=updated_blocks,
@@ -222,6 +398,8 @@ async def handle_voiceflow_button(ack, body, client, say, logger):
     except Exception as e:
         logger.error(f"Failed to update message immediately to remove buttons: {e}")
 
+    if metrics.trace_ids_enabled:
+        metrics.new_trace_id()
     action_id = body['actions'][0]['action_id']
     user_id = body['user']['id']
     thread_ts = body['message'].get('thread_ts', body['message']['ts'])
@@ -232,7 +410,7 @@ async def handle_voiceflow_button(ack, body, client, say, logger):
 
     # Post the selected button text immediately
     try:
-        await client.chat_postMessage(
+        await slack.chat_postMessage(
             channel=channel_id,
             text=f"_Selected: {button_text}_",
             thread_ts=thread_ts
@@ -240,63 +418,152 @@ async def handle_voiceflow_button(ack, body, client, say, logger):
     except Exception as e:
         logger.error(f"Failed to post selected button text: {e}")
 
-    # Database interaction and Voiceflow processing
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT button_payloads FROM conversations WHERE conversation_id = %s",
-                (conversation_id,)
-            )
-            existing_conversation = cur.fetchone()
+    # Database interaction and Voiceflow processing, ordered with other turns in this thread
+    async def advance_conversation(button_index):
+        with metrics.span("turn.button"):
+            await advance(button_index)
 
-            if existing_conversation:
-                button_payloads = existing_conversation[0]
-                button_payload = button_payloads.get(str(button_index + 1))
-
-                if button_payload:
-                    # Process the button action to advance the conversation
-                    is_running, new_button_payloads = await voiceflow.handle_user_input(conversation_id, button_payload)
-                    cur.execute(
-                        "UPDATE conversations SET button_payloads = %s WHERE conversation_id = %s",
-                        (Json(new_button_payloads), conversation_id)
-                    )
+    async def advance(button_index):
+        conversation = await conversations.get(conversation_id)
 
-                    # Send a new message reflecting the next stage in the conversation
-                    if is_running:
-                        blocks, summary_text = create_message_blocks(voiceflow.get_responses(), new_button_payloads)
-                        await client.chat_postMessage(channel=channel_id, text=summary_text, blocks=blocks, thread_ts=thread_ts)
-                else:
-                    # Respond in the correct thread if the choice wasn't understood
-                    await client.chat_postMessage(channel=channel_id, text="Sorry, I didn't understand that choice.", thread_ts=thread_ts)
+        if conversation is not None:
+            button_payload = (conversation.button_payloads or {}).get(str(button_index + 1))
+
+            if button_payload:
+                # Process the button action to advance the conversation
+                result = await voiceflow.handle_user_input(conversation_id, button_payload)
+                await conversations.update_button_payloads(conversation_id, result.button_payloads)
+
+                # Send a new message reflecting the next stage in the conversation
+                if result.is_running:
+                    blocks, summary_text = create_message_blocks(result.messages, result.button_payloads)
+                    await slack.chat_postMessage(channel=channel_id, text=summary_text, blocks=blocks, thread_ts=thread_ts)
             else:
-                # Respond in the correct thread if no conversation was found
-                await client.chat_postMessage(channel=channel_id, text="Sorry, I couldn't find your conversation.", thread_ts=thread_ts)
+                # Respond in the correct thread if the choice wasn't understood
+                await slack.chat_postMessage(channel=channel_id, text="Sorry, I didn't understand that choice.", thread_ts=thread_ts)
+        else:
+            # Respond in the correct thread if no conversation was found
+            await slack.chat_postMessage(channel=channel_id, text="Sorry, I couldn't find your conversation.", thread_ts=thread_ts)
+
+    try:
+        await conversation_scheduler.submit(conversation_id, advance_conversation, button_index)
+    except SchedulerBusy:
+        await slack.chat_postMessage(channel=channel_id, text=busy_message, thread_ts=thread_ts)
+    except resilience.UpstreamUnavailable as e:
+        logging.error(f"Not advancing conversation {conversation_id}: {e}")
+        await slack.chat_postMessage(channel=channel_id, text=upstream_error_message(e), thread_ts=thread_ts)
                 
+def completion_message(user_id, document_id):
+    return f"Hey <@{user_id}>! 🎉 I've just finished crafting your requested document. Take a peek at the following link https://docs.google.com/document/d/{document_id} and let us know your thoughts!"
+
 async def notify_user_completion(conversation_id, document_id):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT user_id, channel_id, thread_ts FROM conversations WHERE conversation_id = %s",
-                (conversation_id,)
-            )
-            conversation_details = cur.fetchone()
+    conversation = await conversations.get(conversation_id)
 
-    if conversation_details:
-        user_id, channel_id, thread_ts = conversation_details
+    if conversation:
+        user_id, channel_id, thread_ts = conversation.user_id, conversation.channel_id, conversation.thread_ts
 
         # Construct the notification message, tagging the user
-        completion_message = f"Hey <@{user_id}>! 🎉 I've just finished crafting your requested document. Take a peek at the following link https://docs.google.com/document/d/{document_id} and let us know your thoughts!"
+        completion_text = completion_message(user_id, document_id)
 
         # Use the correct Bolt app instance to send the message
         try:
-            await bolt_app.client.chat_postMessage(
+            await slack.chat_postMessage(
+                priority=NOTIFICATION,
                 channel=channel_id, 
-                text=completion_message, 
+                text=completion_text, 
                 thread_ts=thread_ts  # Ensure the message is sent as a reply in the thread
             )
         except Exception as e:
             logging.info(f"Error sending completion notification: {e}")
 
+def valid_field(item, field):
+    """``item[field]`` if it is a non-empty string, else None."""
+    value = item.get(field) if isinstance(item, dict) else None
+    return value if isinstance(value, str) and value else None
+
+async def notify_batch(items, build_message, required_fields=()):
+    """
+    Post ``build_message(conversation, item)`` to each item's conversation.
+    All conversations are looked up together and at most
+    ``task_notify_concurrency`` posts are in flight; returns one status per item.
+    Items without a string conversation_id or any of ``required_fields`` fail on their own.
+    """
+    found = await conversations.get_many(filter(None, (valid_field(item, 'conversation_id') for item in items)))
+    limit = asyncio.Semaphore(task_notify_concurrency)
+
+    async def notify(item):
+        conversation_id = valid_field(item, 'conversation_id')
+        if not conversation_id:
+            return {"conversation_id": None, "status": "error", "message": "Missing or invalid conversation_id"}
+        for field in required_fields:
+            if not valid_field(item, field):
+                return {"conversation_id": conversation_id, "status": "error", "message": f"Missing or invalid {field}"}
+        conversation = found.get(conversation_id)
+        if conversation is None:
+            return {"conversation_id": conversation_id, "status": "error", "message": "Conversation not found"}
+        async with limit:
+            try:
+                await slack.chat_postMessage(
+                    priority=NOTIFICATION,
+                    channel=conversation.channel_id,
+                    text=build_message(conversation, item),
+                    thread_ts=conversation.thread_ts
+                )
+            except Exception as e:
+                logging.info(f"Error sending notification to {conversation_id}: {e}")
+                return {"conversation_id": conversation_id, "status": "error", "message": str(e)}
+        return {"conversation_id": conversation_id, "status": "success"}
+
+    return await asyncio.gather(*(notify(item) for item in items))
+
+async def read_batch(request):
+    """The items of a batch request: a JSON list, or an object with an "items" list."""
+    data = await request.json()
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a list of items")
+    if len(items) > task_batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {task_batch_max_items} items per batch"
+        )
+    return items
+
+def batch_response(results):
+    failed = sum(1 for result in results if result["status"] != "success")
+    overall = "success" if not failed else "error" if failed == len(results) else "partial"
+    return {"status": overall, "succeeded": len(results) - failed, "failed": failed, "results": results}
+
+async def run_transcription_job(job):
+    transcription_text, content_hash = await utils.transcribe_upload(job['file_url'], job['file_type'])
+    if not transcription_text:
+        raise jobs.JobError("Transcription failed or returned no text")
+
+    await db.store_transcript(
+        job['conversation_id'], job['user_id'], job['channel_id'], job['thread_ts'], job['title'], transcription_text,
+        content_hash=content_hash
+    )
+    try:
+        await slack.chat_postMessage(
+            priority=NOTIFICATION,
+            channel=job['channel_id'],
+            text=f"<@{job['user_id']}> Thank you for uploading your '{job['title']}' transcript",
+            thread_ts=job['thread_ts']
+        )
+    except Exception as e:
+        logging.info(f"Error sending transcript notification: {e}")
+
+async def notify_transcription_failed(job, error):
+    try:
+        await slack.chat_postMessage(
+            priority=NOTIFICATION,
+            channel=job['channel_id'],
+            text=f"<@{job['user_id']}> Sorry, I couldn't transcribe '{job['title']}'. Please try uploading it again.",
+            thread_ts=job['thread_ts']
+        )
+    except Exception as e:
+        logging.info(f"Error sending transcription failure notification: {e}")
+
 # Correctly define the /task-completed endpoint within Flask app context
 @app.post("/task-completed")
 async def task_completed(request: Request):
@@ -309,24 +576,25 @@ async def task_completed(request: Request):
     else:
         return {"status": "error", "message": "Missing conversation_id"}
 
-async def notify_user_start(conversation_id):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT channel_id, thread_ts FROM conversations WHERE conversation_id = %s",
-                (conversation_id,)
-            )
-            conversation_details = cur.fetchone()
+@app.post("/task-completed/batch")
+async def task_completed_batch(request: Request):
+    items = await read_batch(request)
+    results = await notify_batch(
+        items, lambda conversation, item: completion_message(conversation.user_id, item['document_id']),
+        required_fields=('document_id',)
+    )
+    return batch_response(results)
 
-    if conversation_details:
-        channel_id, thread_ts = conversation_details
+async def notify_user_start(conversation_id):
+    conversation = await conversations.get(conversation_id)
 
-        # Construct the start notification message, tagging the user
-        start_message = "Thankyou, I will start working on it. I will notify you when I'm done. It will take around 5 minutes."
+    if conversation:
+        channel_id, thread_ts = conversation.channel_id, conversation.thread_ts
 
         # Use the correct Bolt app instance to send the message
         try:
-            await bolt_app.client.chat_postMessage(
+            await slack.chat_postMessage(
+                priority=NOTIFICATION,
                 channel=channel_id, 
                 text=start_message, 
                 thread_ts=thread_ts  # Ensure the message is sent as a reply in the thread
@@ -343,11 +611,108 @@ async def task_started(request: Request):
         return {"status": "success", "message": "Task start notification sent"}
     else:
         return {"status": "error", "message": "Missing conversation_id"}
-    
-@app.get("/transcript/{title}")
+
+@app.post("/task-started/batch")
+async def task_started_batch(request: Request):
+    items = await read_batch(request)
+    return batch_response(await notify_batch(items, lambda conversation, item: start_message))
+
+
+def require_transcript_token(authorization: str = Header(None)):
+    """Allow only requests carrying ``Authorization: Bearer <TRANSCRIPT_API_TOKEN>``."""
+    if not transcript_api_token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Transcript API is disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), transcript_api_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+@app.get("/transcript/{title}", dependencies=[Depends(require_transcript_token)])
 async def fetch_transcript(title: str):
-    transcript = get_transcript(title)
-    if transcript:
-        return {"title": title, "transcript": transcript}
-    else:
-        return {"error": "Transcript not found"}, status.HTTP_404_NOT_FOUND
\ No newline at end of file
+    """Legacy lookup by exact title; same JSON as before, streamed in chunks."""
+    conversation_id = await db.get_transcript_id(title)
+    if conversation_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transcript not found")
+    return StreamingResponse(transcripts.iter_json(conversation_id, title), media_type="application/json")
+
+
+@app.get("/transcripts", dependencies=[Depends(require_transcript_token)])
+async def list_transcripts(
+    channel_id: str = None, title: str = None, q: str = None, cursor: str = None,
+    limit: int = Query(50, ge=1, le=transcripts.max_page_size),
+):
+    try:
+        items, next_cursor = await transcripts.find(channel_id, title, q, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+async def transcript_info(conversation_id):
+    info = await db.get_transcript_info(conversation_id)
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Transcript not found")
+    return dict(info)
+
+
+@app.get("/transcripts/{conversation_id}", dependencies=[Depends(require_transcript_token)])
+async def get_transcript_metadata(conversation_id: str):
+    return await transcript_info(conversation_id)
+
+
+@app.get("/transcripts/{conversation_id}/text", dependencies=[Depends(require_transcript_token)])
+async def stream_transcript_text(conversation_id: str):
+    await transcript_info(conversation_id)
+    return StreamingResponse(transcripts.iter_text(conversation_id), media_type="text/vtt")
+
+
+@app.get("/transcripts/{conversation_id}/segments", dependencies=[Depends(require_transcript_token)])
+async def get_transcript_segments(
+    conversation_id: str, start: int = Query(0, ge=0), end: int = Query(None, ge=0),
+    from_seconds: float = Query(None, ge=0), to_seconds: float = Query(None, ge=0),
+):
+    await transcript_info(conversation_id)
+    cues = await transcripts.segments(conversation_id, start, end, from_seconds, to_seconds)
+    return {"conversation_id": conversation_id, "segments": [cue.as_dict() for cue in cues]}
+
+@app.get("/stats")
+async def stats():
+    return await collect_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(await collect_stats()), media_type="text/plain; version=0.0.4")
+
+
+async def collect_stats():
+    return {
+        "db_pool": db.pool_stats(),
+        "voiceflow_http": voiceflow.connection_stats.as_dict(),
+        "circuit_breakers": {"voiceflow": voiceflow.breaker.as_dict(), "openai": utils.openai_breaker.as_dict()},
+        "voiceflow_launch": dict(voiceflow.launch_stats, snapshots_enabled=voiceflow.launch_snapshots),
+        "webpage_http": webpage.connection_stats.as_dict(),
+        "webpage_cache": webpage.content_cache.as_dict(),
+        "download_http": downloads.connection_stats.as_dict(),
+        "event_dedup": dedup.as_dict(),
+        "conversations": conversations.as_dict(),
+        "event_queue": event_queue.as_dict(),
+        "conversation_scheduler": conversation_scheduler.as_dict(),
+        "slack_dispatcher": slack.as_dict(),
+        "transcript_registrar": transcript_registrar.as_dict(),
+        "streaming_replies": dict(streaming.stats, enabled=streaming_replies),
+        "transcription_jobs": dict(jobs.stats(), by_status=await jobs_by_status()),
+        "retention": retention.as_dict(),
+        "transcript_reuse": dict(utils.reuse_stats, enabled=utils.reuse_transcripts),
+    }
+
+
+async def jobs_by_status():
+    try:
+        return await db.transcription_job_counts()
+    except Exception as e:
+        logging.error(f"Error counting transcription jobs: {e}")
+        return {}
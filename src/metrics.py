@@ -0,0 +1,150 @@
+import contextvars
+import logging
+import math
+import os
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+namespace = "ai_assistant"
+trace_ids_enabled = os.getenv("TRACE_IDS", "true").lower() in ("1", "true", "yes")
+
+default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+trace_id_var = contextvars.ContextVar("trace_id", default="-")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = f"{namespace}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=default_buckets):
+        self.name = f"{namespace}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, *labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series["counts"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def totals(self):
+        """{labels: (count, sum)} for every series."""
+        return {labels: (series["count"], series["sum"]) for labels, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        bucket_names = self.labelnames + ("le",)
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_names, labels + ('+Inf',))} {series['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series['count']}")
+        return lines
+
+
+stage_duration = Histogram("stage_duration_seconds", "Time spent in each stage of handling a turn.", ["stage"])
+stage_errors = Counter("stage_errors_total", "Stages that ended with an exception.", ["stage"])
+_metrics = [stage_duration, stage_errors]
+
+
+@contextmanager
+def span(stage):
+    """Time a block (sync or containing awaits) under ``stage``."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        # Cancellation is not an upstream failure
+        if not isinstance(e, GeneratorExit) and e.__class__.__name__ != "CancelledError":
+            stage_errors.inc(stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_duration.observe(stage, value=elapsed)
+        logging.debug(f"{stage} took {elapsed * 1000:.1f}ms")
+
+
+def new_trace_id(trace_id=None):
+    """Start a new trace for the current task (and tasks it creates)."""
+    trace_id = trace_id or uuid.uuid4().hex[:12]
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+def install_log_trace_ids():
+    """Add ``trace_id`` to every log record so formats can use %(trace_id)s."""
+    factory = logging.getLogRecordFactory()
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.trace_id = trace_id_var.get()
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, nested in value.items():
+            _flatten(f"{prefix}_{key}", nested, out)
+    elif isinstance(value, (int, float)) and not (isinstance(value, float) and math.isnan(value)):
+        out.append((prefix, value))
+
+
+def render(stats=None):
+    """
+    Prometheus text exposition of the stage metrics, plus every numeric value
+    in ``stats`` (the /stats sections) as a gauge.
+    """
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    flattened = []
+    for section, values in (stats or {}).items():
+        _flatten(f"{namespace}_{section}", values, flattened)
+    for name, value in flattened:
+        name = "".join(char if char.isalnum() or char == "_" else "_" for char in name)
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+import aiohttp
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was refused or abandoned; callers should fail fast."""
+
+    def __init__(self, upstream, message):
+        super().__init__(message)
+        self.upstream = upstream
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """Raised without calling the upstream while its breaker is open."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """Raised when a call (including its retries) runs past its deadline."""
+
+
+class UpstreamFailed(UpstreamUnavailable):
+    """Raised when the upstream kept failing (5xx, 429, connection errors) and no retry was left."""
+
+
+def is_upstream_failure(error):
+    """Errors that say the upstream is unhealthy, as opposed to a bad request."""
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        # OpenAI SDK errors
+        return status >= 500 or status == 429
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientError, ConnectionError)) \
+        or error.__class__.__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def never_sent(error):
+    """True if the request can't have reached the upstream, so even a non-idempotent call may be retried."""
+    return isinstance(error, aiohttp.ClientConnectorError)
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast after ``failure_threshold`` consecutive upstream failures.
+
+    After ``reset_timeout`` seconds one probe call is let through (half
+    open); its success closes the breaker and its failure re-opens it.
+    Settings are read from ``<PREFIX>_BREAKER_*`` environment variables.
+    """
+
+    def __init__(self, prefix, failure_threshold=None, reset_timeout=None):
+        self.name = prefix.lower()
+        self.failure_threshold = failure_threshold or int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5"))
+        self.reset_timeout = reset_timeout or float(os.getenv(f"{prefix}_BREAKER_RESET_TIMEOUT", "30"))
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "rejected": 0, "opened": 0, "retries": 0, "deadlines": 0}
+
+    def check(self):
+        """Raise CircuitOpen unless a call may go ahead now."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+            self.stats["rejected"] += 1
+            raise CircuitOpen(self.name, f"{self.name} is unavailable (circuit open)")
+        if self.state == HALF_OPEN:
+            self._probing = True
+        self.stats["calls"] += 1
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self.consecutive_failures = 0
+        self._probing = False
+        if self.state != CLOSED:
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self._transition(OPEN)
+
+    def _transition(self, state):
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.stats["opened"] += 1
+            logging.error(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+        else:
+            logging.warning(f"Circuit for {self.name} is now {state}")
+        self.state = state
+
+    def as_dict(self):
+        return dict(
+            self.stats, state=self.state, is_open=self.state == OPEN, is_half_open=self.state == HALF_OPEN,
+            consecutive_failures=self.consecutive_failures,
+        )
+
+
+def retry_delay(attempt, base=0.2, cap=2.0):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+async def call(breaker, make_call, deadline, retries=0, idempotent=False):
+    """
+    Run ``make_call()`` through ``breaker`` with a hard ``deadline`` (seconds,
+    covering every attempt). Idempotent calls are retried up to ``retries``
+    times on upstream failures; others only when the request was never sent.
+    """
+    breaker.check()
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            result = await asyncio.wait_for(make_call(), timeout=max(0.0, give_up_at - time.monotonic()))
+        except asyncio.CancelledError:
+            breaker._probing = False
+            raise
+        except Exception as e:
+            if not is_upstream_failure(e):
+                # The upstream answered; the request itself was wrong
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            delay = retry_delay(attempt)
+            retryable = idempotent or never_sent(e)
+            if attempt <= retries and retryable and time.monotonic() + delay < give_up_at:
+                breaker.stats["retries"] += 1
+                logging.warning(f"{breaker.name} call failed (attempt {attempt}), retrying in {delay:.2f}s: {e!r}")
+                await asyncio.sleep(delay)
+                breaker.check()
+                continue
+            if isinstance(e, asyncio.TimeoutError):
+                breaker.stats["deadlines"] += 1
+                raise DeadlineExceeded(breaker.name, f"{breaker.name} did not respond within {deadline:g}s") from e
+            raise UpstreamFailed(breaker.name, f"{breaker.name} is unavailable: {e!r}") from e
+        breaker.record_success()
+        return result
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import os
+import random
+
+from src import db
+
+day = 24 * 60 * 60
+# 0 disables each rule; all are opt-in, since an archived thread's next reply starts a new conversation
+conversation_idle_days = float(os.getenv("CONVERSATION_IDLE_DAYS", "0"))
+archive_retention_days = float(os.getenv("CONVERSATION_ARCHIVE_DAYS", "0"))
+transcript_retention_days = float(os.getenv("TRANSCRIPT_RETENTION_DAYS", "0"))
+retention_interval = float(os.getenv("RETENTION_INTERVAL", "3600"))
+retention_batch_size = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+# Pause between batches, so a large backlog doesn't hold locks or flood the WAL in one go
+retention_batch_pause = float(os.getenv("RETENTION_BATCH_PAUSE", "0.1"))
+
+
+class RetentionJob:
+    """
+    Periodically expires old rows in batches.
+
+    Conversations idle for CONVERSATION_IDLE_DAYS move to
+    conversations_archive (their ids are passed to ``on_archived`` so caches
+    can drop them, and ``after_archive()`` is called once the pass is done),
+    archived ones are deleted after CONVERSATION_ARCHIVE_DAYS
+    and transcripts after TRANSCRIPT_RETENTION_DAYS. Batches use SKIP
+    LOCKED, so every worker can run the job without coordination.
+    """
+
+    def __init__(self, on_archived=None, after_archive=None, interval=retention_interval, batch_size=retention_batch_size):
+        self.on_archived = on_archived
+        self.after_archive = after_archive
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task = None
+        self.stats = {"runs": 0, "errors": 0, "archived": 0, "purged_archive": 0, "purged_transcripts": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        # Spread workers that started together
+        await asyncio.sleep(random.uniform(0, min(self.interval, 60)))
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self):
+        self.stats["runs"] += 1
+        if conversation_idle_days > 0:
+            archived_before = self.stats["archived"]
+            await self._drain("archived", self._archive_batch)
+            if self.stats["archived"] > archived_before and self.after_archive is not None:
+                self.after_archive()
+        if archive_retention_days > 0:
+            await self._drain(
+                "purged_archive", lambda: db.purge_archived_conversations(archive_retention_days * day, self.batch_size)
+            )
+        if transcript_retention_days > 0:
+            await self._drain(
+                "purged_transcripts", lambda: db.purge_transcripts(transcript_retention_days * day, self.batch_size)
+            )
+
+    async def _archive_batch(self):
+        conversation_ids = await db.archive_idle_conversations(conversation_idle_days * day, self.batch_size)
+        if conversation_ids and self.on_archived is not None:
+            self.on_archived(conversation_ids)
+        return len(conversation_ids)
+
+    async def _drain(self, stat, run_batch):
+        """Run ``run_batch()`` until it returns a partial batch."""
+        total = 0
+        try:
+            while True:
+                count = await run_batch()
+                total += count
+                self.stats[stat] += count
+                if count < self.batch_size:
+                    break
+                await asyncio.sleep(retention_batch_pause)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logging.error(f"Retention error ({stat}): {e}")
+        if total:
+            logging.info(f"Retention: {stat} {total} rows")
+
+    def as_dict(self):
+        return dict(
+            self.stats, conversation_idle_days=conversation_idle_days,
+            archive_retention_days=archive_retention_days, transcript_retention_days=transcript_retention_days,
+        )
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from src import metrics
+
+max_queue_per_key = int(os.getenv("SCHEDULER_MAX_QUEUE_PER_KEY", "5"))
+# Turns running at once across all keys, and items waiting across all keys before new work is refused
+max_running = int(os.getenv("SCHEDULER_MAX_RUNNING", "50"))
+max_pending = int(os.getenv("SCHEDULER_MAX_PENDING", "1000"))
+shutdown_timeout = float(os.getenv("SCHEDULER_SHUTDOWN_TIMEOUT", "10"))
+
+
+class SchedulerBusy(Exception):
+    """Raised when a key's queue is full."""
+
+
+@dataclass
+class _Item:
+    run: Callable
+    payload: Any
+    coalesce: Optional[Callable]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # The submitter's context (e.g. its trace ID), which the run executes in
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class KeyedScheduler:
+    """
+    Runs submitted work one at a time per key, and different keys in parallel.
+
+    Items submitted with the same ``coalesce`` function that are waiting
+    back to back in a key's queue are merged into one run:
+    ``coalesce([payload, ...])`` builds the merged payload and every
+    submitter receives the same result.
+
+    At most ``max_running`` runs execute at once; a key waiting for a slot
+    keeps coalescing what queues up behind it. ``submit`` refuses work once
+    ``max_queue`` items wait for the key or ``max_pending`` wait overall.
+    """
+
+    def __init__(self, max_queue=max_queue_per_key, max_running=max_running, max_pending=max_pending):
+        self.max_queue = max_queue
+        self.max_running = max_running
+        self.max_pending = max_pending
+        self._running = asyncio.Semaphore(max_running)
+        self._active = 0
+        self._queues = {}
+        self._workers = {}
+        self.stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "coalesced": 0,
+            "max_queue_depth": 0, "wait_seconds_total": 0.0, "max_wait_seconds": 0.0,
+        }
+
+    def submit(self, key, run, payload, coalesce=None):
+        """Queue ``run(payload)`` behind earlier work for ``key``; returns a future for its result."""
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise SchedulerBusy(f"{len(queue)} items already queued for {key}")
+        if self.queue_depth() >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise SchedulerBusy(f"{self.max_pending} items already queued")
+        future = asyncio.get_running_loop().create_future()
+        queue.append(_Item(run, payload, coalesce, future))
+        self.stats["submitted"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(queue))
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._drain(key))
+        return future
+
+    async def _drain(self, key):
+        queue = self._queues[key]
+        try:
+            while queue:
+                async with self._running:
+                    self._active += 1
+                    try:
+                        await self._run_next(key, queue)
+                    finally:
+                        self._active -= 1
+        finally:
+            for item in queue:
+                if not item.future.done():
+                    item.future.cancel()
+            del self._queues[key]
+            del self._workers[key]
+
+    async def _run_next(self, key, queue):
+        """Run the item at the head of ``queue``, merged with coalescible items behind it."""
+        item = queue.popleft()
+        batch = [item]
+        if item.coalesce is not None:
+            while queue and queue[0].coalesce is item.coalesce:
+                batch.append(queue.popleft())
+        batch = [queued for queued in batch if not queued.future.cancelled()]
+        if not batch:
+            return
+
+        now = time.monotonic()
+        for queued in batch:
+            waited = now - queued.enqueued_at
+            self.stats["wait_seconds_total"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+            metrics.stage_duration.observe("scheduler.wait", value=waited)
+        if len(batch) > 1:
+            self.stats["coalesced"] += len(batch) - 1
+            logging.info(f"Coalesced {len(batch)} queued items for {key}")
+            payload = item.coalesce([queued.payload for queued in batch])
+        else:
+            payload = batch[0].payload
+
+        try:
+            result = await batch[0].context.run(asyncio.create_task, batch[0].run(payload))
+        except Exception as e:
+            self.stats["failed"] += 1
+            for queued in batch:
+                if not queued.future.done():
+                    queued.future.set_exception(e)
+        else:
+            self.stats["completed"] += 1
+            for queued in batch:
+                if not queued.future.done():
+                    queued.future.set_result(result)
+
+    async def close(self, timeout=shutdown_timeout):
+        """Give running and queued work ``timeout`` seconds to finish, then cancel the rest."""
+        workers = list(self._workers.values())
+        if workers and timeout > 0:
+            await asyncio.wait(workers, timeout=timeout)
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def queue_depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def as_dict(self):
+        return dict(
+            self.stats, active_keys=len(self._workers), queued=self.queue_depth(),
+            running=self._active, max_running=self.max_running,
+        )
@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from slack_sdk.errors import SlackApiError
+
+from src import metrics
+
+# Priority lanes, drained in this order
+USER_REPLY = 0
+NOTIFICATION = 1
+
+dispatch_concurrency = int(os.getenv("SLACK_DISPATCH_CONCURRENCY", "4"))
+channel_rate = float(os.getenv("SLACK_CHANNEL_RATE", "1"))
+channel_burst = float(os.getenv("SLACK_CHANNEL_BURST", "3"))
+max_retries = int(os.getenv("SLACK_MAX_RETRIES", "5"))
+
+# (sustained calls per second, burst) per Web API method, workspace-wide
+method_limits = {
+    "chat.postMessage": (float(os.getenv("SLACK_POST_RATE", "5")), 20),
+    "chat.update": (float(os.getenv("SLACK_UPDATE_RATE", "0.8")), 10),
+}
+default_method_limit = (0.8, 10)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is available now)."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        self._refill(time.monotonic())
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+@dataclass
+class _Request:
+    method: str
+    kwargs: dict
+    priority: int
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    merged: list = field(default_factory=list)
+    # False when the caller uses the returned ``ts``, e.g. to edit the message later
+    mergeable: bool = True
+
+    @property
+    def channel(self):
+        return self.kwargs.get("channel")
+
+
+class SlackDispatcher:
+    """
+    Rate-limit-aware queue in front of the Slack Web API client.
+
+    Exposes ``chat_postMessage`` and ``chat_update`` with the client's
+    signature (plus an optional ``priority``), so it can stand in for the
+    client anywhere. Calls wait for a per-method and a per-channel token
+    bucket, honour ``Retry-After`` on 429s, and keep their order within a
+    channel; workers only take calls that can be sent now, so a throttled
+    channel or method never holds up the others. Adjacent text-only posts
+    to the same thread are sent as one message (unless one is marked not
+    ``mergeable``), and adjacent edits of the
+    same message collapse to the latest.
+    """
+
+    def __init__(self, client, concurrency=dispatch_concurrency):
+        self.client = client
+        self.concurrency = concurrency
+        self._lanes = {USER_REPLY: deque(), NOTIFICATION: deque()}
+        self._wakeup = None
+        self._workers = []
+        self._method_buckets = {}
+        self._channel_buckets = {}
+        # Channels with a call in flight; their queued calls wait so channel order is kept
+        self._sending = set()
+        self.stats = {
+            "sent": 0, "failed": 0, "rate_limited": 0, "merged": 0,
+            "queue_latency_seconds_total": 0.0, "max_queue_latency_seconds": 0.0,
+            "queue_latency_by_lane": {"user_reply": 0.0, "notification": 0.0},
+        }
+
+    def start(self):
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def chat_postMessage(self, priority=USER_REPLY, mergeable=True, **kwargs):
+        """Post a message; pass ``mergeable=False`` if the returned ``ts`` will be edited."""
+        return await self.call("chat.postMessage", priority, mergeable, **kwargs)
+
+    async def chat_update(self, priority=USER_REPLY, **kwargs):
+        return await self.call("chat.update", priority, **kwargs)
+
+    def sayer(self, channel_id, priority=USER_REPLY):
+        """A drop-in for Bolt's ``say`` bound to ``channel_id``."""
+        async def say(**kwargs):
+            return await self.chat_postMessage(priority=priority, channel=channel_id, **kwargs)
+        return say
+
+    async def call(self, method, priority=USER_REPLY, mergeable=True, **kwargs):
+        self.start()
+        request = _Request(method, kwargs, priority, asyncio.get_running_loop().create_future(), mergeable=mergeable)
+        self._lanes[priority].append(request)
+        self._wakeup.set()
+        return await request.future
+
+    def queue_depth(self):
+        return {"user_reply": len(self._lanes[USER_REPLY]), "notification": len(self._lanes[NOTIFICATION])}
+
+    def as_dict(self):
+        return dict(self.stats, queued=self.queue_depth())
+
+    def _next_request(self):
+        """
+        Take the first queued request that can be sent now.
+
+        Returns ``(request, None)``, or ``(None, wait)`` where ``wait`` is the
+        seconds until a rate-limited request may become sendable (None if
+        every queued request is waiting behind one in flight).
+        """
+        blocked = set(self._sending)
+        wait = None
+        for priority in (USER_REPLY, NOTIFICATION):
+            lane = self._lanes[priority]
+            for index, request in enumerate(lane):
+                if request.channel in blocked:
+                    continue
+                # Later requests to this channel stay behind this one
+                blocked.add(request.channel)
+                delay = max(bucket.delay() for bucket in self._buckets(request))
+                if delay > 0:
+                    wait = delay if wait is None else min(wait, delay)
+                    continue
+                del lane[index]
+                self._merge_following(request, lane, index)
+                return request, None
+        return None, wait
+
+    def _merge_following(self, request, lane, index):
+        """Fold the requests queued right after ``request`` (now at ``lane[index]``) into it."""
+        kwargs = request.kwargs
+        while index < len(lane):
+            following = lane[index]
+            same_target = following.method == request.method and following.channel == request.channel
+            if not same_target:
+                return
+            if request.method == "chat.update" and following.kwargs.get("ts") == kwargs.get("ts"):
+                # Only the latest edit of a message matters
+                request.kwargs = kwargs = following.kwargs
+            elif (request.method == "chat.postMessage" and request.mergeable and following.mergeable
+                  and following.kwargs.get("thread_ts") == kwargs.get("thread_ts")
+                  and set(kwargs) == set(following.kwargs) <= {"channel", "thread_ts", "text"}):
+                request.kwargs = kwargs = dict(kwargs, text=f"{kwargs['text']}\n{following.kwargs['text']}")
+            else:
+                return
+            request.merged.append(following)
+            del lane[index]
+            self.stats["merged"] += 1
+
+    def _buckets(self, request):
+        rate, burst = method_limits.get(request.method, default_method_limit)
+        method_bucket = self._method_buckets.setdefault(request.method, TokenBucket(rate, burst))
+        channel_bucket = self._channel_buckets.setdefault(
+            (request.method, request.channel), TokenBucket(channel_rate, channel_burst)
+        )
+        return method_bucket, channel_bucket
+
+    async def _worker(self):
+        while True:
+            request, wait = self._next_request()
+            if request is None:
+                # Nothing is sendable yet: wait for a new call, a finished one or a bucket refill,
+                # rather than parking on one rate-limited method or channel
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._sending.add(request.channel)
+            try:
+                await self._send(request)
+            finally:
+                self._sending.discard(request.channel)
+                self._wakeup.set()
+
+    async def _send(self, request):
+        method_bucket, channel_bucket = self._buckets(request)
+        client_method = getattr(self.client, request.method.replace(".", "_"))
+        method_bucket.take()
+        channel_bucket.take()
+
+        if request.attempts == 0:
+            waited = time.monotonic() - request.enqueued_at
+            self.stats["queue_latency_seconds_total"] += waited
+            self.stats["max_queue_latency_seconds"] = max(self.stats["max_queue_latency_seconds"], waited)
+            lane = "user_reply" if request.priority == USER_REPLY else "notification"
+            self.stats["queue_latency_by_lane"][lane] += waited
+            metrics.stage_duration.observe("slack.queue_wait", value=waited)
+
+        request.attempts += 1
+        try:
+            with metrics.span(f"slack.{request.method}"):
+                response = await client_method(**request.kwargs)
+        except SlackApiError as e:
+            if e.response.status_code == 429 and request.attempts <= max_retries:
+                retry_after = float(e.response.headers.get("Retry-After", e.response.headers.get("retry-after", 1)))
+                self.stats["rate_limited"] += 1
+                logging.warning(f"Slack rate limited {request.method} on {request.channel}; retrying in {retry_after}s")
+                method_bucket.pause(retry_after)
+                channel_bucket.pause(retry_after)
+                # Back to the front of its lane, so it is still sent before later calls to its channel
+                self._lanes[request.priority].appendleft(request)
+                return
+            self._resolve(request, exception=e)
+        except Exception as e:
+            self._resolve(request, exception=e)
+        else:
+            self._resolve(request, response=response)
+
+    def _resolve(self, request, response=None, exception=None):
+        if exception is not None:
+            self.stats["failed"] += 1
+            logging.error(f"Slack {request.method} failed: {exception}")
+        else:
+            self.stats["sent"] += 1
+        for pending in [request] + request.merged:
+            if pending.future.done():
+                continue
+            if exception is not None:
+                pending.future.set_exception(exception)
+            else:
+                pending.future.set_result(response)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import os
+import time
+
+from src.utils import create_message_blocks
+
+min_update_interval = float(os.getenv("STREAMING_MIN_UPDATE_INTERVAL", "1.2"))
+placeholder_text = "Just a moment..."
+
+stats = {"replies": 0, "updates_sent": 0, "updates_coalesced": 0, "update_errors": 0}
+
+
+class StreamingReply:
+    """
+    A single Slack message that is edited in place as a Voiceflow turn streams in.
+
+    Updates are coalesced so at most one ``chat_update`` is sent per
+    ``min_interval`` seconds; only the newest pending content is sent. Buttons
+    are rendered only by ``finish``.
+    """
+
+    def __init__(self, client, channel_id, thread_ts, min_interval=None):
+        self.client = client
+        self.channel_id = channel_id
+        self.thread_ts = thread_ts
+        self.min_interval = min_update_interval if min_interval is None else min_interval
+        self.ts = None
+        self._pending = None
+        self._flush_task = None
+        self._last_sent = 0.0
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        # Not mergeable: the placeholder's ts is edited below, which would erase anything merged into it
+        response = await self.client.chat_postMessage(
+            channel=self.channel_id, text=placeholder_text, thread_ts=self.thread_ts, mergeable=False
+        )
+        self.ts = response['ts']
+        self._last_sent = time.monotonic()
+        stats["replies"] += 1
+
+    def update(self, partial):
+        """Schedule an edit showing ``partial``; safe to call on every trace."""
+        if not partial.messages:
+            return
+        if self._pending is not None:
+            stats["updates_coalesced"] += 1
+        self._pending = partial
+        if self._flush_task is None or self._flush_task.done():
+            delay = max(0.0, self._last_sent + self.min_interval - time.monotonic())
+            self._flush_task = asyncio.create_task(self._flush_after(delay))
+
+    async def _flush_after(self, delay):
+        await asyncio.sleep(delay)
+        partial, self._pending = self._pending, None
+        if partial is not None:
+            blocks, summary_text = create_message_blocks(partial.messages, {})
+            await self._send(blocks, summary_text)
+
+    async def _send(self, blocks, text):
+        async with self._lock:
+            try:
+                await self.client.chat_update(channel=self.channel_id, ts=self.ts, blocks=blocks, text=text)
+                stats["updates_sent"] += 1
+            except Exception as e:
+                stats["update_errors"] += 1
+                logging.error(f"Failed to update streaming reply: {e}")
+                return False
+            finally:
+                self._last_sent = time.monotonic()
+            return True
+
+    async def finish(self, result):
+        """Replace the message with the final rendering, including buttons."""
+        blocks, summary_text = create_message_blocks(result.messages, result.button_payloads)
+        await self._replace(blocks, summary_text)
+
+    async def fail(self, text):
+        """Replace the placeholder or partial reply with an error message."""
+        await self._replace([], text)
+
+    async def _replace(self, blocks, summary_text):
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._pending = None
+        delay = self._last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not await self._send(blocks, summary_text):
+            # Fall back to a fresh message so the user still gets the reply
+            await self.client.chat_postMessage(channel=self.channel_id, text=summary_text, blocks=blocks, thread_ts=self.thread_ts)
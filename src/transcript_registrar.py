@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import random
+import time
+
+batch_size = int(os.getenv("TRANSCRIPT_BATCH_SIZE", "50"))
+batch_interval = float(os.getenv("TRANSCRIPT_BATCH_INTERVAL", "1"))
+concurrency = int(os.getenv("TRANSCRIPT_CONCURRENCY", "5"))
+max_attempts = int(os.getenv("TRANSCRIPT_MAX_ATTEMPTS", "5"))
+retry_base_delay = float(os.getenv("TRANSCRIPT_RETRY_BASE_DELAY", "5"))
+retry_max_delay = float(os.getenv("TRANSCRIPT_RETRY_MAX_DELAY", "300"))
+shutdown_timeout = float(os.getenv("TRANSCRIPT_SHUTDOWN_TIMEOUT", "5"))
+
+
+class TranscriptRegistrar:
+    """
+    Registers Voiceflow transcripts in the background.
+
+    ``register`` only queues a conversation. Every ``interval`` seconds, or
+    as soon as ``batch_size`` are due, the queued conversations get their
+    ``create_transcript(conversation_id)`` calls made concurrently. Failures
+    are retried with backoff, and successes are passed together to
+    ``mark_created(conversation_ids)``. A conversation that is dropped here
+    keeps ``transcript_created = FALSE`` and is registered again on its next
+    message.
+    """
+
+    def __init__(self, create_transcript, mark_created, batch_size=batch_size, interval=batch_interval,
+                 concurrency=concurrency, max_attempts=max_attempts):
+        self.create_transcript = create_transcript
+        self.mark_created = mark_created
+        self.batch_size = batch_size
+        self.interval = interval
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        # conversation_id -> [attempts, due at (monotonic)]
+        self._pending = {}
+        self._wakeup = None
+        self._task = None
+        self.stats = {"registered": 0, "created": 0, "retried": 0, "gave_up": 0, "batches": 0, "mark_errors": 0}
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pending:
+            # Last chance for conversations from the final moments before shutdown
+            try:
+                await asyncio.wait_for(self.flush(force=True), timeout=shutdown_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Gave up registering {len(self._pending)} transcripts at shutdown")
+
+    def register(self, conversation_id):
+        """Queue a transcript for ``conversation_id``; returns immediately."""
+        if conversation_id in self._pending:
+            return
+        self._pending[conversation_id] = [0, time.monotonic()]
+        self.stats["registered"] += 1
+        if self._wakeup is not None and len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def is_pending(self, conversation_id):
+        return conversation_id in self._pending
+
+    def retry_delay(self, attempts):
+        return min(retry_max_delay, retry_base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while await self.flush():
+                    pass
+            except Exception as e:
+                logging.error(f"Transcript registrar error: {e}")
+
+    async def flush(self, force=False):
+        """Register one batch of due transcripts; returns True if a full batch was sent."""
+        now = time.monotonic()
+        batch = [
+            conversation_id for conversation_id, (_, due) in self._pending.items() if force or due <= now
+        ][:self.batch_size]
+        if not batch:
+            return False
+        self.stats["batches"] += 1
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def create(conversation_id):
+            async with limit:
+                return await self.create_transcript(conversation_id)
+
+        results = await asyncio.gather(*(create(conversation_id) for conversation_id in batch), return_exceptions=True)
+
+        created = []
+        for conversation_id, result in zip(batch, results):
+            entry = self._pending[conversation_id]
+            entry[0] += 1
+            if not isinstance(result, Exception):
+                created.append(conversation_id)
+                del self._pending[conversation_id]
+            elif entry[0] >= self.max_attempts:
+                logging.error(f"Giving up on transcript for {conversation_id} after {entry[0]} attempts: {result}")
+                self.stats["gave_up"] += 1
+                del self._pending[conversation_id]
+            else:
+                entry[1] = time.monotonic() + self.retry_delay(entry[0])
+                self.stats["retried"] += 1
+                logging.warning(f"Transcript for {conversation_id} failed (attempt {entry[0]}), will retry: {result}")
+
+        if created:
+            self.stats["created"] += len(created)
+            try:
+                await self.mark_created(created)
+            except Exception as e:
+                # The transcripts exist; the flags are set again on the conversations' next messages
+                self.stats["mark_errors"] += 1
+                logging.error(f"Error marking {len(created)} transcripts as created: {e}")
+        return len(batch) == self.batch_size
+
+    def as_dict(self):
+        return dict(self.stats, pending=len(self._pending))
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import os
+import re
+import tempfile
+
+sample_rate = int(os.getenv("TRANSCRIBE_SAMPLE_RATE", "16000"))
+max_chunk_ms = int(float(os.getenv("TRANSCRIBE_MAX_CHUNK_SECONDS", "600")) * 1000)
+min_chunk_ms = int(float(os.getenv("TRANSCRIBE_MIN_CHUNK_SECONDS", "60")) * 1000)
+min_silence_ms = int(os.getenv("TRANSCRIBE_MIN_SILENCE_MS", "700"))
+silence_thresh_db = float(os.getenv("TRANSCRIBE_SILENCE_THRESH_DB", "-40"))
+concurrency = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+chunk_format = os.getenv("TRANSCRIBE_CHUNK_FORMAT", "mp3")
+chunk_bitrate = os.getenv("TRANSCRIBE_CHUNK_BITRATE", "64k")
+
+_timestamp = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})")
+_cue_timing = re.compile(r"^(\S+)\s+-->\s+(\S+)(.*)$")
+
+
+def extract_audio(file_path):
+    """Extract the audio track as mono WAV at TRANSCRIBE_SAMPLE_RATE; returns the new path."""
+    import ffmpeg
+
+    fd, wav_path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        (
+            ffmpeg
+            .input(file_path)
+            .output(wav_path, vn=None, ac=1, ar=sample_rate, format="wav")
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    except Exception:
+        os.unlink(wav_path)
+        raise
+    return wav_path
+
+
+def plan_chunks(duration_ms, silences, max_ms=None, min_ms=None):
+    """
+    Split ``[0, duration_ms)`` into chunks no longer than ``max_ms``.
+
+    Cuts are placed in the middle of the last silence that falls between
+    ``min_ms`` and ``max_ms`` into the current chunk, falling back to a hard
+    cut at ``max_ms`` when there is no usable silence.
+    """
+    max_ms = max_chunk_ms if max_ms is None else max_ms
+    min_ms = min_chunk_ms if min_ms is None else min_ms
+    cut_points = [(start + end) // 2 for start, end in silences]
+    chunks = []
+    start = 0
+    while duration_ms - start > max_ms:
+        candidates = [cut for cut in cut_points if start + min_ms <= cut <= start + max_ms]
+        end = candidates[-1] if candidates else start + max_ms
+        chunks.append((start, end))
+        start = end
+    chunks.append((start, duration_ms))
+    return chunks
+
+
+def _parse_timestamp(value):
+    match = _timestamp.fullmatch(value)
+    if not match:
+        raise ValueError(f"Invalid VTT timestamp: {value}")
+    hours, minutes, seconds, millis = match.groups()
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+
+
+def _format_timestamp(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def stitch_vtt(parts):
+    """Merge ``(offset_ms, vtt_text)`` parts into one VTT with shifted cue timings."""
+    lines = ["WEBVTT", ""]
+    for offset_ms, vtt_text in parts:
+        for block in re.split(r"\n\s*\n", vtt_text.strip()):
+            block_lines = block.strip().splitlines()
+            timing_index = next((i for i, line in enumerate(block_lines) if "-->" in line), None)
+            if timing_index is None:
+                continue  # WEBVTT header, NOTE or STYLE blocks
+            start, end, settings = _cue_timing.match(block_lines[timing_index].strip()).groups()
+            lines.append(
+                f"{_format_timestamp(_parse_timestamp(start) + offset_ms)} --> "
+                f"{_format_timestamp(_parse_timestamp(end) + offset_ms)}{settings}"
+            )
+            lines.extend(block_lines[timing_index + 1:])
+            lines.append("")
+    return "\n".join(lines)
+
+
+def _export_chunks(segment, chunks, directory):
+    paths = []
+    for idx, (start, end) in enumerate(chunks):
+        path = os.path.join(directory, f"chunk_{idx:04d}.{chunk_format}")
+        export_args = {"bitrate": chunk_bitrate} if chunk_format == "mp3" else {}
+        segment[start:end].export(path, format=chunk_format, **export_args)
+        paths.append(path)
+    return paths
+
+
+async def transcribe_segment(segment, transcribe):
+    """
+    Transcribe a pydub AudioSegment in silence-aligned chunks.
+
+    ``transcribe`` is an async callable taking an open binary file and
+    returning VTT text (or None on failure). Returns the stitched VTT, or
+    None if any chunk failed.
+    """
+    from pydub.silence import detect_silence
+
+    silences = await asyncio.to_thread(
+        detect_silence, segment, min_silence_len=min_silence_ms, silence_thresh=silence_thresh_db, seek_step=10
+    )
+    chunks = plan_chunks(len(segment), silences)
+    logging.info(f"Transcribing {len(segment) / 1000:.0f}s of audio in {len(chunks)} chunk(s)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = await asyncio.to_thread(_export_chunks, segment, chunks, directory)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def transcribe_chunk(path):
+            async with semaphore:
+                with open(path, "rb") as file_stream:
+                    return await transcribe(file_stream)
+
+        results = await asyncio.gather(*(transcribe_chunk(path) for path in paths))
+
+    if any(result is None for result in results):
+        logging.error(f"{sum(result is None for result in results)} of {len(chunks)} chunks failed to transcribe")
+        return None
+    return stitch_vtt([(start, result) for (start, _), result in zip(chunks, results)])
+
+
+async def transcribe_recording(file_path, transcribe):
+    """Extract, downsample, chunk and transcribe an audio or video file."""
+    from pydub import AudioSegment
+
+    wav_path = await asyncio.to_thread(extract_audio, file_path)
+    try:
+        segment = await asyncio.to_thread(AudioSegment.from_wav, wav_path)
+    finally:
+        os.unlink(wav_path)
+    return await transcribe_segment(segment, transcribe)
@@ -0,0 +1,133 @@
+import base64
+import json
+import os
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+from src import db
+
+chunk_chars = int(os.getenv("TRANSCRIPT_STREAM_CHUNK_CHARS", "65536"))
+max_page_size = int(os.getenv("TRANSCRIPT_MAX_PAGE_SIZE", "200"))
+max_segments = int(os.getenv("TRANSCRIPT_MAX_SEGMENTS", "1000"))
+
+_timing = re.compile(r"^\s*(\S+)\s+-->\s+(\S+)")
+
+
+@dataclass(frozen=True)
+class Cue:
+    index: int
+    start: float
+    end: float
+    text: str
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing after ``row`` in newest-first order."""
+    raw = json.dumps([row["created_at"].isoformat(), row["conversation_id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """(created_at, conversation_id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        created_at, conversation_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(conversation_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_timestamp(value):
+    """Seconds from a VTT timestamp ("HH:MM:SS.mmm" or "MM:SS.mmm")."""
+    seconds = 0.0
+    for part in value.replace(",", ".").split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+async def iter_text(conversation_id, size=None):
+    """Yield a stored transcript in chunks, so it never has to be held in memory whole."""
+    size = size or chunk_chars
+    offset = 0
+    while True:
+        chunk = await db.read_transcript_chunk(conversation_id, offset, size)
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < size:
+            return
+        offset += len(chunk)
+
+
+async def iter_json(conversation_id, title):
+    """``{"title": ..., "transcript": ...}`` as JSON text, streamed from ``iter_text``."""
+    yield '{"title": ' + json.dumps(title) + ', "transcript": "'
+    async for chunk in iter_text(conversation_id):
+        # Escaping is per character, so escaped chunks concatenate to the escaped whole
+        yield json.dumps(chunk)[1:-1]
+    yield '"}'
+
+
+def _parse_block(block, index):
+    lines = block.strip("\n").split("\n")
+    for position, line in enumerate(lines):
+        match = _timing.match(line)
+        if match:
+            text = "\n".join(lines[position + 1:]).strip()
+            return Cue(index, parse_timestamp(match.group(1)), parse_timestamp(match.group(2)), text)
+    return None
+
+
+async def iter_cues(chunks):
+    """Parse VTT cues from an async iterator of text chunks, as they arrive."""
+    buffer = ""
+    index = 0
+    async for chunk in chunks:
+        # Normalised after joining, so a "\r\n" split across chunks is still caught
+        buffer = (buffer + chunk).replace("\r\n", "\n")
+        *blocks, buffer = buffer.split("\n\n")
+        for block in blocks:
+            cue = _parse_block(block, index)
+            if cue is not None:
+                yield cue
+                index += 1
+    cue = _parse_block(buffer, index)
+    if cue is not None:
+        yield cue
+
+
+async def segments(conversation_id, start=0, end=None, from_seconds=None, to_seconds=None):
+    """
+    Cues ``start`` (inclusive) to ``end`` (exclusive) by position, further
+    narrowed to those overlapping [from_seconds, to_seconds). Reading stops
+    at the end of the range, and at most ``max_segments`` cues are returned.
+    """
+    selected = []
+    chunks = iter_text(conversation_id)
+    try:
+        async for cue in iter_cues(chunks):
+            if end is not None and cue.index >= end:
+                break
+            if to_seconds is not None and cue.start >= to_seconds:
+                break
+            if cue.index < start or (from_seconds is not None and cue.end <= from_seconds):
+                continue
+            selected.append(cue)
+            if len(selected) >= max_segments:
+                break
+    finally:
+        await chunks.aclose()
+    return selected
+
+
+async def find(channel_id=None, title=None, query=None, cursor=None, limit=50):
+    """One page of transcript metadata, newest first, and the cursor for the next page (or None)."""
+    limit = max(1, min(limit, max_page_size))
+    after = decode_cursor(cursor) if cursor else None
+    rows = await db.find_transcripts(channel_id, title, query, after, limit + 1)
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return items, next_cursor
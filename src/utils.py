@@ -1,57 +1,25 @@
-import psycopg2
-from psycopg2.extras import Json
 from typing import Optional, Dict, List
+import asyncio
+import hashlib
 import os
 import logging
-import re
 from io import BytesIO
-from pdfminer.high_level import extract_text
-from docx import Document
-from pptx import Presentation
-from bs4 import BeautifulSoup
-import requests
-from cachetools import TTLCache
-from openai import AsyncOpenAI
-import tempfile
-
-# Load environment variables
-from dotenv import load_dotenv
-load_dotenv()
-
-# Database connection
-database_url = os.getenv("DATABASE_URL")
-slack_bot_token = os.getenv("SLACK_BOT_TOKEN")
-processed_events = TTLCache(maxsize=1000, ttl=60)
-
-# Database connection function
-def get_db_connection(autocommit=True):
-    conn = psycopg2.connect(database_url)
-    if autocommit:
-        conn.autocommit = True
-    return conn
-
-def store_transcript(conversation_id, user_id, channel_id, thread_ts, title, transcript_text):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO transcripts (conversation_id, user_id, channel_id, thread_ts, title, transcript)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (conversation_id)
-                DO UPDATE SET title = EXCLUDED.title, transcript = EXCLUDED.transcript, created_at = NOW();
-                """,
-                (conversation_id, user_id, channel_id, thread_ts, title, transcript_text)
-            )
 
-def get_transcript(title):
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT transcript FROM transcripts WHERE title = %s",
-                (title,)
-            )
-            result = cur.fetchone()
-            return result[0] if result else None
+from src import db, metrics, resilience
+from src.documents import extract_document_text, supported_types as supported_document_types
+from src.downloads import download_file
+from src.transcription import transcribe_recording
+
+# Hard deadline per transcription request (including retries); the SDK's own retries are disabled
+transcribe_timeout = float(os.getenv("OPENAI_TRANSCRIBE_TIMEOUT", "120"))
+transcribe_retries = int(os.getenv("OPENAI_TRANSCRIBE_RETRIES", "2"))
+openai_breaker = resilience.CircuitBreaker("OPENAI")
+
+# Identical recordings (by SHA-256 of their bytes) reuse an earlier transcript instead of going to Whisper
+reuse_transcripts = os.getenv("TRANSCRIPT_REUSE", "true").lower() in ("1", "true", "yes")
+reuse_stats = {"hits": 0, "misses": 0, "coalesced": 0, "lookup_errors": 0}
+# content hash -> future of the transcription in progress, shared by concurrent identical uploads
+_transcribing = {}
 
 def create_message_blocks(text_responses: List[str], button_payloads: Dict) -> (List[Dict], str):
     blocks = []
@@ -106,120 +74,114 @@ def create_message_blocks(text_responses: List[str], button_payloads: Dict) -> (
 
     return blocks, summary_text
 
-async def download_file(file_url):
-    headers = {'Authorization': f'Bearer {slack_bot_token}'}
-    response = requests.get(file_url, headers=headers, allow_redirects=True)
-    if response.status_code == 200:
-        file_suffix = ".mp4" if file_url.endswith(".mp4") else ".m4a" if file_url.endswith(".m4a") else ""
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=file_suffix)
-        temp_file.write(response.content)
-        temp_file.close()
-        return temp_file.name
-    else:
-        logging.error(f"Error downloading file: {response.status_code}, {response.text}")
-        return None
-
 async def process_file(file_url, file_type):
-    file_path = await download_file(file_url)
+    with metrics.span("file.download"):
+        file_path = await download_file(file_url)
     if not file_path:
         return None
 
     try:
-        if file_type in ['mp4', 'm4a']:  # Check for both mp4 and m4a file types
-            logging.info(f"File path: {file_path}")
-            logging.info(f"File size: {os.path.getsize(file_path)}")
-
-            with open(file_path, "rb") as file_stream:
-                transcription = await transcribe_audio(file_stream)
-                if transcription is None:
-                    logging.error("Failed to transcribe or no transcription returned")
-                    return None
-                else:
-                    # Assuming transcription is the content of the text file
-                    return transcription
-        elif file_type == 'pdf':
-            return extract_text_from_pdf(file_content)
-        elif file_type in ['doc', 'docx']:
-            return extract_text_from_docx(file_content)
-        elif file_type in ['ppt', 'pptx']:
-            return extract_text_from_pptx(file_content)
-    except Exception as e:
-        logging.error(f"General error processing file: {e}")
+        return await _process_path(file_path, file_type)
     finally:
         if os.path.exists(file_path):
             os.unlink(file_path)
 
-def extract_text_from_pdf(file_content):
+async def _process_path(file_path, file_type):
     try:
-        file_stream = BytesIO(file_content)
-        text = extract_text(file_stream)
-        return text
-    except Exception as e:
-        logging.error(f"Error extracting text from PDF: {e}")
-        return None
+        if file_type in ['mp4', 'm4a']:  # Check for both mp4 and m4a file types
+            logging.info(f"File path: {file_path}")
+            logging.info(f"File size: {os.path.getsize(file_path)}")
 
-def extract_text_from_docx(file_content):
-    try:
-        file_stream = BytesIO(file_content)
-        doc = Document(file_stream)
-        return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            with metrics.span("file.transcribe"):
+                transcription = await transcribe_recording(file_path, transcribe_audio)
+            if transcription is None:
+                logging.error("Failed to transcribe or no transcription returned")
+                return None
+            else:
+                # Assuming transcription is the content of the text file
+                return transcription
+        elif file_type in supported_document_types:
+            with metrics.span("file.extract_document"):
+                return await extract_document_text(file_path, file_type)
     except Exception as e:
-        logging.error(f"Error extracting text from DOCX: {e}")
-        return None
+        logging.error(f"General error processing file: {e}")
 
-def extract_text_from_pptx(file_content):
-    try:
-        file_stream = BytesIO(file_content)
-        ppt = Presentation(file_stream)
-        text = []
-        for slide in ppt.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text.append(shape.text)
-        return "\n".join(text)
-    except Exception as e:
-        logging.error(f"Error extracting text from PPTX: {e}")
-        return None
+async def transcribe_upload(file_url, file_type):
+    """
+    Transcribe an uploaded recording, reusing the transcript of an identical
+    earlier (or concurrent) upload when there is one.
+
+    Returns ``(transcript, content_hash)``; the transcript is None on failure.
+    """
+    digest = hashlib.sha256()
+    with metrics.span("file.download"):
+        file_path = await download_file(file_url, digest=digest)
+    if not file_path:
+        return None, None
+    content_hash = digest.hexdigest()
 
-def extract_webpage_content(url):
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Referer': 'https://www.google.com/'
-    }
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        content_list = []
-        for tag in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-            tag_text = tag.get_text(separator=" ", strip=True)
-            clean_text = re.sub(r'\s+', ' ', tag_text).strip()
-            if clean_text:
-                content_list.append((tag.name, clean_text))
-        full_text = ' '.join([text for _, text in content_list])
-        return full_text
-    except requests.HTTPError as http_err:
-        logging.error(f"HTTP error occurred while fetching content from {url}: {http_err}")
-        return None
-    except Exception as e:
-        logging.error(f"An error occurred while fetching content from {url}: {e}")
-        return None
+        if not reuse_transcripts:
+            return await _process_path(file_path, file_type), content_hash
+
+        try:
+            with metrics.span("transcript.reuse_lookup"):
+                transcript = await db.find_transcript_by_hash(content_hash)
+        except Exception as e:
+            reuse_stats["lookup_errors"] += 1
+            logging.error(f"Error looking up transcript by content hash: {e}")
+            transcript = None
+        if transcript:
+            reuse_stats["hits"] += 1
+            logging.info(f"Reusing transcript for identical recording {content_hash[:12]}")
+            return transcript, content_hash
+
+        in_progress = _transcribing.get(content_hash)
+        if in_progress is not None:
+            reuse_stats["coalesced"] += 1
+            logging.info(f"Waiting for transcription of identical recording {content_hash[:12]}")
+            return await asyncio.shield(in_progress), content_hash
+        reuse_stats["misses"] += 1
+
+        future = asyncio.get_running_loop().create_future()
+        _transcribing[content_hash] = future
+        transcript = None
+        try:
+            transcript = await _process_path(file_path, file_type)
+        finally:
+            del _transcribing[content_hash]
+            future.set_result(transcript)
+        return transcript, content_hash
+    finally:
+        if os.path.exists(file_path):
+            os.unlink(file_path)
 
 async def transcribe_audio(file_stream):
+    from openai import AsyncOpenAI
+
     try:
         openai_api_key = os.getenv("OPENAI_API_KEY")
-        openai_client = AsyncOpenAI(api_key=openai_api_key)
+        openai_client = AsyncOpenAI(api_key=openai_api_key, max_retries=0, timeout=transcribe_timeout)
+
+        async def transcribe():
+            # A retry re-sends the whole file
+            file_stream.seek(0)
+            return await openai_client.audio.transcriptions.create(
+                model="whisper-1",
+                file=file_stream,
+                response_format="vtt",
+                language="en"
+            )
 
         logging.info("Making API call to transcribe audio")
-        transcription_response = await openai_client.audio.transcriptions.create(
-            model="whisper-1",
-            file=file_stream,
-            response_format="vtt",
-            language="en"
-        )
+        with metrics.span("openai.transcribe"):
+            transcription_response = await resilience.call(
+                openai_breaker, transcribe, transcribe_timeout, retries=transcribe_retries, idempotent=True
+            )
         return transcription_response
+    except resilience.UpstreamUnavailable as e:
+        logging.error(f"Skipping transcription: {e}")
+        return None
     except Exception as e:
         logging.error(f"Error during transcription: {str(e)}")
         return None
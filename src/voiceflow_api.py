@@ -1,9 +1,101 @@
-import aiohttp
+import asyncio
+import json
+import logging
 import os
-from dotenv import load_dotenv
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from src import metrics, resilience
+from src.http_client import ConnectionStats, create_session
+
+# Start new sessions from a copy of a launched session's state instead of running launch each time
+launch_snapshots = os.getenv("VOICEFLOW_LAUNCH_SNAPSHOTS", "false").lower() in ("1", "true", "yes")
+launch_snapshot_ttl = float(os.getenv("VOICEFLOW_LAUNCH_SNAPSHOT_TTL", "300"))
+
+# Hard deadlines (seconds, including retries) and retries for idempotent calls
+request_timeout = float(os.getenv("VOICEFLOW_TIMEOUT", "20"))
+stream_timeout = float(os.getenv("VOICEFLOW_STREAM_TIMEOUT", "30"))
+max_retries = int(os.getenv("VOICEFLOW_RETRIES", "2"))
+
+
+@dataclass(frozen=True)
+class VoiceflowResponse:
+    """The outcome of a single Voiceflow interaction."""
+    messages: Tuple[str, ...] = ()
+    buttons: Tuple[Tuple[str, dict], ...] = ()
+    is_running: bool = True
+    elapsed: float = 0.0
+
+    @property
+    def button_payloads(self) -> Dict[str, dict]:
+        """Button requests keyed by their 1-based position, as stored in the database."""
+        return dict(self.buttons)
+
+    @property
+    def last_message(self) -> Optional[str]:
+        return self.messages[-1] if self.messages else None
+
+
+class ResponseBuilder:
+    """Accumulates Voiceflow traces into a VoiceflowResponse, one trace at a time."""
+
+    def __init__(self):
+        self.messages = []
+        self.button_payloads = {}
+        self.is_running = True
+        self._completion = None
+
+    def add(self, trace):
+        if trace['type'] == 'speak' or trace['type'] == 'text':
+            self.messages.append(trace['payload']['message'])
+        elif trace['type'] == 'completion':
+            # Streamed LLM output arrives as start/content/end fragments of one message
+            state = trace['payload'].get('state')
+            if state == 'start':
+                self._completion = len(self.messages)
+                self.messages.append('')
+            elif state == 'content' and self._completion is not None:
+                self.messages[self._completion] += trace['payload'].get('content', '')
+            elif state == 'end':
+                self._completion = None
+        elif trace['type'] == 'choice':
+            for idx, choice in enumerate(trace['payload']['buttons']):
+                self.button_payloads[str(idx + 1)] = choice['request']
+        elif trace['type'] == 'end':
+            self.is_running = False
+
+    def build(self, elapsed=0.0):
+        return VoiceflowResponse(
+            messages=tuple(self.messages),
+            buttons=tuple(self.button_payloads.items()),
+            is_running=self.is_running,
+            elapsed=elapsed
+        )
+
+
+async def iter_sse(response):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data = 'message', []
+    async for raw_line in response.content:
+        line = raw_line.decode('utf-8').rstrip('\r\n')
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue
+        else:
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+    if data:
+        yield event, '\n'.join(data)
 
-# Load environment variables
-load_dotenv()
 
 class VoiceflowAPI:
     def __init__(self):
@@ -13,24 +105,139 @@ class VoiceflowAPI:
         self.runtime_endpoint = os.getenv('VOICEFLOW_RUNTIME_ENDPOINT', 'https://general-runtime.voiceflow.com')
         self.version_id = os.getenv('VOICEFLOW_VERSION_ID', 'production')
         self.project_id = os.getenv('VOICEFLOW_PROJECT_ID')
-        self.last_message = None
-        self.all_responses = []
+        self.transcript_endpoint = os.getenv('VOICEFLOW_TRANSCRIPT_ENDPOINT', 'https://api.voiceflow.com/v2/transcripts')
+        self.session = None
+        self.connection_stats = ConnectionStats()
+        self.breaker = resilience.CircuitBreaker('VOICEFLOW')
+        self.launch_snapshots = launch_snapshots
+        self._launch_snapshot = None  # (VoiceflowResponse, state, taken at)
+        self._snapshot_lock = asyncio.Lock()
+        self._snapshot_refresh = None
+        self.launch_stats = {"launches": 0, "snapshot_launches": 0, "snapshots_taken": 0, "snapshot_errors": 0}
+
+    async def start(self):
+        """Open the shared HTTP session used for all Voiceflow calls."""
+        if self.session is None or self.session.closed:
+            self.session = create_session('VOICEFLOW', stats=self.connection_stats)
+            if self.launch_snapshots:
+                # Pre-warm, so the first new conversation doesn't pay for the launch
+                self._refresh_launch_snapshot(force=False)
+        return self.session
+
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._snapshot_refresh is not None:
+            self._snapshot_refresh.cancel()
+            self._snapshot_refresh = None
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+    async def _get_session(self):
+        if self.session is None or self.session.closed:
+            return await self.start()
+        return self.session
+
+    async def _call(self, make_call, deadline=request_timeout, idempotent=False):
+        """Run a request through the circuit breaker, with a deadline and (if idempotent) retries."""
+        return await resilience.call(self.breaker, make_call, deadline, retries=max_retries, idempotent=idempotent)
 
     async def interact(self, conversation_id, request):
-        """Interact with the Voiceflow API and handle the response."""
-        async with aiohttp.ClientSession() as session:
+        """Interact with the Voiceflow API and return a VoiceflowResponse."""
+        session = await self._get_session()
+        start = time.monotonic()
+
+        async def post():
             async with session.post(
                 url=f"{self.runtime_endpoint}/state/{self.version_id}/user/{conversation_id}/interact",
                 json={'request': request},
                 headers={'Authorization': self.api_key},
             ) as response:
                 response.raise_for_status()  # Raise an exception for HTTP errors
-                self.all_responses = []
-                return self.parse_response(await response.json())
+                return await response.json()
+
+        with metrics.span("voiceflow.interact"):
+            # A launch just restarts the session, so it is safe to repeat; other turns are not
+            response_data = await self._call(post, idempotent=request.get('type') == 'launch')
+        return self.parse_response(response_data, elapsed=time.monotonic() - start)
+
+    async def fetch_state(self, user_id):
+        """Fetch a session's full runtime state."""
+        session = await self._get_session()
+
+        async def get():
+            async with session.get(
+                url=f"{self.runtime_endpoint}/state/user/{user_id}",
+                headers={'Authorization': self.api_key, 'versionID': self.version_id},
+            ) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        with metrics.span("voiceflow.fetch_state"):
+            return await self._call(get, idempotent=True)
+
+    async def put_state(self, user_id, state):
+        """Replace a session's runtime state."""
+        session = await self._get_session()
+
+        async def put():
+            async with session.put(
+                url=f"{self.runtime_endpoint}/state/user/{user_id}",
+                json=state,
+                headers={'Authorization': self.api_key, 'versionID': self.version_id},
+            ) as response:
+                response.raise_for_status()
+
+        with metrics.span("voiceflow.put_state"):
+            await self._call(put, idempotent=True)
+
+    async def launch(self, conversation_id):
+        """
+        Start a session. With launch snapshots enabled, the state of an
+        already launched session is copied in (one state write instead of
+        running the launch flow) and that launch's response is returned.
+        """
+        self.launch_stats["launches"] += 1
+        snapshot = await self._get_launch_snapshot() if self.launch_snapshots else None
+        if snapshot is None:
+            return await self.interact(conversation_id, {'type': 'launch'})
+        response, state, _ = snapshot
+        await self.put_state(conversation_id, state)
+        self.launch_stats["snapshot_launches"] += 1
+        return response
+
+    async def _get_launch_snapshot(self):
+        snapshot = self._launch_snapshot
+        if snapshot is not None:
+            if time.monotonic() - snapshot[2] > launch_snapshot_ttl:
+                # Serve the stale copy while a fresh one is taken
+                self._refresh_launch_snapshot()
+            return snapshot
+        return await self._take_launch_snapshot()
+
+    def _refresh_launch_snapshot(self, force=True):
+        if self._snapshot_refresh is None or self._snapshot_refresh.done():
+            self._snapshot_refresh = asyncio.create_task(self._take_launch_snapshot(force))
+
+    async def _take_launch_snapshot(self, force=False):
+        async with self._snapshot_lock:
+            if self._launch_snapshot is not None and not force:
+                return self._launch_snapshot
+            try:
+                template_id = f"launch-snapshot-{uuid.uuid4().hex}"
+                response = await self.interact(template_id, {'type': 'launch'})
+                state = await self.fetch_state(template_id)
+            except Exception as e:
+                self.launch_stats["snapshot_errors"] += 1
+                logging.error(f"Could not take a Voiceflow launch snapshot: {e}")
+                return self._launch_snapshot
+            self._launch_snapshot = (response, state, time.monotonic())
+            self.launch_stats["snapshots_taken"] += 1
+            return self._launch_snapshot
 
     async def create_transcript(self, conversation_id):
         """Create a transcript using the Voiceflow Transcript API."""
-        url = "https://api.voiceflow.com/v2/transcripts"
+        url = self.transcript_endpoint
         headers = {
             "Authorization": self.api_key,
             "Content-Type": "application/json",
@@ -41,29 +248,59 @@ class VoiceflowAPI:
             "sessionID": conversation_id,
             "projectID": self.project_id
         }
-        async with aiohttp.ClientSession() as session:
+        session = await self._get_session()
+
+        async def put():
             async with session.put(url, json=payload, headers=headers) as response:
                 response.raise_for_status()  # Raise an exception for HTTP errors
                 return await response.json()
 
-    def parse_response(self, response_data):
-        """Parse the response data from Voiceflow."""
-        button_payloads = {}
-        should_continue = True
+        with metrics.span("voiceflow.create_transcript"):
+            return await self._call(put, idempotent=True)
 
+    def parse_response(self, response_data, elapsed=0.0):
+        """Parse the response data from Voiceflow."""
+        builder = ResponseBuilder()
         for trace in response_data:
-            if trace['type'] == 'speak' or trace['type'] == 'text':
-                message = trace['payload']['message']
-                self.last_message = message
-                self.all_responses.append(message)  # Store the message
-            elif trace['type'] == 'choice':
-                for idx, choice in enumerate(trace['payload']['buttons']):
-                    button_text = choice['name']
-                    button_payloads[str(idx + 1)] = choice['request']
-            elif trace['type'] == 'end':
-                should_continue = False
-
-        return should_continue, button_payloads
+            builder.add(trace)
+        return builder.build(elapsed)
+
+    async def interact_stream(self, conversation_id, request, on_update=None):
+        """
+        Interact through the streaming endpoint.
+
+        ``on_update(partial_response)`` is called after every trace; the
+        complete VoiceflowResponse is returned when the stream ends.
+        """
+        session = await self._get_session()
+        start = time.monotonic()
+
+        async def stream():
+            builder = ResponseBuilder()
+            first_trace = True
+            async with session.post(
+                url=f"{self.runtime_endpoint}/v2/project/{self.project_id}/user/{conversation_id}/interact/stream",
+                params={'completion_events': 'true'},
+                json={'action': request},
+                headers={'Authorization': self.api_key, 'versionID': self.version_id, 'Accept': 'text/event-stream'},
+            ) as response:
+                response.raise_for_status()
+                async for event, data in iter_sse(response):
+                    if event == 'end':
+                        break
+                    if event != 'trace':
+                        continue
+                    if first_trace:
+                        first_trace = False
+                        metrics.stage_duration.observe("voiceflow.first_trace", value=time.monotonic() - start)
+                    builder.add(json.loads(data))
+                    if on_update is not None:
+                        on_update(builder.build(time.monotonic() - start))
+            return builder
+
+        with metrics.span("voiceflow.interact_stream"):
+            builder = await self._call(stream, deadline=stream_timeout)
+        return builder.build(time.monotonic() - start)
 
     async def handle_user_input(self, conversation_id, user_input):
         """Handles user input by sending text or button payload to Voiceflow."""
@@ -74,10 +311,7 @@ class VoiceflowAPI:
             # User input is regular text
             return await self.interact(conversation_id, {'type': 'text', 'payload': user_input})
 
-    def get_last_response(self):
-        """Return the last message from Voiceflow."""
-        return self.last_message
-    
-    def get_responses(self):
-        """Return all text/speak responses from the current interaction with Voiceflow."""
-        return self.all_responses
\ No newline at end of file
+    async def handle_user_input_stream(self, conversation_id, user_input, on_update=None):
+        """Streaming counterpart of handle_user_input."""
+        request = user_input if isinstance(user_input, dict) else {'type': 'text', 'payload': user_input}
+        return await self.interact_stream(conversation_id, request, on_update)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from src import metrics
+from src.content_cache import CachedPage, ContentCache, normalize_url
+from src.http_client import ConnectionStats, create_session
+
+fetch_concurrency = int(os.getenv("WEBPAGE_FETCH_CONCURRENCY", "5"))
+request_timeout = float(os.getenv("WEBPAGE_REQUEST_TIMEOUT", "10"))
+total_timeout = float(os.getenv("WEBPAGE_TOTAL_TIMEOUT", "15"))
+max_bytes = int(os.getenv("WEBPAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+parse_workers = int(os.getenv("WEBPAGE_PARSE_WORKERS", "4"))
+chunk_size = 64 * 1024
+
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Referer': 'https://www.google.com/'
+}
+
+connection_stats = ConnectionStats()
+content_cache = ContentCache()
+_session = None
+_parse_executor = None
+
+
+async def start():
+    """Open the shared HTTP session and parser pool used for webpage fetching."""
+    global _session, _parse_executor
+    if _session is None or _session.closed:
+        _session = create_session('WEBPAGE', stats=connection_stats, headers=headers)
+    if _parse_executor is None:
+        _parse_executor = ThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix="webpage-parse")
+    return _session
+
+
+async def close():
+    global _session, _parse_executor
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    if _parse_executor is not None:
+        _parse_executor.shutdown(wait=False, cancel_futures=True)
+    _parse_executor = None
+
+
+async def fetch_webpage(url, cached=None):
+    """
+    Stream a page body, stopping once max_bytes have been read.
+
+    When a cached page is given the request is conditional; a 304 response
+    returns None for the body.
+    """
+    session = _session if _session is not None and not _session.closed else await start()
+    timeout = aiohttp.ClientTimeout(total=request_timeout)
+    request_headers = cached.validators if cached is not None else None
+    async with session.get(url, timeout=timeout, allow_redirects=True, headers=request_headers) as response:
+        if response.status == 304 and cached is not None:
+            return None, response.headers
+        response.raise_for_status()
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(chunk_size):
+            body.extend(chunk)
+            if len(body) >= max_bytes:
+                logging.warning(f"Content from {url} exceeds {max_bytes} bytes; truncating")
+                del body[max_bytes:]
+                break
+        return bytes(body), response.headers
+
+
+def parse_webpage(content):
+    """Extract the readable paragraph and heading text from an HTML document."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    content_list = []
+    for tag in soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+        tag_text = tag.get_text(separator=" ", strip=True)
+        clean_text = re.sub(r'\s+', ' ', tag_text).strip()
+        if clean_text:
+            content_list.append((tag.name, clean_text))
+    return ' '.join([text for _, text in content_list])
+
+
+async def extract_webpage_content(url):
+    try:
+        key = normalize_url(url)
+        cached = await content_cache.lookup(key)
+        if content_cache.is_fresh(cached):
+            return cached.text
+
+        with metrics.span("webpage.fetch"):
+            content, response_headers = await fetch_webpage(url, cached)
+        if content is None:
+            await content_cache.revalidated(key, cached)
+            return cached.text
+
+        loop = asyncio.get_running_loop()
+        with metrics.span("webpage.parse"):
+            text = await loop.run_in_executor(_parse_executor, parse_webpage, content)
+        await content_cache.store(key, CachedPage(
+            text,
+            etag=response_headers.get('ETag'),
+            last_modified=response_headers.get('Last-Modified')
+        ))
+        return text
+    except aiohttp.ClientResponseError as http_err:
+        logging.error(f"HTTP error occurred while fetching content from {url}: {http_err}")
+        return None
+    except asyncio.TimeoutError:
+        logging.error(f"Timed out after {request_timeout}s fetching content from {url}")
+        return None
+    except Exception as e:
+        logging.error(f"An error occurred while fetching content from {url}: {e}")
+        return None
+
+
+async def extract_webpages(urls):
+    """
+    Fetch and parse all URLs concurrently.
+
+    Returns a list aligned with ``urls``; entries are None for pages that
+    failed or did not finish within the overall deadline.
+    """
+    if not urls:
+        return []
+    semaphore = asyncio.Semaphore(fetch_concurrency)
+
+    async def bounded(url):
+        async with semaphore:
+            return await extract_webpage_content(url)
+
+    tasks = [asyncio.create_task(bounded(url)) for url in urls]
+    done, pending = await asyncio.wait(tasks, timeout=total_timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logging.warning(f"{len(pending)} of {len(urls)} URLs did not load within {total_timeout}s")
+        await asyncio.gather(*pending, return_exceptions=True)
+    return [task.result() if task in done else None for task in tasks]
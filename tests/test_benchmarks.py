@@ -0,0 +1,66 @@
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import db_lookup, import_time
+from benchmarks.run import compare, percentile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps([{"scenario": "follow_up", "p95_ms": 100.0, "events_per_second": 50.0}]))
+    assert compare([{"scenario": "follow_up", "p95_ms": 110.0, "events_per_second": 48.0}], baseline, 0.2) == []
+    assert len(compare([{"scenario": "follow_up", "p95_ms": 150.0, "events_per_second": 30.0}], baseline, 0.2)) == 2
+
+
+def test_harness_runs_scenarios_end_to_end(tmp_path):
+    out = tmp_path / "results.json"
+    subprocess.run(
+        [sys.executable, "-m", "benchmarks.run", "--scenario", "follow_up", "--scenario", "button_click",
+         "--events", "3", "--warmup", "1", "--timeout", "20", "--json-out", str(out)],
+        cwd=root, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=120
+    )
+    results = {result["scenario"]: result for result in json.loads(out.read_text())}
+    for name in ("follow_up", "button_click"):
+        assert results[name]["ok"] == 3
+        assert results[name]["p50_ms"] > 0
+        assert results[name]["peak_rss_mb"] > 0
+    assert "voiceflow.interact" in results["follow_up"]["stages"]
+
+
+def test_importtime_output_is_parsed_and_grouped_by_package():
+    output = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |     bs4.element\n"
+        "import time:       300 |        420 |   bs4\n"
+        "import time:        80 |        500 | src.webpage\n"
+    )
+    modules = import_time.parse_importtime(output)
+    assert modules["src.webpage"] == (80, 500)
+    assert import_time.by_package(modules) == [("bs4", 0.42), ("src", 0.08)]
+
+
+def test_importing_the_app_leaves_heavy_dependencies_unloaded():
+    result = import_time.measure(runs=1)
+    assert result["lazy_imported"] == []
+    assert import_time.check(result, budget_ms=result["total_ms"] - 1) != []
+
+
+def test_db_lookup_flags_queries_that_slow_down_with_table_size():
+    steps = [
+        {"size": 10_000, "operations": {"get_conversation": {"p95_ms": 0.4}, "find_transcripts": {"p95_ms": 1.0}}},
+        {"size": 1_000_000, "operations": {"get_conversation": {"p95_ms": 0.5}, "find_transcripts": {"p95_ms": 9.0}}},
+    ]
+    problems = db_lookup.flatness(steps, max_growth=2.0)
+    assert len(problems) == 1 and problems[0].startswith("find_transcripts")
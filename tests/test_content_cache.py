@@ -0,0 +1,60 @@
+import asyncio
+
+from aiohttp import web
+
+from src import webpage
+from src.content_cache import CachedPage, ContentCache, normalize_url
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Docs.Example.com:443/a?b=2&a=1#intro") == "https://docs.example.com/a?a=1&b=2"
+    assert normalize_url("http://example.com") == "http://example.com/"
+    assert normalize_url("http://example.com:8080/x") == "http://example.com:8080/x"
+
+
+def test_cache_is_bounded_by_bytes_and_counts_evictions():
+    async def run():
+        cache = ContentCache(max_bytes=2300, ttl=60, shared=False)
+        for i in range(5):
+            await cache.store(f"k{i}", CachedPage("x" * 500))
+        assert await cache.lookup("k0") is None
+        assert (await cache.lookup("k4")).text == "x" * 500
+        return cache.as_dict()
+
+    stats = asyncio.run(run())
+    assert stats["bytes"] <= 2300
+    assert stats["evictions"] == 2
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_stale_entries_are_revalidated_with_etag(monkeypatch):
+    requests_seen = []
+
+    async def page(request):
+        requests_seen.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.Response(text="<p>cached body</p>", content_type="text/html", headers={"ETag": '"v1"'})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/doc", page)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/doc"
+        monkeypatch.setattr(webpage, "content_cache", ContentCache(max_bytes=10_000, ttl=0, shared=False))
+        try:
+            first = await webpage.extract_webpage_content(url)
+            second = await webpage.extract_webpage_content(url + "#section")
+        finally:
+            await webpage.close()
+            await runner.cleanup()
+        return first, second, webpage.content_cache.as_dict()
+
+    first, second, stats = asyncio.run(run())
+    assert first == second == "cached body"
+    assert requests_seen == [None, '"v1"']
+    assert stats["revalidated"] == 1
@@ -0,0 +1,168 @@
+import asyncio
+
+from src import conversations
+from src.conversations import BloomFilter, ConversationStore
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"C{i}-1700000000.{i:06d}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"D{i}-1.0" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def fake_db(monkeypatch, rows):
+    queries = []
+
+    async def get_conversation(conversation_id):
+        queries.append(conversation_id)
+        return rows.get(conversation_id)
+
+    async def update_button_payloads(conversation_id, button_payloads):
+        rows[conversation_id] = dict(rows[conversation_id], button_payloads=button_payloads)
+
+    monkeypatch.setattr(conversations.db, "get_conversation", get_conversation)
+    monkeypatch.setattr(conversations.db, "update_button_payloads", update_button_payloads)
+    monkeypatch.setattr(conversations.db, "worker_id", "worker-a")
+    return queries
+
+
+def test_unknown_threads_cost_no_queries_and_state_is_cached(monkeypatch):
+    row = {"conversation_id": "C1-1.0", "user_id": "U1", "channel_id": "C1", "thread_ts": "1.0",
+           "button_payloads": {"1": {"type": "a"}}, "transcript_created": True}
+    queries = fake_db(monkeypatch, {"C1-1.0": row})
+    store = ConversationStore()
+    store.known.add("C1-1.0")
+    store.known_ready = True
+
+    async def run():
+        assert not await store.exists("C9-9.0")
+        assert await store.exists("C1-1.0")
+        await store.update_button_payloads("C1-1.0", {"1": {"type": "b"}})
+        return await store.get("C1-1.0")
+
+    state = asyncio.run(run())
+    assert queries == ["C1-1.0"]
+    assert state.button_payloads == {"1": {"type": "b"}}
+    assert store.stats["filter_negative"] == 1
+
+
+def test_notifications_from_other_workers_invalidate_cached_state(monkeypatch):
+    fake_db(monkeypatch, {})
+    store = ConversationStore()
+    store.states["C1-1.0"] = object()
+    store.states["C2-2.0"] = object()
+
+    store._on_notification("worker-a C1-1.0")
+    store._on_notification("worker-b C2-2.0")
+    store._on_notification("worker-b C3-3.0")
+
+    assert "C1-1.0" in store.states
+    assert "C2-2.0" not in store.states
+    assert "C3-3.0" in store.known
+    assert store.stats["invalidations"] == 1
+
+
+def test_get_many_loads_all_misses_with_one_query(monkeypatch):
+    queries = []
+
+    async def get_conversations(conversation_ids):
+        queries.append(list(conversation_ids))
+        return [{"conversation_id": i, "user_id": "U1", "channel_id": "C1", "thread_ts": "1.0",
+                 "button_payloads": {}, "transcript_created": True} for i in conversation_ids if i != "C1-3.0"]
+
+    monkeypatch.setattr(conversations.db, "get_conversations", get_conversations)
+    store = ConversationStore()
+    for conversation_id in ("C1-1.0", "C1-2.0", "C1-3.0"):
+        store.known.add(conversation_id)
+    store.known_ready = True
+    store.states["C1-1.0"] = conversations.ConversationState("C1-1.0", "U1", "C1", "1.0", {}, True)
+
+    found = asyncio.run(store.get_many(["C1-1.0", "C1-2.0", "C1-2.0", "C1-3.0", "C9-9.0"]))
+    assert sorted(found) == ["C1-1.0", "C1-2.0"]
+    assert queries == [["C1-2.0", "C1-3.0"]]
+    assert "C1-2.0" in store.states
+
+
+def test_failed_load_closes_the_listener_before_reconnecting(monkeypatch):
+    opened = []
+
+    class Listener:
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    async def listen(channel, callback, on_disconnect=None):
+        opened.append(Listener())
+        return opened[-1]
+
+    async def iter_conversation_ids():
+        raise ConnectionError("database went away")
+        yield
+
+    monkeypatch.setattr(conversations.db, "listen", listen)
+    monkeypatch.setattr(conversations.db, "iter_conversation_ids", iter_conversation_ids)
+    monkeypatch.setattr(conversations, "reconnect_delay", 0.01)
+    store = ConversationStore()
+
+    async def run():
+        await store.start()
+        await asyncio.sleep(0.05)
+        await store.close()
+
+    asyncio.run(run())
+    assert len(opened) >= 2
+    assert all(listener.closed for listener in opened)
+    assert not store.known_ready
+
+
+def test_filter_loads_in_the_background_and_rebuilds_from_the_table(monkeypatch):
+    table = ["C1-1.0", "C2-2.0"]
+    release = asyncio.Event()
+    loads = []
+
+    class Listener:
+        async def close(self):
+            pass
+
+    async def listen(channel, callback, on_disconnect=None):
+        return Listener()
+
+    async def iter_conversation_ids():
+        loads.append(list(table))
+        await release.wait()
+        for conversation_id in loads[-1]:
+            yield conversation_id
+
+    monkeypatch.setattr(conversations.db, "listen", listen)
+    monkeypatch.setattr(conversations.db, "iter_conversation_ids", iter_conversation_ids)
+    monkeypatch.setattr(conversations.db, "worker_id", "worker-a")
+    store = ConversationStore()
+
+    async def run():
+        await store.start()
+        # Startup doesn't wait for the scan; lookups go to the database meanwhile
+        assert not store.known_ready
+        release.set()
+        await store._load_task
+        assert store.known_ready and "C2-2.0" in store.known
+
+        # C2 was archived; C3 is created while the rebuild is scanning
+        table.remove("C2-2.0")
+        release.clear()
+        store.schedule_rebuild()
+        await asyncio.sleep(0)
+        store._on_notification("worker-b C3-3.0")
+        release.set()
+        await store._load_task
+        await store.close()
+
+    asyncio.run(run())
+    assert len(loads) == 2
+    assert "C1-1.0" in store.known and "C3-3.0" in store.known
+    assert "C2-2.0" not in store.known
+    assert store.stats["filter_loads"] == 2
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from src import db
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.queries = []
+
+    async def fetchval(self, query, *args):
+        self.queries.append((query, args))
+        return self.number
+
+
+class FakePool:
+    def __init__(self, size):
+        self.idle = [FakeConnection(n) for n in range(size)]
+        self.size = size
+        self.released = []
+        self.closed = False
+        self._available = asyncio.Semaphore(size)
+
+    async def acquire(self, timeout=None):
+        await asyncio.wait_for(self._available.acquire(), timeout)
+        return self.idle.pop()
+
+    async def release(self, conn):
+        self.released.append(conn.number)
+        self.idle.append(conn)
+        self._available.release()
+
+    def get_size(self):
+        return self.size
+
+    def get_idle_size(self):
+        return len(self.idle)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    created = []
+
+    async def create_pool(dsn, **kwargs):
+        created.append(kwargs)
+        return FakePool(kwargs["max_size"])
+
+    monkeypatch.setattr(db.asyncpg, "create_pool", create_pool)
+    monkeypatch.setattr(db, "_pool", None)
+    monkeypatch.setattr(db, "_stats", {key: 0 for key in db._stats})
+    monkeypatch.setattr(db, "pool_max_size", 2)
+    monkeypatch.setattr(db, "pool_acquire_timeout", 0.05)
+    return created
+
+
+def test_init_pool_is_created_once_and_closed(pool):
+    async def run():
+        first = await db.init_pool()
+        assert await db.init_pool() is first
+        await db.close_pool()
+        await db.close_pool()
+        return first
+
+    fake_pool = asyncio.run(run())
+    assert len(pool) == 1 and pool[0]["max_size"] == 2
+    assert pool[0]["server_settings"] == {"application_name": db.worker_id}
+    assert fake_pool.closed and db._pool is None
+
+
+def test_acquire_releases_the_connection_even_on_error(pool):
+    async def run():
+        fake_pool = await db.init_pool()
+        assert await db.fetchval("SELECT 1") == 1
+        with pytest.raises(ValueError):
+            async with db.acquire():
+                raise ValueError("query failed")
+        in_use = None
+        async with db.acquire():
+            in_use = db.pool_stats()["in_use"]
+        return fake_pool, in_use
+
+    fake_pool, in_use = asyncio.run(run())
+    assert len(fake_pool.released) == 3
+    assert in_use == 1
+    stats = db.pool_stats()
+    assert stats["acquired"] == 3 and stats["acquire_timeouts"] == 0
+
+
+def test_exhausted_pool_times_out_and_counts_it(pool):
+    async def run():
+        await db.init_pool()
+        async with db.acquire(), db.acquire():
+            stats = db.pool_stats()
+            with pytest.raises(asyncio.TimeoutError):
+                async with db.acquire():
+                    pass
+        return stats
+
+    busy = asyncio.run(run())
+    assert busy["size"] == 2 and busy["idle"] == 0 and busy["in_use"] == 2
+    stats = db.pool_stats()
+    assert stats["acquire_timeouts"] == 1 and stats["acquired"] == 2
+    assert stats["max_acquire_wait_seconds"] >= 0
+
+
+def test_acquire_without_a_pool_fails_clearly(pool):
+    async def run():
+        async with db.acquire():
+            pass
+
+    with pytest.raises(RuntimeError, match="init_pool"):
+        asyncio.run(run())
+    assert db.pool_stats() == dict(
+        db._stats, min_size=db.pool_min_size, max_size=2, size=0, idle=0, in_use=0
+    )
@@ -0,0 +1,34 @@
+import asyncio
+
+from src import dedup
+
+
+def test_event_key_prefers_message_identity():
+    body = {"event_id": "Ev1"}
+    assert dedup.event_key(body, {"client_msg_id": "abc", "channel": "C1", "ts": "1.0"}) == "msg:abc"
+    assert dedup.event_key(body, {"channel": "C1", "ts": "1.0"}) == "ts:C1:1.0"
+    assert dedup.event_key(body, {}) == "event:Ev1"
+
+
+def test_duplicates_are_rejected_locally_and_across_workers(monkeypatch):
+    shared = dedup.MemoryDedupStore()
+    monkeypatch.setattr(dedup, "store", shared)
+    monkeypatch.setattr(dedup, "processed_events", dedup.TTLCache(maxsize=100, ttl=60))
+    monkeypatch.setattr(dedup, "stats", dict.fromkeys(dedup.stats, 0))
+
+    message = {"client_msg_id": "m-1", "channel": "C1", "ts": "1.0"}
+    mention = dict(message, type="app_mention")
+
+    async def run():
+        first = await dedup.claim({"event_id": "Ev1"}, message)
+        overlap = await dedup.claim({"event_id": "Ev2"}, mention)
+        # Simulate a second worker: fresh local cache, same shared store
+        dedup.processed_events.clear()
+        retry_elsewhere = await dedup.claim({"event_id": "Ev1"}, message)
+        return first, overlap, retry_elsewhere
+
+    assert asyncio.run(run()) == (True, False, False)
+    assert dedup.seen({}, message)
+    assert dedup.stats["unique"] == 1
+    assert dedup.stats["duplicates_local"] == 2
+    assert dedup.stats["duplicates_shared"] == 1
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+from src import documents
+
+
+def make_pptx(path, slides):
+    presentation = Presentation()
+    for text in slides:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        slide.shapes.title.text = text
+        slide.shapes.add_textbox(Inches(1), Inches(2), Inches(4), Inches(1)).text = f"notes for {text}"
+    presentation.save(path)
+
+
+def test_extract_document_stops_at_page_budget(tmp_path):
+    path = str(tmp_path / "deck.pptx")
+    make_pptx(path, ["Intro", "Plan", "Budget"])
+
+    text, pages_read, truncated = documents.extract_document(path, "pptx", 2, 60, 10_000)
+    assert pages_read == 2
+    assert truncated
+    assert "Plan" in text and "Budget" not in text
+
+    text, pages_read, truncated = documents.extract_document(path, "pptx", 10, 60, 10_000)
+    assert pages_read == 3 and not truncated
+
+
+def test_extract_document_text_runs_in_worker_process(tmp_path):
+    path = str(tmp_path / "notes.docx")
+    document = Document()
+    document.add_paragraph("Meeting notes")
+    document.add_paragraph("Ship the release on Friday.")
+    document.save(path)
+
+    async def run():
+        try:
+            return await documents.extract_document_text(path, "docx")
+        finally:
+            documents.close()
+
+    assert asyncio.run(run()) == "Meeting notes\nShip the release on Friday."
+
+
+def test_document_at_exactly_the_budget_is_not_truncated(tmp_path):
+    path = str(tmp_path / "deck.pptx")
+    make_pptx(path, ["Intro", "Plan", "Budget"])
+
+    text, pages_read, truncated = documents.extract_document(path, "pptx", 3, 60, 10_000)
+    assert pages_read == 3 and not truncated
+
+    text, pages_read, truncated = documents.extract_document(path, "pptx", 10, 60, len(text))
+    assert not truncated
+    text, pages_read, truncated = documents.extract_document(path, "pptx", 10, 60, len(text) - 1)
+    assert truncated
+
+
+def stuck_extraction(file_path, file_type, page_limit, seconds_limit, char_limit):
+    time.sleep(30)
+
+
+def test_stuck_extraction_hits_the_hard_timeout_and_recycles_the_pool(monkeypatch):
+    monkeypatch.setattr(documents, "hard_timeout", 1)
+
+    async def run():
+        try:
+            documents.start()
+            stuck_executor = documents._executor
+            with monkeypatch.context() as patch:
+                patch.setattr(documents, "extract_document", stuck_extraction)
+                started = time.monotonic()
+                assert await documents.extract_document_text("unused.pdf", "pdf") is None
+                elapsed = time.monotonic() - started
+            processes = list(stuck_executor._processes.values()) if stuck_executor._processes else []
+            assert documents._executor is None
+            return elapsed, processes
+        finally:
+            documents.close()
+
+    elapsed, processes = asyncio.run(run())
+    assert elapsed < 5
+    time.sleep(0.2)
+    assert not any(process.is_alive() for process in processes)
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import os
+
+from aiohttp import web
+
+from src import downloads
+
+
+async def start_stub_files():
+    async def recording(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(int(request.query.get("chunks", "8"))):
+            await response.write(b"a" * 64 * 1024)
+            await asyncio.sleep(float(request.query.get("delay", "0")))
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/files/recording.mp4", recording)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/files/recording.mp4"
+
+
+def run_download(query, max_bytes=10 * 1024 * 1024, cancel_after=None, digest=None):
+    async def run():
+        runner, url = await start_stub_files()
+        created = []
+        real_mkstemp = downloads.tempfile.mkstemp
+
+        def tracking_mkstemp(*args, **kwargs):
+            fd, path = real_mkstemp(*args, **kwargs)
+            created.append(path)
+            return fd, path
+
+        real_max_bytes = downloads.max_download_bytes
+        downloads.tempfile.mkstemp = tracking_mkstemp
+        downloads.max_download_bytes = max_bytes
+        try:
+            task = asyncio.create_task(downloads.download_file(f"{url}?{query}", suffix=".mp4", digest=digest))
+            if cancel_after is not None:
+                await asyncio.sleep(cancel_after)
+                task.cancel()
+            try:
+                return await task, created
+            except asyncio.CancelledError:
+                return "cancelled", created
+        finally:
+            downloads.tempfile.mkstemp = real_mkstemp
+            downloads.max_download_bytes = real_max_bytes
+            await downloads.close()
+            await runner.cleanup()
+
+    return asyncio.run(run())
+
+
+def test_download_streams_to_disk():
+    path, _ = run_download("chunks=8")
+    try:
+        assert path.endswith(".mp4")
+        assert os.path.getsize(path) == 8 * 64 * 1024
+    finally:
+        os.unlink(path)
+
+
+def test_download_hashes_content_as_it_streams():
+    digest = hashlib.sha256()
+    path, _ = run_download("chunks=3", digest=digest)
+    try:
+        assert digest.hexdigest() == hashlib.sha256(b"a" * 3 * 64 * 1024).hexdigest()
+    finally:
+        os.unlink(path)
+
+
+def test_download_over_limit_is_discarded():
+    path, created = run_download("chunks=8", max_bytes=100 * 1024)
+    assert path is None
+    assert not os.path.exists(created[0])
+
+
+def test_cancelled_download_removes_partial_file():
+    result, created = run_download("chunks=50&delay=0.02", cancel_after=0.2)
+    assert result == "cancelled"
+    assert not os.path.exists(created[0])
@@ -0,0 +1,56 @@
+import asyncio
+
+from src import main
+from src.event_queue import EventQueue
+from src.scheduler import KeyedScheduler
+
+
+def test_follow_ups_for_a_busy_thread_do_not_hold_queue_workers(monkeypatch):
+    started = []
+
+    async def process_message(event, say):
+        started.append((event["channel"], event["text"]))
+        await asyncio.sleep(0.2 if event["channel"] == "D-busy" else 0.01)
+
+    async def claim(body, event):
+        return True
+
+    class Slack:
+        def sayer(self, channel_id):
+            async def say(**kwargs):
+                pass
+            return say
+
+    monkeypatch.setattr(main, "process_message", process_message)
+    monkeypatch.setattr(main.dedup, "claim", claim)
+    monkeypatch.setattr(main, "slack", Slack())
+
+    def event(channel, text):
+        return {"type": "message", "channel_type": "im", "channel": channel, "ts": "1.0", "thread_ts": "1.0", "text": text}
+
+    async def replies(event):
+        return False
+
+    async def run():
+        queue = EventQueue(max_size=20, workers=2)
+        scheduler = KeyedScheduler(max_queue=10)
+        monkeypatch.setattr(main, "event_queue", queue)
+        monkeypatch.setattr(main, "conversation_scheduler", scheduler)
+        queue.start()
+        await main.ingest(main.process_message_event, {}, event("D-busy", "first"), replies)
+        await asyncio.sleep(0.02)
+        for n in range(4):
+            await main.ingest(main.process_message_event, {}, event("D-busy", f"follow-up {n}"), replies)
+        for n in range(3):
+            await main.ingest(main.process_message_event, {}, event(f"D-{n}", "hello"), replies)
+        await asyncio.sleep(0.1)
+        others_served_while_busy = [channel for channel, _ in started if channel != "D-busy"]
+        await queue.close()
+        await scheduler.close()
+        return others_served_while_busy, queue.as_dict(), scheduler.as_dict()
+
+    others, queue_stats, scheduler_stats = asyncio.run(run())
+    assert others == ["D-0", "D-1", "D-2"]
+    assert queue_stats["shed"] == 0
+    assert ("D-busy", "follow-up 0\nfollow-up 1\nfollow-up 2\nfollow-up 3") in started
+    assert scheduler_stats["coalesced"] == 3
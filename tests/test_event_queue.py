@@ -0,0 +1,75 @@
+import asyncio
+
+from src import metrics
+from src.event_queue import EventQueue
+
+
+def test_workers_bound_concurrency_and_keep_the_offering_context():
+    log = []
+
+    async def run():
+        queue = EventQueue(max_size=10, workers=2)
+        queue.start()
+        running = 0
+
+        async def handle(n):
+            nonlocal running
+            running += 1
+            log.append((n, running, metrics.trace_id_var.get()))
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        for n in range(5):
+            metrics.new_trace_id(f"event-{n}")
+            assert queue.offer(handle, n)
+        await queue.close()
+        return queue.as_dict()
+
+    stats = asyncio.run(run())
+    assert [n for n, _, _ in log] == [0, 1, 2, 3, 4]
+    assert max(running for _, running, _ in log) == 2
+    assert [trace_id for _, _, trace_id in log] == [f"event-{n}" for n in range(5)]
+    assert stats["processed"] == 5 and stats["depth"] == 0
+
+
+def test_full_queue_sheds_and_reports_depth_and_age():
+    async def run():
+        queue = EventQueue(max_size=2, workers=1)
+        queue.start()
+        release = asyncio.Event()
+
+        async def handle(n):
+            await release.wait()
+
+        accepted = [queue.offer(handle, n) for n in range(3)]
+        await asyncio.sleep(0.01)  # the worker takes the first event
+        accepted.append(queue.offer(handle, 3))
+        accepted.append(queue.offer(handle, 4))
+        await asyncio.sleep(0.03)
+        waiting = queue.as_dict()
+        release.set()
+        await queue.close()
+        return accepted, waiting, queue.as_dict()
+
+    accepted, waiting, stats = asyncio.run(run())
+    assert accepted == [True, True, False, True, False]
+    assert waiting["depth"] == 2 and waiting["busy_workers"] == 1
+    assert waiting["oldest_age_seconds"] >= 0.03
+    assert stats["shed"] == 2 and stats["processed"] == 3 and stats["failed"] == 0
+
+
+def test_failures_are_counted_and_close_refuses_new_events():
+    async def run():
+        queue = EventQueue(max_size=5, workers=1)
+        queue.start()
+
+        async def handle():
+            raise ValueError("bad event")
+
+        queue.offer(handle)
+        await queue.close()
+        return queue.offer(handle), queue.as_dict()
+
+    accepted, stats = asyncio.run(run())
+    assert accepted is False
+    assert stats["failed"] == 1 and stats["shed"] == 1
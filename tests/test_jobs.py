@@ -0,0 +1,98 @@
+import asyncio
+
+from src import jobs
+
+
+def make_job(attempts, max_attempts=3):
+    return {"id": 7, "attempts": attempts, "max_attempts": max_attempts, "conversation_id": "C1-1"}
+
+
+def record_db_calls(monkeypatch):
+    calls = []
+
+    async def complete(job_id):
+        calls.append(("complete", job_id))
+
+    async def retry(job_id, delay, error):
+        calls.append(("retry", job_id, error))
+
+    async def fail(job_id, error):
+        calls.append(("fail", job_id, error))
+
+    monkeypatch.setattr(jobs.db, "complete_transcription_job", complete)
+    monkeypatch.setattr(jobs.db, "retry_transcription_job", retry)
+    monkeypatch.setattr(jobs.db, "fail_transcription_job", fail)
+    return calls
+
+
+def test_retry_delay_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr(jobs, "retry_base_delay", 10)
+    monkeypatch.setattr(jobs, "retry_max_delay", 100)
+    assert 8 <= jobs.retry_delay(1) <= 12
+    assert 32 <= jobs.retry_delay(3) <= 48
+    assert jobs.retry_delay(10) <= 120
+
+
+def test_job_status_transitions(monkeypatch):
+    calls = record_db_calls(monkeypatch)
+    failures = []
+
+    async def ok(job):
+        pass
+
+    async def broken(job):
+        raise jobs.JobError("whisper unavailable")
+
+    async def on_failure(job, error):
+        failures.append(error)
+
+    async def run():
+        await jobs.run_job(make_job(1), ok, on_failure)
+        await jobs.run_job(make_job(1), broken, on_failure)
+        await jobs.run_job(make_job(3), broken, on_failure)
+
+    asyncio.run(run())
+    assert calls == [
+        ("complete", 7),
+        ("retry", 7, "whisper unavailable"),
+        ("fail", 7, "whisper unavailable"),
+    ]
+    assert failures == ["whisper unavailable"]
+
+
+def test_long_running_job_renews_its_lease(monkeypatch):
+    calls = record_db_calls(monkeypatch)
+    monkeypatch.setattr(jobs, "lease_seconds", 0.03)
+
+    async def touch(job_id):
+        calls.append(("touch", job_id))
+
+    async def slow(job):
+        await asyncio.sleep(0.05)
+
+    async def on_failure(job, error):
+        pass
+
+    monkeypatch.setattr(jobs.db, "touch_transcription_job", touch)
+
+    async def run():
+        await jobs.run_job(make_job(1), slow, on_failure)
+        await asyncio.sleep(0.03)
+
+    asyncio.run(run())
+    assert calls.count(("touch", 7)) >= 2
+    assert calls[-1] == ("complete", 7)
+
+
+def test_jobs_that_expire_on_their_last_attempt_are_failed(monkeypatch):
+    failures = []
+
+    async def fail_expired(lease_seconds):
+        return [dict(make_job(3), last_error="worker stopped responding on every attempt")]
+
+    async def on_failure(job, error):
+        failures.append((job["id"], error))
+
+    monkeypatch.setattr(jobs.db, "fail_expired_transcription_jobs", fail_expired)
+    asyncio.run(jobs.fail_expired_jobs("worker", on_failure))
+    assert failures == [(7, "worker stopped responding on every attempt")]
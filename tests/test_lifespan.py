@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from src import db, main
+
+
+def test_startup_failure_closes_what_already_started(monkeypatch):
+    closed = []
+
+    async def init_pool():
+        pass
+
+    async def close_pool():
+        closed.append("pool")
+
+    async def start_conversations():
+        pass
+
+    async def close_conversations():
+        closed.append("conversations")
+
+    async def failing_voiceflow_start():
+        raise RuntimeError("voiceflow session failed")
+
+    async def close_voiceflow():
+        closed.append("voiceflow")
+
+    async def ensure_schema():
+        return []
+
+    voiceflow = type("Voiceflow", (), {"start": staticmethod(failing_voiceflow_start), "close": staticmethod(close_voiceflow)})()
+    monkeypatch.setattr(main, "create_clients", lambda: None)
+    monkeypatch.setattr(main, "voiceflow", voiceflow)
+    monkeypatch.setattr(db, "init_pool", init_pool)
+    monkeypatch.setattr(db, "close_pool", close_pool)
+    monkeypatch.setattr(db, "ensure_schema", ensure_schema)
+    monkeypatch.setattr(main.conversations, "start", start_conversations)
+    monkeypatch.setattr(main.conversations, "close", close_conversations)
+
+    async def run():
+        async with main.lifespan(main.app):
+            pass
+
+    with pytest.raises(RuntimeError, match="voiceflow session failed"):
+        asyncio.run(run())
+    assert closed == ["conversations", "pool"]
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+
+import pytest
+
+from src import metrics
+from src.scheduler import KeyedScheduler
+
+
+def test_span_records_duration_and_errors():
+    histogram = metrics.Histogram("test_seconds", "Test.", ["stage"], buckets=(0.1, 1))
+    counter = metrics.Counter("test_errors_total", "Test.", ["stage"])
+    histogram.observe("a", value=0.05)
+    histogram.observe("a", value=0.5)
+    histogram.observe("a", value=5)
+    counter.inc("a")
+
+    lines = histogram.render()
+    assert 'ai_assistant_test_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 'ai_assistant_test_seconds_bucket{stage="a",le="1"} 2' in lines
+    assert 'ai_assistant_test_seconds_bucket{stage="a",le="+Inf"} 3' in lines
+    assert 'ai_assistant_test_seconds_count{stage="a"} 3' in lines
+    assert 'ai_assistant_test_errors_total{stage="a"} 1' in counter.render()
+
+    with pytest.raises(ValueError):
+        with metrics.span("test.failing"):
+            raise ValueError("boom")
+    assert metrics.stage_errors._values[("test.failing",)] == 1
+    assert metrics.stage_duration._series[("test.failing",)]["count"] == 1
+
+
+def test_render_exports_stats_as_gauges():
+    text = metrics.render({"slack_dispatcher": {"sent": 3, "queued": {"user_reply": 1}, "enabled": True, "name": "x"}})
+    assert "ai_assistant_slack_dispatcher_sent 3" in text
+    assert "ai_assistant_slack_dispatcher_queued_user_reply 1" in text
+    assert "ai_assistant_slack_dispatcher_enabled 1" in text
+    assert "name" not in text
+    assert "# TYPE ai_assistant_stage_duration_seconds histogram" in text
+
+
+def test_trace_id_follows_scheduled_work_into_logs(caplog):
+    metrics.install_log_trace_ids()
+    seen = []
+
+    async def run():
+        scheduler = KeyedScheduler(max_queue=10)
+
+        async def turn(n):
+            await asyncio.sleep(0.01)
+            logging.info(f"turn {n}")
+            seen.append(metrics.trace_id_var.get())
+
+        async def submit(n):
+            metrics.new_trace_id(f"trace-{n}")
+            await scheduler.submit("key", turn, n)
+
+        await asyncio.gather(*(asyncio.create_task(submit(n)) for n in range(3)))
+
+    with caplog.at_level(logging.INFO):
+        asyncio.run(run())
+    assert seen == ["trace-0", "trace-1", "trace-2"]
+    assert [record.trace_id for record in caplog.records if record.message.startswith("turn")] == seen
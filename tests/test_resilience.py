@@ -0,0 +1,121 @@
+import asyncio
+
+import aiohttp
+import pytest
+
+from src import resilience
+from src.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded
+
+
+def http_error(status):
+    return aiohttp.ClientResponseError(request_info=None, history=(), status=status)
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_a_probe():
+    breaker = CircuitBreaker("TEST", failure_threshold=2, reset_timeout=0.05)
+
+    async def failing():
+        raise http_error(503)
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(resilience.UpstreamFailed):
+                await resilience.call(breaker, failing, deadline=1)
+        assert breaker.state == resilience.OPEN
+        with pytest.raises(CircuitOpen):
+            await resilience.call(breaker, ok, deadline=1)
+
+        await asyncio.sleep(0.06)
+        assert await resilience.call(breaker, ok, deadline=1) == "ok"
+        assert breaker.state == resilience.CLOSED
+
+    asyncio.run(run())
+    stats = breaker.as_dict()
+    assert stats["opened"] == 1
+    assert stats["rejected"] == 1
+    assert stats["is_open"] is False
+
+
+def test_only_idempotent_calls_are_retried():
+    breaker = CircuitBreaker("TEST", failure_threshold=10)
+    attempts = {"idempotent": 0, "turn": 0}
+
+    def flaky(name):
+        async def make_call():
+            attempts[name] += 1
+            if attempts[name] < 3:
+                raise http_error(502)
+            return name
+        return make_call
+
+    async def run():
+        assert await resilience.call(breaker, flaky("idempotent"), deadline=5, retries=2, idempotent=True) == "idempotent"
+        with pytest.raises(resilience.UpstreamFailed) as failed:
+            await resilience.call(breaker, flaky("turn"), deadline=5, retries=2, idempotent=False)
+        assert isinstance(failed.value.__cause__, aiohttp.ClientResponseError)
+
+    asyncio.run(run())
+    assert attempts == {"idempotent": 3, "turn": 1}
+    assert breaker.stats["retries"] == 2
+
+
+def test_client_errors_do_not_trip_the_breaker():
+    breaker = CircuitBreaker("TEST", failure_threshold=1)
+
+    async def bad_request():
+        raise http_error(400)
+
+    async def run():
+        with pytest.raises(aiohttp.ClientResponseError):
+            await resilience.call(breaker, bad_request, deadline=1)
+
+    asyncio.run(run())
+    assert breaker.state == resilience.CLOSED
+    assert breaker.stats["failures"] == 0
+
+
+def test_deadline_covers_the_whole_call():
+    breaker = CircuitBreaker("TEST", failure_threshold=1)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def run():
+        with pytest.raises(DeadlineExceeded):
+            await resilience.call(breaker, hang, deadline=0.05, retries=3, idempotent=True)
+
+    asyncio.run(run())
+    assert breaker.state == resilience.OPEN
+    assert breaker.stats["deadlines"] == 1
+
+
+def test_persistent_upstream_error_gets_the_unavailable_reply(monkeypatch):
+    from src import main
+
+    breaker = CircuitBreaker("TEST", failure_threshold=10)
+    replies = []
+
+    class Conversation:
+        transcript_created = True
+
+    async def get(conversation_id):
+        return Conversation()
+
+    async def handle_user_input(conversation_id, user_input):
+        async def make_call():
+            raise http_error(503)
+        return await resilience.call(breaker, make_call, deadline=1)
+
+    async def say(**kwargs):
+        replies.append(kwargs["text"])
+
+    monkeypatch.setattr(main, "streaming_replies", False)
+    monkeypatch.setattr(main.conversations, "get", get)
+    monkeypatch.setattr(main, "voiceflow", type("Voiceflow", (), {"handle_user_input": staticmethod(handle_user_input)})())
+
+    event = {"type": "message", "user": "U1", "channel": "C1", "ts": "1.0", "text": "hi"}
+    asyncio.run(main.process_message(event, say))
+    assert replies == [main.unavailable_message]
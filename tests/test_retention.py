@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+
+from src import db, retention
+from src.conversations import ConversationStore
+from src.retention import RetentionJob
+
+
+class AsyncNullContext(contextlib.nullcontext):
+    async def __aenter__(self):
+        return self.enter_result
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, applied):
+        self.applied = set(applied)
+        self.statements = []
+
+    async def execute(self, statement, *args):
+        self.statements.append(statement)
+        if statement.startswith("INSERT INTO schema_migrations"):
+            self.applied.add(args[0])
+
+    async def fetch(self, query):
+        return [{"version": version} for version in sorted(self.applied)]
+
+    def transaction(self):
+        return AsyncNullContext()
+
+
+def fake_acquire(monkeypatch, conn):
+    @contextlib.asynccontextmanager
+    async def acquire():
+        yield conn
+
+    monkeypatch.setattr(db, "acquire", acquire)
+
+
+def test_ensure_schema_applies_only_pending_migrations(monkeypatch):
+    conn = FakeConnection(applied=[1])
+    fake_acquire(monkeypatch, conn)
+    monkeypatch.setattr(db, "MIGRATIONS", [(1, "first", ["CREATE TABLE a ()"]), (2, "second", ["CREATE TABLE b ()"])])
+
+    assert asyncio.run(db.ensure_schema()) == [2]
+    assert "CREATE TABLE a ()" not in conn.statements and "CREATE TABLE b ()" in conn.statements
+    assert conn.statements[-1].startswith("SELECT pg_advisory_unlock")
+    assert asyncio.run(db.ensure_schema()) == []
+
+
+def test_migrations_have_unique_increasing_versions():
+    versions = [version for version, _, _ in db.MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_retention_drains_batches_and_reports_archived_ids(monkeypatch):
+    batches = [[f"C{n}" for n in range(3)], [f"C{n}" for n in range(3, 6)], ["C6"]]
+    archived = []
+
+    async def archive_idle_conversations(idle_seconds, batch_size):
+        assert idle_seconds == retention.conversation_idle_days * retention.day and batch_size == 3
+        return batches.pop(0)
+
+    async def purge_archived_conversations(older_than_seconds, batch_size):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(db, "archive_idle_conversations", archive_idle_conversations)
+    monkeypatch.setattr(db, "purge_archived_conversations", purge_archived_conversations)
+    monkeypatch.setattr(retention, "retention_batch_pause", 0)
+    monkeypatch.setattr(retention, "conversation_idle_days", 90)
+    monkeypatch.setattr(retention, "archive_retention_days", 365)
+    job = RetentionJob(on_archived=archived.extend, batch_size=3)
+
+    asyncio.run(job.run_once())
+    assert archived == [f"C{n}" for n in range(7)]
+    stats = job.as_dict()
+    assert stats["archived"] == 7 and stats["errors"] == 1 and stats["runs"] == 1
+
+
+def test_retention_is_opt_in(monkeypatch):
+    async def unexpected(*args):
+        raise AssertionError("retention ran without being configured")
+
+    for name in ("archive_idle_conversations", "purge_archived_conversations", "purge_transcripts"):
+        monkeypatch.setattr(db, name, unexpected)
+    job = RetentionJob()
+    asyncio.run(job.run_once())
+    assert job.stats["errors"] == 0 and job.stats["archived"] == 0
+
+
+def test_forget_drops_cached_conversations():
+    store = ConversationStore()
+    store.states["C1-1.0"] = {"button_payloads": {}}
+    store.states["C2-2.0"] = {"button_payloads": {}}
+    store.forget(["C1-1.0", "C3-3.0"])
+    assert list(store.states) == ["C2-2.0"]
+
+
+def test_retention_rebuilds_the_filter_only_after_archiving(monkeypatch):
+    batches = [["C1"], []]
+    rebuilds = []
+
+    async def archive_idle_conversations(idle_seconds, batch_size):
+        return batches.pop(0)
+
+    monkeypatch.setattr(db, "archive_idle_conversations", archive_idle_conversations)
+    monkeypatch.setattr(retention, "conversation_idle_days", 90)
+    job = RetentionJob(after_archive=lambda: rebuilds.append(job.stats["archived"]), batch_size=3)
+
+    asyncio.run(job.run_once())
+    asyncio.run(job.run_once())
+    assert rebuilds == [1]
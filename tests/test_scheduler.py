@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from src.scheduler import KeyedScheduler, SchedulerBusy
+
+
+def test_work_is_serialised_per_key_and_parallel_across_keys():
+    log = []
+
+    async def run():
+        scheduler = KeyedScheduler(max_queue=10)
+
+        async def turn(payload):
+            key, n = payload
+            log.append(("start", key, n))
+            await asyncio.sleep(0.02)
+            log.append(("end", key, n))
+            return n
+
+        futures = [scheduler.submit(key, turn, (key, n)) for n in range(3) for key in ("a", "b")]
+        return await asyncio.gather(*futures), scheduler.as_dict()
+
+    results, stats = asyncio.run(run())
+    assert results == [0, 0, 1, 1, 2, 2]
+    for key in ("a", "b"):
+        events = [(kind, n) for kind, k, n in log if k == key]
+        assert events == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    # Both keys started their first turn before either finished
+    assert log[:2] == [("start", "a", 0), ("start", "b", 0)]
+    assert stats["active_keys"] == 0 and stats["completed"] == 6
+
+
+def test_queued_items_are_coalesced_and_queues_are_bounded():
+    runs = []
+
+    def merge(payloads):
+        return " + ".join(payloads)
+
+    async def run():
+        scheduler = KeyedScheduler(max_queue=3)
+
+        async def turn(text):
+            runs.append(text)
+            await asyncio.sleep(0.01)
+            return text
+
+        first = scheduler.submit("t", turn, "one", coalesce=merge)
+        await asyncio.sleep(0)  # let the first turn start
+        queued = [scheduler.submit("t", turn, text, coalesce=merge) for text in ("two", "three", "four")]
+        with pytest.raises(SchedulerBusy):
+            scheduler.submit("t", turn, "five", coalesce=merge)
+        return await first, await asyncio.gather(*queued), scheduler.as_dict()
+
+    first, queued, stats = asyncio.run(run())
+    assert runs == ["one", "two + three + four"]
+    assert first == "one"
+    assert queued == ["two + three + four"] * 3
+    assert stats["coalesced"] == 2 and stats["rejected"] == 1
+
+
+def test_running_work_is_bounded_across_keys_and_pending_work_is_capped():
+    running = []
+    peak = []
+
+    async def run():
+        scheduler = KeyedScheduler(max_queue=5, max_running=2, max_pending=3)
+
+        async def turn(n):
+            running.append(n)
+            peak.append(len(running))
+            await asyncio.sleep(0.02)
+            running.remove(n)
+            return n
+
+        futures = [scheduler.submit(f"key-{n}", turn, n) for n in range(3)]
+        with pytest.raises(SchedulerBusy):
+            scheduler.submit("key-3", turn, 3)
+        results = await asyncio.gather(*futures)
+        return results, scheduler.as_dict()
+
+    results, stats = asyncio.run(run())
+    assert results == [0, 1, 2]
+    assert max(peak) == 2
+    assert stats["rejected"] == 1 and stats["running"] == 0
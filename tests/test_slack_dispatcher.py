@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+from aiohttp import web
+from slack_sdk.web.async_client import AsyncWebClient
+
+from src import slack_dispatcher
+from src.slack_dispatcher import NOTIFICATION, USER_REPLY, SlackDispatcher
+
+
+async def start_fake_slack(rate_limit_first=0):
+    received = []
+    remaining_429s = {"count": rate_limit_first}
+
+    async def api(request):
+        method = request.match_info["method"]
+        body = await request.json()
+        if remaining_429s["count"] > 0:
+            remaining_429s["count"] -= 1
+            return web.json_response({"ok": False, "error": "ratelimited"}, status=429, headers={"Retry-After": "1"})
+        received.append((time.monotonic(), method, body))
+        return web.json_response({"ok": True, "channel": body.get("channel"), "ts": f"{len(received)}.000"})
+
+    app = web.Application()
+    app.router.add_post("/api/{method}", api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    client = AsyncWebClient(token="xoxb-test", base_url=f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/api/")
+    return runner, client, received
+
+
+def test_retry_after_is_honoured_and_order_kept():
+    async def run():
+        runner, client, received = await start_fake_slack(rate_limit_first=1)
+        dispatcher = SlackDispatcher(client, concurrency=2)
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(
+                dispatcher.chat_postMessage(channel="C1", thread_ts="1.0", text=f"message {n}", blocks=[])
+                for n in range(3)
+            ))
+        finally:
+            await dispatcher.close()
+            await runner.cleanup()
+        return received, started, dispatcher.stats
+
+    received, started, stats = asyncio.run(run())
+    assert [body["text"] for _, _, body in received] == ["message 0", "message 1", "message 2"]
+    assert received[0][0] - started >= 1.0
+    assert stats["rate_limited"] == 1 and stats["sent"] == 3
+
+
+def test_user_replies_jump_ahead_and_thread_posts_are_merged(monkeypatch):
+    monkeypatch.setattr(slack_dispatcher, "channel_rate", 100)
+
+    async def run():
+        runner, client, received = await start_fake_slack()
+        dispatcher = SlackDispatcher(client, concurrency=1)
+        try:
+            blocker = asyncio.create_task(dispatcher.chat_postMessage(channel="C0", text="warm up"))
+            await asyncio.sleep(0)
+            calls = [
+                dispatcher.chat_postMessage(priority=NOTIFICATION, channel="C2", text="document ready"),
+                dispatcher.chat_postMessage(priority=USER_REPLY, channel="C1", thread_ts="1.0", text="first"),
+                dispatcher.chat_postMessage(priority=USER_REPLY, channel="C1", thread_ts="1.0", text="second"),
+                dispatcher.chat_update(channel="C1", ts="5.0", text="draft"),
+                dispatcher.chat_update(channel="C1", ts="5.0", text="final"),
+            ]
+            responses = await asyncio.gather(*calls)
+            await blocker
+        finally:
+            await dispatcher.close()
+            await runner.cleanup()
+        return received, responses, dispatcher.stats
+
+    received, responses, stats = asyncio.run(run())
+    assert [(method, body["text"]) for _, method, body in received] == [
+        ("chat.postMessage", "warm up"),
+        ("chat.postMessage", "first\nsecond"),
+        ("chat.update", "final"),
+        ("chat.postMessage", "document ready"),
+    ]
+    assert responses[1]["ts"] == responses[2]["ts"]
+    assert stats["merged"] == 2
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    async def _call(self, method, kwargs):
+        self.sent.append((time.monotonic(), method, kwargs))
+        return {"ok": True, "channel": kwargs["channel"], "ts": f"{len(self.sent)}.000"}
+
+    async def chat_postMessage(self, **kwargs):
+        return await self._call("chat.postMessage", kwargs)
+
+    async def chat_update(self, **kwargs):
+        return await self._call("chat.update", kwargs)
+
+
+def test_throttled_method_does_not_hold_up_idle_channels():
+    async def run():
+        client = FakeClient()
+        dispatcher = SlackDispatcher(client, concurrency=4)
+        try:
+            updates = [
+                asyncio.create_task(dispatcher.chat_update(channel=f"C{n}", ts="1.0", text="edit"))
+                for n in range(16)
+            ]
+            await asyncio.sleep(0)
+            started = time.monotonic()
+            await dispatcher.chat_postMessage(channel="IDLE", text="hello")
+            posted_after = time.monotonic() - started
+            pending_updates = sum(not update.done() for update in updates)
+            for update in updates:
+                update.cancel()
+        finally:
+            await dispatcher.close()
+        return posted_after, pending_updates
+
+    posted_after, pending_updates = asyncio.run(run())
+    assert posted_after < 0.2
+    assert pending_updates > 0
+
+
+def test_posts_whose_ts_is_used_are_never_merged(monkeypatch):
+    monkeypatch.setattr(slack_dispatcher, "channel_rate", 100)
+
+    async def run():
+        client = FakeClient()
+        dispatcher = SlackDispatcher(client, concurrency=1)
+        try:
+            blocker = asyncio.create_task(dispatcher.chat_postMessage(channel="C0", text="warm up"))
+            await asyncio.sleep(0)
+            echo, placeholder = await asyncio.gather(
+                dispatcher.chat_postMessage(channel="C1", thread_ts="1.0", text="_Selected: More_"),
+                dispatcher.chat_postMessage(channel="C1", thread_ts="1.0", text="Just a moment...", mergeable=False),
+            )
+            await blocker
+        finally:
+            await dispatcher.close()
+        return client.sent, echo, placeholder, dispatcher.stats
+
+    sent, echo, placeholder, stats = asyncio.run(run())
+    assert [kwargs["text"] for _, _, kwargs in sent] == ["warm up", "_Selected: More_", "Just a moment..."]
+    assert echo["ts"] != placeholder["ts"]
+    assert stats["merged"] == 0
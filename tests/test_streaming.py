@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+
+from aiohttp import web
+
+os.environ.setdefault("VOICEFLOW_API_KEY", "test-key")
+
+from src import main
+from src.streaming import StreamingReply
+from src.voiceflow_api import VoiceflowAPI
+
+
+def sse(event, data=None):
+    lines = [f"event: {event}"]
+    if data is not None:
+        lines.append(f"data: {json.dumps(data)}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+async def start_stub_stream():
+    async def interact_stream(request):
+        body = await request.json()
+        assert request.headers["Accept"] == "text/event-stream"
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(sse("trace", {"type": "text", "payload": {"message": f"You said {body['action']['payload']}"}}))
+        await response.write(sse("trace", {"type": "completion", "payload": {"state": "start"}}))
+        for word in ["Streaming ", "is ", "working."]:
+            await asyncio.sleep(0.03)
+            await response.write(sse("trace", {"type": "completion", "payload": {"state": "content", "content": word}}))
+        await response.write(sse("trace", {"type": "completion", "payload": {"state": "end"}}))
+        await response.write(sse("trace", {"type": "choice", "payload": {"buttons": [
+            {"name": "More", "request": {"type": "path-more", "payload": {"label": "More"}}},
+        ]}}))
+        await response.write(sse("end"))
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v2/project/{project}/user/{user}/interact/stream", interact_stream)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+class FakeSlackClient:
+    def __init__(self):
+        self.calls = []
+
+    async def chat_postMessage(self, **kwargs):
+        self.calls.append(("post", kwargs))
+        return {"ok": True, "ts": "111.222"}
+
+    async def chat_update(self, **kwargs):
+        self.calls.append(("update", kwargs))
+        return {"ok": True}
+
+
+def test_streamed_traces_update_one_message_with_rate_limit():
+    async def run():
+        runner, url = await start_stub_stream()
+        voiceflow = VoiceflowAPI()
+        voiceflow.runtime_endpoint = url
+        voiceflow.project_id = "project"
+        client = FakeSlackClient()
+        reply = StreamingReply(client, "C1", "1.0", min_interval=0.05)
+        try:
+            await reply.start()
+            result = await voiceflow.handle_user_input_stream("C1-1.0", "hello", reply.update)
+            await reply.finish(result)
+        finally:
+            await voiceflow.close()
+            await runner.cleanup()
+        return result, client.calls
+
+    result, calls = asyncio.run(run())
+    assert result.messages == ("You said hello", "Streaming is working.")
+    assert list(result.button_payloads) == ["1"]
+
+    assert calls[0][0] == "post"
+    updates = [kwargs for kind, kwargs in calls[1:]]
+    assert all(kind == "update" for kind, _ in calls[1:])
+    assert all(update["ts"] == "111.222" for update in updates)
+    # Seven traces arrive but intermediate edits are coalesced
+    assert 2 <= len(updates) < 7
+    final_blocks = updates[-1]["blocks"]
+    assert final_blocks[-1]["type"] == "actions"
+    assert final_blocks[3]["text"]["text"] == "Streaming is working."
+
+
+def test_failed_streamed_turn_replaces_the_placeholder_with_the_error(monkeypatch):
+    client = FakeSlackClient()
+
+    class Conversation:
+        transcript_created = True
+
+    async def get(conversation_id):
+        return Conversation()
+
+    async def handle_user_input_stream(conversation_id, user_input, on_partial):
+        on_partial(type("Partial", (), {"messages": ("Half an ans",)})())
+        raise RuntimeError("stream broke")
+
+    async def say(**kwargs):
+        client.calls.append(("say", kwargs))
+
+    monkeypatch.setattr(main, "streaming_replies", True)
+    monkeypatch.setattr(main, "slack", client)
+    monkeypatch.setattr(main.conversations, "get", get)
+    monkeypatch.setattr(main, "voiceflow", type("Voiceflow", (), {"handle_user_input_stream": staticmethod(handle_user_input_stream)})())
+
+    async def run():
+        await main.process_message({"type": "message", "user": "U1", "channel": "C1", "ts": "1.0", "text": "hi"}, say)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    kinds = [kind for kind, _ in client.calls]
+    assert kinds == ["post", "update"]
+    assert client.calls[1][1]["ts"] == "111.222"
+    assert client.calls[1][1]["text"] == "An error occurred while processing your request."
@@ -0,0 +1,95 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from src import db, main
+
+
+class FakeSlack:
+    def __init__(self, failing_channels=()):
+        self.posts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failing_channels = failing_channels
+
+    async def chat_postMessage(self, priority=None, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if kwargs["channel"] in self.failing_channels:
+                raise RuntimeError("channel_not_found")
+            self.posts.append(kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+def test_batch_completion_uses_one_query_and_reports_each_item(monkeypatch):
+    queries = []
+
+    async def get_conversations(conversation_ids):
+        queries.append(list(conversation_ids))
+        return [{"conversation_id": i, "user_id": f"U-{i}", "channel_id": i.split("-")[0], "thread_ts": "1.0",
+                 "button_payloads": {}, "transcript_created": True} for i in conversation_ids if not i.startswith("CX")]
+
+    slack = FakeSlack(failing_channels=("CBAD",))
+    monkeypatch.setattr(db, "get_conversations", get_conversations)
+    monkeypatch.setattr(main, "slack", slack)
+    monkeypatch.setattr(main, "task_notify_concurrency", 3)
+    monkeypatch.setattr(main.conversations, "states", {})
+
+    items = [{"conversation_id": f"C{n}-1.0", "document_id": f"doc-{n}"} for n in range(10)]
+    items += [{"conversation_id": "CX-1.0", "document_id": "gone"}, {"conversation_id": "CBAD-1.0", "document_id": "doc-bad"}, {"document_id": "x"}]
+    response = TestClient(main.app).post("/task-completed/batch", json={"items": items})
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["status"] == "partial" and body["succeeded"] == 10 and body["failed"] == 3
+    assert [result["status"] for result in body["results"]] == ["success"] * 10 + ["error"] * 3
+    assert body["results"][10]["message"] == "Conversation not found"
+    assert len(queries) == 1
+    assert slack.max_in_flight == 3
+    post = next(post for post in slack.posts if post["channel"] == "C4")
+    assert "<@U-C4-1.0>" in post["text"] and "https://docs.google.com/document/d/doc-4" in post["text"]
+
+
+def test_batch_start_validates_its_payload(monkeypatch):
+    monkeypatch.setattr(main, "task_batch_max_items", 2)
+    client = TestClient(main.app)
+    assert client.post("/task-started/batch", json={"items": "nope"}).status_code == 400
+    assert client.post("/task-started/batch", json=[{"conversation_id": "a"}] * 3).status_code == 413
+
+
+def test_batch_reports_malformed_items_individually(monkeypatch):
+    queries = []
+
+    async def get_conversations(conversation_ids):
+        queries.append(list(conversation_ids))
+        return [{"conversation_id": i, "user_id": "U1", "channel_id": "C1", "thread_ts": "1.0",
+                 "button_payloads": {}, "transcript_created": True} for i in conversation_ids]
+
+    slack = FakeSlack()
+    monkeypatch.setattr(db, "get_conversations", get_conversations)
+    monkeypatch.setattr(main, "slack", slack)
+    monkeypatch.setattr(main.conversations, "states", {})
+    monkeypatch.setattr(main.conversations, "known_ready", False)
+
+    items = [
+        {"conversation_id": ["C1-1.0"], "document_id": "doc"},
+        {"conversation_id": 42, "document_id": "doc"},
+        {"conversation_id": "C1-1.0"},
+        {"conversation_id": "C1-1.0", "document_id": None},
+        "not an object",
+        {"conversation_id": "C1-1.0", "document_id": "doc-1"},
+    ]
+    response = TestClient(main.app).post("/task-completed/batch", json=items)
+
+    body = response.json()
+    assert response.status_code == 200
+    assert [result["status"] for result in body["results"]] == ["error"] * 5 + ["success"]
+    assert [result.get("message") for result in body["results"][:5]] == [
+        "Missing or invalid conversation_id", "Missing or invalid conversation_id",
+        "Missing or invalid document_id", "Missing or invalid document_id", "Missing or invalid conversation_id",
+    ]
+    assert queries == [["C1-1.0"]]
+    assert [post["text"].split("/d/")[1].split()[0] for post in slack.posts] == ["doc-1"]
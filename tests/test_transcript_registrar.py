@@ -0,0 +1,79 @@
+import asyncio
+
+from src.transcript_registrar import TranscriptRegistrar
+
+
+def test_transcripts_are_created_in_batches_and_marked_in_bulk():
+    calls, marked = [], []
+
+    async def run():
+        async def create_transcript(conversation_id):
+            calls.append(conversation_id)
+            await asyncio.sleep(0.01)
+
+        async def mark_created(conversation_ids):
+            marked.append(sorted(conversation_ids))
+
+        registrar = TranscriptRegistrar(create_transcript, mark_created, batch_size=3, interval=0.05)
+        registrar.start()
+        for n in range(5):
+            registrar.register(f"C1-{n}")
+        registrar.register("C1-0")  # already pending
+        await asyncio.sleep(0.2)
+        await registrar.close()
+        return registrar.as_dict()
+
+    stats = asyncio.run(run())
+    assert sorted(calls) == [f"C1-{n}" for n in range(5)]
+    assert marked == [["C1-0", "C1-1", "C1-2"], ["C1-3", "C1-4"]]
+    assert stats["registered"] == 5
+    assert stats["created"] == 5
+    assert stats["pending"] == 0
+
+
+def test_failures_are_retried_then_dropped():
+    attempts, marked = {}, []
+
+    async def run():
+        async def create_transcript(conversation_id):
+            attempts[conversation_id] = attempts.get(conversation_id, 0) + 1
+            if conversation_id == "broken" or attempts[conversation_id] == 1:
+                raise RuntimeError("voiceflow unavailable")
+
+        async def mark_created(conversation_ids):
+            marked.extend(conversation_ids)
+
+        registrar = TranscriptRegistrar(create_transcript, mark_created, batch_size=10, interval=0.01, max_attempts=3)
+        registrar.retry_delay = lambda attempt: 0.01
+        registrar.start()
+        registrar.register("flaky")
+        registrar.register("broken")
+        await asyncio.sleep(0.3)
+        await registrar.close()
+        return registrar.as_dict()
+
+    stats = asyncio.run(run())
+    assert marked == ["flaky"]
+    assert attempts == {"flaky": 2, "broken": 3}
+    assert stats["retried"] == 3
+    assert stats["gave_up"] == 1
+    assert stats["pending"] == 0
+
+
+def test_close_flushes_pending_transcripts():
+    created = []
+
+    async def run():
+        async def create_transcript(conversation_id):
+            created.append(conversation_id)
+
+        async def mark_created(conversation_ids):
+            pass
+
+        registrar = TranscriptRegistrar(create_transcript, mark_created, interval=60)
+        registrar.start()
+        registrar.register("C1-1")
+        await registrar.close()
+
+    asyncio.run(run())
+    assert created == ["C1-1"]
@@ -0,0 +1,60 @@
+import asyncio
+import os
+import tempfile
+
+from src import db, utils
+
+
+def fake_upload(monkeypatch, contents, stored, transcribe_delay=0.0):
+    """Downloads serve ``contents[url]``; transcripts already stored are looked up in ``stored``."""
+    transcribed = []
+
+    async def download_file(file_url, digest=None):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, contents[file_url])
+        os.close(fd)
+        digest.update(contents[file_url])
+        return path
+
+    async def find_transcript_by_hash(content_hash):
+        return stored.get(content_hash)
+
+    async def process_path(file_path, file_type):
+        with open(file_path, "rb") as f:
+            transcribed.append(f.read())
+        await asyncio.sleep(transcribe_delay)
+        return f"WEBVTT\n\n00:00:00.000 --> 00:00:01.000\nTranscript {len(transcribed)}\n"
+
+    monkeypatch.setattr(utils, "download_file", download_file)
+    monkeypatch.setattr(utils, "_process_path", process_path)
+    monkeypatch.setattr(db, "find_transcript_by_hash", find_transcript_by_hash)
+    monkeypatch.setattr(utils, "reuse_stats", {"hits": 0, "misses": 0, "coalesced": 0, "lookup_errors": 0})
+    return transcribed
+
+
+def test_identical_upload_reuses_stored_transcript(monkeypatch):
+    stored = {}
+    transcribed = fake_upload(monkeypatch, {"first": b"recording", "repost": b"recording", "other": b"different"}, stored)
+
+    text, content_hash = asyncio.run(utils.transcribe_upload("first", "m4a"))
+    stored[content_hash] = text
+
+    assert asyncio.run(utils.transcribe_upload("repost", "m4a")) == (text, content_hash)
+    other_text, other_hash = asyncio.run(utils.transcribe_upload("other", "m4a"))
+    assert other_hash != content_hash
+    assert transcribed == [b"recording", b"different"]
+    assert utils.reuse_stats["hits"] == 1
+    assert utils.reuse_stats["misses"] == 2
+
+
+def test_concurrent_identical_uploads_transcribe_once(monkeypatch):
+    transcribed = fake_upload(monkeypatch, {"a": b"same", "b": b"same"}, {}, transcribe_delay=0.05)
+
+    async def run():
+        return await asyncio.gather(utils.transcribe_upload("a", "mp4"), utils.transcribe_upload("b", "mp4"))
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(transcribed) == 1
+    assert utils.reuse_stats["coalesced"] == 1
+    assert utils._transcribing == {}
@@ -0,0 +1,70 @@
+import asyncio
+
+from pydub import AudioSegment
+from pydub.generators import Sine
+
+from src import transcription
+from src.transcription import plan_chunks, stitch_vtt
+
+
+def test_plan_chunks_cuts_in_silences_and_respects_max_length():
+    silences = [(9_000, 10_000), (18_000, 19_000), (40_000, 40_500)]
+    chunks = plan_chunks(50_000, silences, max_ms=20_000, min_ms=5_000)
+    assert chunks == [(0, 18_500), (18_500, 38_500), (38_500, 50_000)]
+    assert plan_chunks(5_000, silences, max_ms=20_000, min_ms=5_000) == [(0, 5_000)]
+
+
+def test_stitch_vtt_offsets_cue_timestamps():
+    first = "WEBVTT\n\n00:00:00.000 --> 00:00:02.500\nHello there.\n\n00:00:02.500 --> 00:00:04.000\nGeneral Kenobi.\n"
+    second = "WEBVTT\n\n00:01.000 --> 00:03.000\nSecond chunk.\n"
+    stitched = stitch_vtt([(0, first), (3_600_000 - 1_000, second)])
+    assert stitched.splitlines() == [
+        "WEBVTT", "",
+        "00:00:00.000 --> 00:00:02.500", "Hello there.", "",
+        "00:00:02.500 --> 00:00:04.000", "General Kenobi.", "",
+        "01:00:00.000 --> 01:00:02.000", "Second chunk.",
+    ]
+
+
+def test_transcribe_segment_runs_chunks_concurrently(monkeypatch):
+    monkeypatch.setattr(transcription, "max_chunk_ms", 3_000)
+    monkeypatch.setattr(transcription, "min_chunk_ms", 1_000)
+    monkeypatch.setattr(transcription, "min_silence_ms", 300)
+    monkeypatch.setattr(transcription, "chunk_format", "wav")
+    monkeypatch.setattr(transcription, "concurrency", 2)
+
+    tone = Sine(440).to_audio_segment(duration=2_000).set_frame_rate(16_000)
+    gap = AudioSegment.silent(duration=500, frame_rate=16_000)
+    segment = tone + gap + tone + gap + tone  # 7s with two pauses
+
+    in_flight = 0
+    peak = 0
+    calls = []
+
+    async def stub_transcribe(file_stream):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        duration = len(AudioSegment.from_wav(file_stream))
+        calls.append(duration)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return f"WEBVTT\n\n00:00:00.000 --> 00:00:01.000\nchunk of {duration}ms\n"
+
+    vtt = asyncio.run(transcription.transcribe_segment(segment, stub_transcribe))
+
+    assert len(calls) == 3
+    assert sum(calls) == len(segment)
+    assert peak == 2
+    starts = [line.split(" --> ")[0] for line in vtt.splitlines() if "-->" in line]
+    assert starts == ["00:00:00.000", "00:00:02.250", "00:00:04.750"]
+
+
+def test_transcribe_segment_fails_when_a_chunk_fails(monkeypatch):
+    monkeypatch.setattr(transcription, "chunk_format", "wav")
+
+    async def failing_transcribe(file_stream):
+        return None
+
+    segment = Sine(440).to_audio_segment(duration=500)
+    assert asyncio.run(transcription.transcribe_segment(segment, failing_transcribe)) is None
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import db, main, transcripts
+
+VTT = (
+    "WEBVTT\r\n\r\n"
+    "NOTE generated by whisper\r\n\r\n"
+    "00:00:00.000 --> 00:00:02.500\r\nHello there.\r\n\r\n"
+    "00:00:02.500 --> 00:00:05.000\r\nThis is the second cue\r\non two lines.\r\n\r\n"
+    "00:01:05.000 --> 00:01:10.000\r\nA minute later.\r\n"
+)
+
+
+def fake_store(monkeypatch, text):
+    reads = []
+
+    async def read_transcript_chunk(conversation_id, offset, size):
+        reads.append(offset)
+        return text[offset:offset + size] if conversation_id == "c1" else None
+
+    monkeypatch.setattr(db, "read_transcript_chunk", read_transcript_chunk)
+    return reads
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_cues_are_parsed_across_chunk_boundaries(monkeypatch):
+    fake_store(monkeypatch, VTT)
+
+    for size in (1, 7, 64, 10000):
+        chunks = asyncio.run(collect(transcripts.iter_text("c1", size)))
+        assert "".join(chunks) == VTT
+        cues = asyncio.run(collect(transcripts.iter_cues(transcripts.iter_text("c1", size))))
+        assert [(cue.index, cue.start, cue.end) for cue in cues] == [(0, 0.0, 2.5), (1, 2.5, 5.0), (2, 65.0, 70.0)]
+        assert cues[1].text == "This is the second cue\non two lines."
+
+
+def test_missing_transcript_yields_nothing(monkeypatch):
+    fake_store(monkeypatch, VTT)
+    assert asyncio.run(collect(transcripts.iter_text("missing"))) == []
+
+
+def test_segments_stop_reading_past_the_range(monkeypatch):
+    text = "WEBVTT\n\n" + "".join(f"00:00:{n:02d}.000 --> 00:00:{n + 1:02d}.000\nCue {n}\n\n" for n in range(50))
+    reads = fake_store(monkeypatch, text)
+    monkeypatch.setattr(transcripts, "chunk_chars", 64)
+
+    cues = asyncio.run(transcripts.segments("c1", start=2, end=4))
+    assert [cue.text for cue in cues] == ["Cue 2", "Cue 3"]
+    assert len(reads) < len(text) // 64
+
+    cues = asyncio.run(transcripts.segments("c1", from_seconds=10.5, to_seconds=12))
+    assert [cue.text for cue in cues] == ["Cue 10", "Cue 11"]
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = transcripts.encode_cursor({"created_at": created_at, "conversation_id": "c-9"})
+    assert transcripts.decode_cursor(cursor) == (created_at, "c-9")
+    with pytest.raises(ValueError):
+        transcripts.decode_cursor("not a cursor")
+
+
+def test_find_pages_with_keyset_conditions(monkeypatch):
+    calls = []
+    rows = [
+        {"conversation_id": f"c{n}", "created_at": datetime(2024, 5, 1, 12, 0, 50 - n, tzinfo=timezone.utc)}
+        for n in range(3)
+    ]
+
+    async def fetch(query, *args):
+        calls.append((query, args))
+        return rows
+
+    monkeypatch.setattr(db, "fetch", fetch)
+
+    items, next_cursor = asyncio.run(transcripts.find(channel_id="C1", query="budget review", limit=2))
+    assert [item["conversation_id"] for item in items] == ["c0", "c1"]
+    assert transcripts.decode_cursor(next_cursor) == (rows[1]["created_at"], "c1")
+    query, args = calls[0]
+    assert "websearch_to_tsquery('english', $2)" in query
+    assert db.TRANSCRIPT_SEARCH_VECTOR in query
+    assert args == ("C1", "budget review", 3)
+
+    asyncio.run(transcripts.find(cursor=next_cursor, limit=2))
+    query, args = calls[1]
+    assert "(created_at, conversation_id) < ($1, $2)" in query
+    assert args == (rows[1]["created_at"], "c1", 3)
+
+
+def test_transcript_api_requires_the_bearer_token(monkeypatch):
+    async def find(channel_id, title, query, cursor, limit):
+        return [{"conversation_id": "c1"}], None
+
+    monkeypatch.setattr(transcripts, "find", find)
+    client = TestClient(main.app)
+
+    monkeypatch.setattr(main, "transcript_api_token", None)
+    assert client.get("/transcripts", headers={"Authorization": "Bearer anything"}).status_code == 403
+
+    monkeypatch.setattr(main, "transcript_api_token", "s3cret")
+    assert client.get("/transcripts").status_code == 401
+    assert client.get("/transcripts", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/transcripts/c1/text", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/transcripts", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200 and response.json()["items"] == [{"conversation_id": "c1"}]
+
+
+def test_legacy_title_lookup_needs_the_token_and_streams_the_same_json(monkeypatch):
+    text = 'WEBVTT\n\n00:00:00.000 --> 00:00:02.000\nShe said "hi" \\ waved.\n' * 20
+    reads = fake_store(monkeypatch, text)
+
+    async def get_transcript_id(title):
+        return "c1" if title == "Standup" else None
+
+    monkeypatch.setattr(db, "get_transcript_id", get_transcript_id)
+    monkeypatch.setattr(transcripts, "chunk_chars", 100)
+    monkeypatch.setattr(main, "transcript_api_token", "s3cret")
+    client = TestClient(main.app)
+    headers = {"Authorization": "Bearer s3cret"}
+
+    assert client.get("/transcript/Standup").status_code == 401
+    assert client.get("/transcript/Other", headers=headers).status_code == 404
+    response = client.get("/transcript/Standup", headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {"title": "Standup", "transcript": text}
+    assert len(reads) > 1
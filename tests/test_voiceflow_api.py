@@ -0,0 +1,138 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+os.environ.setdefault("VOICEFLOW_API_KEY", "test-key")
+
+from src.voiceflow_api import VoiceflowAPI
+
+
+async def start_stub_runtime(handler):
+    app = web.Application()
+    app.router.add_post("/state/{version}/user/{user}/interact", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_session_is_reused_across_calls():
+    async def handler(request):
+        return web.json_response([{"type": "text", "payload": {"message": "hi"}}])
+
+    async def run():
+        runner, url = await start_stub_runtime(handler)
+        voiceflow = VoiceflowAPI()
+        voiceflow.runtime_endpoint = url
+        await voiceflow.start()
+        try:
+            for _ in range(3):
+                await voiceflow.handle_user_input("C1-1", "hello")
+        finally:
+            await voiceflow.close()
+            await runner.cleanup()
+        return voiceflow.connection_stats.as_dict()
+
+    stats = asyncio.run(run())
+    assert stats["connections_created"] == 1
+    assert stats["connections_reused"] == 2
+
+
+def test_parse_response_returns_immutable_result():
+    voiceflow = VoiceflowAPI()
+    result = voiceflow.parse_response([
+        {"type": "text", "payload": {"message": "first"}},
+        {"type": "speak", "payload": {"message": "second"}},
+        {"type": "choice", "payload": {"buttons": [
+            {"name": "Yes", "request": {"type": "path-yes", "payload": {"label": "Yes"}}},
+            {"name": "No", "request": {"type": "path-no", "payload": {"label": "No"}}},
+        ]}},
+        {"type": "end"},
+    ])
+    assert result.messages == ("first", "second")
+    assert result.last_message == "second"
+    assert list(result.button_payloads) == ["1", "2"]
+    assert result.is_running is False
+
+
+def test_concurrent_conversations_do_not_share_replies():
+    async def handler(request):
+        user = request.match_info["user"]
+        body = await request.json()
+        # Finish requests out of order so interleaving actually happens
+        await asyncio.sleep((hash(user) % 7) / 1000)
+        return web.json_response([
+            {"type": "text", "payload": {"message": f"{user}:{body['request']['payload']}"}},
+            {"type": "choice", "payload": {"buttons": [{"name": user, "request": {"type": user, "payload": {"label": user}}}]}},
+        ])
+
+    async def converse(voiceflow, conversation_id):
+        replies = []
+        for turn in range(3):
+            result = await voiceflow.handle_user_input(conversation_id, f"turn-{turn}")
+            replies.append((result, turn))
+        return conversation_id, replies
+
+    async def run():
+        runner, url = await start_stub_runtime(handler)
+        voiceflow = VoiceflowAPI()
+        voiceflow.runtime_endpoint = url
+        try:
+            return await asyncio.gather(*(converse(voiceflow, f"C{i}-{i}") for i in range(50)))
+        finally:
+            await voiceflow.close()
+            await runner.cleanup()
+
+    for conversation_id, replies in asyncio.run(run()):
+        for result, turn in replies:
+            assert result.messages == (f"{conversation_id}:turn-{turn}",)
+            assert result.button_payloads["1"]["type"] == conversation_id
+
+
+def test_launch_snapshot_copies_launched_state_into_new_sessions():
+    launches, states = [], {}
+
+    async def interact(request):
+        body = await request.json()
+        user = request.match_info["user"]
+        if body["request"]["type"] == "launch":
+            launches.append(user)
+            states[user] = {"stack": ["start"], "variables": {"greeted": 1}}
+        return web.json_response([{"type": "text", "payload": {"message": "Welcome"}}])
+
+    async def get_state(request):
+        return web.json_response(states[request.match_info["user"]])
+
+    async def put_state(request):
+        states[request.match_info["user"]] = await request.json()
+        return web.json_response({})
+
+    async def run():
+        app = web.Application()
+        app.router.add_post("/state/{version}/user/{user}/interact", interact)
+        app.router.add_get("/state/user/{user}", get_state)
+        app.router.add_put("/state/user/{user}", put_state)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        voiceflow = VoiceflowAPI()
+        voiceflow.runtime_endpoint = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        voiceflow.launch_snapshots = True
+        try:
+            results = [await voiceflow.launch(f"C1-{n}") for n in range(3)]
+        finally:
+            await voiceflow.close()
+            await runner.cleanup()
+        return results, voiceflow.launch_stats
+
+    results, stats = asyncio.run(run())
+    # One real launch for the template session; the conversations got copies of its state
+    assert len(launches) == 1 and launches[0].startswith("launch-snapshot-")
+    assert all(states[f"C1-{n}"] == {"stack": ["start"], "variables": {"greeted": 1}} for n in range(3))
+    assert [result.messages for result in results] == [("Welcome",)] * 3
+    assert stats["snapshot_launches"] == 3
+    assert stats["snapshots_taken"] == 1
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from aiohttp import web
+
+from src import webpage
+
+
+async def start_stub_site():
+    async def page(request):
+        return web.Response(text=f"<html><h1>Title {request.match_info['n']}</h1><p>Body  text</p></html>", content_type="text/html")
+
+    async def slow(request):
+        await asyncio.sleep(2)
+        return web.Response(text="<p>too late</p>", content_type="text/html")
+
+    async def huge(request):
+        return web.Response(text="<p>" + "x" * 500_000 + "</p>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/page/{n}", page)
+    app.router.add_get("/slow", slow)
+    app.router.add_get("/huge", huge)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_parse_webpage_extracts_headings_and_paragraphs():
+    html = "<html><script>ignored()</script><h2>Heading</h2><p>Some\n  text</p><div>skipped</div></html>"
+    assert webpage.parse_webpage(html) == "Heading Some text"
+
+
+def test_extract_webpages_runs_concurrently_and_respects_deadlines(monkeypatch):
+    monkeypatch.setattr(webpage, "request_timeout", 0.5)
+    monkeypatch.setattr(webpage, "max_bytes", 1000)
+
+    async def run():
+        runner, url = await start_stub_site()
+        await webpage.start()
+        try:
+            started = time.monotonic()
+            results = await webpage.extract_webpages(
+                [f"{url}/page/1", f"{url}/slow", f"{url}/page/2", f"{url}/huge", f"{url}/missing"]
+            )
+            return results, time.monotonic() - started
+        finally:
+            await webpage.close()
+            await runner.cleanup()
+
+    results, elapsed = asyncio.run(run())
+    assert results[0] == "Title 1 Body text"
+    assert results[1] is None
+    assert results[2] == "Title 2 Body text"
+    assert len(results[3]) < 1000
+    assert results[4] is None
+    assert elapsed < 1.5